@@ -0,0 +1,250 @@
+"""
+Shared album art / metadata resolution service (Elastic Beanstalk: WSGIPath app:flask_app).
+
+Desktop clients ask this service first (see artcache.resolve_art) so a cold
+iTunes miss is paid once for everyone instead of once per client.
+
+    GET /v1/art?title=<song title>&artist=<artist name>
+        -> {"art_url": str|null, "duration_ms": int|null, "artist": str|null, "cached": bool}
+        -> 429 when the client is over its limit, 503 when the upstream budget is used up
+    GET /health
+
+Run locally against a stubbed upstream for load tests:
+    python app.py --stub-upstream --port 8000
+"""
+import argparse
+import collections
+import os
+import random
+import threading
+import time
+import zlib
+
+import requests
+from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+
+UPSTREAM_URL = os.environ.get("ART_UPSTREAM_URL", "https://itunes.apple.com/search")
+CACHE_MAX_ENTRIES = int(os.environ.get("ART_CACHE_MAX_ENTRIES", "50000"))
+CACHE_TTL_SECONDS = int(os.environ.get("ART_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MISS_TTL_SECONDS = int(os.environ.get("ART_MISS_TTL_SECONDS", str(6 * 3600)))
+CLIENT_RATE_PER_MINUTE = float(os.environ.get("ART_CLIENT_RATE_PER_MINUTE", "60"))
+CLIENT_BURST = float(os.environ.get("ART_CLIENT_BURST", "20"))
+UPSTREAM_POOL_SIZE = int(os.environ.get("ART_UPSTREAM_POOL_SIZE", "32"))
+# Every client's miss reaches iTunes from this service's one address, and iTunes allows
+# roughly 20 requests a minute per address. The budget is per process: the Procfile runs 2 workers.
+UPSTREAM_RATE_PER_MINUTE = float(os.environ.get("ART_UPSTREAM_RATE_PER_MINUTE", "10"))
+UPSTREAM_BURST = float(os.environ.get("ART_UPSTREAM_BURST", "3"))
+UPSTREAM_RETRY_AFTER_SECONDS = 10
+UPSTREAM_TIMEOUT = 5
+
+
+class UpstreamBusyError(Exception):
+    """The process-wide upstream budget is used up; the lookup was not sent."""
+
+
+# --- 1. SHARED CACHE ---
+
+class LRUCache:
+    """
+    Thread-safe LRU with per-entry expiry and single-flight loading: when many
+    requests miss the same key at once, one thread loads it and the rest wait
+    for that result instead of all hitting the upstream.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def _get_fresh(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get_or_load(self, key, loader, ttl_for):
+        """Returns (value, cached). `ttl_for(value)` decides how long a loaded value is kept."""
+        with self._lock:
+            entry = self._get_fresh(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry[0], True
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = {"event": threading.Event(), "value": None, "error": None}
+                leader = True
+                self.stats["misses"] += 1
+            else:
+                leader = False
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            waiter["event"].wait(UPSTREAM_TIMEOUT * 2)
+            if isinstance(waiter["error"], UpstreamBusyError):
+                raise waiter["error"]
+            if waiter["error"] is not None or not waiter["event"].is_set():
+                raise LookupError("upstream lookup failed")
+            return waiter["value"], True
+
+        try:
+            value = loader()
+        except Exception as e:
+            waiter["error"] = e
+            raise
+        else:
+            waiter["value"] = value
+            with self._lock:
+                self._data[key] = (value, time.monotonic() + ttl_for(value))
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+                    self.stats["evictions"] += 1
+            return value, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter["event"].set()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# --- 2. PER-CLIENT RATE LIMITING ---
+
+class ClientRateLimiter:
+    """Token bucket per client address; idle buckets are pruned so memory stays bounded."""
+
+    def __init__(self, rate_per_minute=CLIENT_RATE_PER_MINUTE, burst=CLIENT_BURST, max_clients=100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, client):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return allowed
+
+
+# --- 3. UPSTREAM ---
+
+def make_upstream_session(pool_size=UPSTREAM_POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "Qobuz-RPC-ArtService/1.0"
+    return session
+
+
+def fetch_upstream(session, upstream_url, song_title, artist_name):
+    params = {"term": f"{song_title} {artist_name}", "entity": "song", "limit": 1}
+    response = session.get(upstream_url, params=params, timeout=UPSTREAM_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('resultCount', 0) > 0 and data['results']:
+        result = data['results'][0]
+        art_url = result.get('artworkUrl100')
+        if art_url:
+            return {"art_url": art_url.replace('100x100bb', '512x512bb'),
+                    "duration_ms": result.get('trackTimeMillis'), "artist": result.get('artistName')}
+    return {"art_url": None, "duration_ms": None, "artist": None}
+
+
+# --- 4. WSGI APP ---
+
+def create_app(upstream_url=UPSTREAM_URL, stub_upstream=False):
+    flask_app = Flask(__name__)
+    cache = LRUCache()
+    limiter = ClientRateLimiter()
+    # One bucket for the whole process; the stub upstream isn't iTunes, so it has none
+    upstream_budget = None if stub_upstream or UPSTREAM_RATE_PER_MINUTE <= 0 else \
+        ClientRateLimiter(UPSTREAM_RATE_PER_MINUTE, UPSTREAM_BURST, max_clients=1)
+    session = make_upstream_session()
+    counters = {"requests": 0, "rate_limited": 0, "upstream_errors": 0, "upstream_busy": 0}
+
+    def client_address():
+        # The EB load balancer appends the address it saw, so only the last X-Forwarded-For
+        # entry can be trusted; anything before it is whatever the client sent
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        return forwarded.split(",")[-1].strip() or request.remote_addr or "unknown"
+
+    def load(song_title, artist_name):
+        if upstream_budget is not None and not upstream_budget.allow("upstream"):
+            raise UpstreamBusyError()
+        return fetch_upstream(session, upstream_url, song_title, artist_name)
+
+    @flask_app.route('/v1/art', methods=['GET'])
+    def art_route():
+        counters["requests"] += 1
+        song_title = (request.args.get('title') or '').strip()
+        artist_name = (request.args.get('artist') or '').strip()
+        if not song_title:
+            return jsonify({"status": "error", "message": "title is required"}), 400
+        if not limiter.allow(client_address()):
+            counters["rate_limited"] += 1
+            return jsonify({"status": "error", "message": "rate limited"}), 429
+
+        key = f"{song_title.lower()}\x00{artist_name.lower()}"
+        try:
+            value, cached = cache.get_or_load(
+                key,
+                lambda: load(song_title, artist_name),
+                lambda v: CACHE_TTL_SECONDS if v["art_url"] else MISS_TTL_SECONDS)
+        except UpstreamBusyError:
+            counters["upstream_busy"] += 1
+            return jsonify({"status": "error", "message": "upstream budget exhausted"}), 503, \
+                {"Retry-After": str(UPSTREAM_RETRY_AFTER_SECONDS)}
+        except Exception:
+            counters["upstream_errors"] += 1
+            return jsonify({"status": "error", "message": "upstream unavailable"}), 502
+        return jsonify({"art_url": value["art_url"], "duration_ms": value["duration_ms"],
+                        "artist": value.get("artist"), "cached": cached}), 200
+
+    @flask_app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({"status": "ok", "cache_entries": len(cache), "cache": dict(cache.stats), **counters}), 200
+
+    if stub_upstream:
+        @flask_app.route('/stub/search', methods=['GET'])
+        def stub_search():
+            # Fake iTunes: fixed latency, deterministic results, ~10% misses
+            time.sleep(float(os.environ.get("ART_STUB_LATENCY", "0.2")))
+            term = request.args.get('term', '')
+            if random.Random(term).random() < 0.1:
+                return jsonify({"resultCount": 0, "results": []})
+            return jsonify({"resultCount": 1, "results": [{
+                "artworkUrl100": f"https://stub.invalid/{zlib.crc32(term.encode())}/100x100bb.jpg",
+                "trackTimeMillis": 180000 + len(term) * 1000}]})
+
+    return flask_app
+
+
+flask_app = create_app()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the art resolution service locally.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--stub-upstream', action='store_true', help="Serve a fake iTunes API from this process")
+    args = parser.parse_args()
+    if args.stub_upstream:
+        flask_app = create_app(upstream_url=f"http://127.0.0.1:{args.port}/stub/search", stub_upstream=True)
+    flask_app.run(host='127.0.0.1', port=args.port, threaded=True)
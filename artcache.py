@@ -0,0 +1,323 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import eventlog
+from breaker import CircuitBreaker, CircuitOpenError
+from ratelimit import PRIORITY_CURRENT, PriorityRateLimiter, RateLimitedError, retry_after_seconds
+
+ITUNES_SEARCH_URL = "https://itunes.apple.com/search"
+CACHE_FILE_NAME = "art_cache.json"
+# Oldest entries are dropped past this, so a copy left running for months doesn't grow without limit
+MAX_CACHE_ENTRIES = 20000
+# New entries are written to disk at most this often (and on shutdown), not once per lookup
+CACHE_SAVE_INTERVAL_SECONDS = 30
+
+# Shared resolution service (app.py); empty disables it and every lookup goes straight to iTunes
+ART_SERVICE_URL = os.environ.get("QOBUZ_RPC_ART_SERVICE_URL", "").rstrip("/")
+ART_SERVICE_TIMEOUT = 2
+ART_SERVICE_RETRY_SECONDS = 300
+# While the service is busy (503 with Retry-After) lookups go straight to iTunes until then
+_service_busy_until = 0.0
+
+# While a provider is down, lookups fail at once (presence falls back to the 'qobuz' asset)
+# instead of each new title waiting for the full timeout
+ITUNES_BREAKER = CircuitBreaker("itunes", failure_threshold=3, reset_timeout=15, max_reset_timeout=300)
+SERVICE_BREAKER = CircuitBreaker("art-service", failure_threshold=1, reset_timeout=ART_SERVICE_RETRY_SECONDS,
+                                 max_reset_timeout=ART_SERVICE_RETRY_SECONDS)
+# One budget for every iTunes lookup in this process; the track being shown gets a token first
+ITUNES_LIMITER = PriorityRateLimiter()
+# Past this the current track shows the default image rather than holding up the next one
+CURRENT_TRACK_MAX_WAIT = 5
+
+
+def get_app_data_dir():
+    """Returns (and creates) the per-user directory used for persistent Qobuz-RPC data."""
+    base = os.environ.get("APPDATA") or os.path.join(os.path.expanduser("~"), ".config")
+    path = os.path.join(base, "Qobuz-RPC")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class LookupResult(tuple):
+    """
+    (art_url, duration_ms), unpacked like a plain pair, that also carries the artist name of
+    the match (or None). The window title parser uses it to tell which split was right.
+    """
+
+    def __new__(cls, art_url, duration_ms, artist=None):
+        result = super().__new__(cls, (art_url, duration_ms))
+        result.artist = artist
+        return result
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock on `<path>.lock`, shared with other processes (the app and cachewarm.py)."""
+    with open(f"{path}.lock", 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_entries(path):
+    """The (key, (art_url, duration_ms)) pairs of a cache file, oldest first."""
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f).items()
+    return [(key, tuple((list(value) + [None, None])[:2])) for key, value in items]
+
+
+def make_cache_key(song_title, artist_name):
+    """Cache keys match the raw 'Song Title - Artist Name' window title format."""
+    return f"{song_title.strip()} - {artist_name.strip()}"
+
+
+def itunes_lookup(song_title, artist_name, headers=None, timeout=5, session=None):
+    """
+    Queries the iTunes public search API for a single song.
+    Returns: LookupResult (art_url: str or None, duration_ms: int or None)
+    Raises requests.exceptions.RequestException on network/HTTP errors so callers can retry.
+    """
+    params = {"term": f"{song_title} {artist_name}", "entity": "song", "limit": 1}
+    response = (session or requests).get(ITUNES_SEARCH_URL, params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('resultCount', 0) > 0 and data['results']:
+        result = data['results'][0]
+        art_url = result.get('artworkUrl100')
+        if art_url:
+            return LookupResult(art_url.replace('100x100bb', '512x512bb'), result.get('trackTimeMillis'),
+                                result.get('artistName'))
+    return LookupResult(None, None)
+
+
+def service_lookup(song_title, artist_name, headers=None, service_url=None):
+    """Asks the shared art service. Returns a LookupResult; raises RequestException if unreachable."""
+    response = requests.get(f"{service_url or ART_SERVICE_URL}/v1/art",
+                            params={"title": song_title, "artist": artist_name},
+                            headers=headers, timeout=ART_SERVICE_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return LookupResult(data.get("art_url"), data.get("duration_ms"), data.get("artist"))
+
+
+def limited_itunes_lookup(song_title, artist_name, headers=None, priority=PRIORITY_CURRENT, limiter=None):
+    """
+    itunes_lookup behind the shared circuit breaker and rate limiter. The breaker is asked first,
+    so while iTunes is down no token is spent and nobody waits for one. Raises CircuitOpenError
+    or RateLimitedError; a 403/429 answer pauses the limiter before the HTTPError is re-raised.
+    """
+    limiter = limiter or ITUNES_LIMITER
+    timeout = CURRENT_TRACK_MAX_WAIT if priority == PRIORITY_CURRENT else None
+    if not ITUNES_BREAKER.allow():
+        raise CircuitOpenError(f"{ITUNES_BREAKER.name} circuit is open")
+    if not limiter.acquire(priority, timeout=timeout):
+        ITUNES_BREAKER.release()
+        raise RateLimitedError(f"No iTunes lookup slot within {timeout}s")
+    try:
+        return ITUNES_BREAKER.call_allowed(itunes_lookup, song_title, artist_name, headers=headers,
+                                           is_failure=_is_outage)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code in (403, 429):
+            limiter.throttled(retry_after_seconds(e.response))
+        raise
+
+
+def _is_outage(error):
+    """
+    Network errors, timeouts and 5xx count against a breaker. Other 4xx answers mean the
+    provider is up, and throttling (429) is left to the rate limiter.
+    """
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+def _service_retry_after(error):
+    """
+    Seconds to leave the art service alone if `error` is it throttling us: a 429, or a 503
+    with Retry-After (its upstream budget is used up). None for anything else.
+    """
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code not in (429, 503):
+        return None
+    seconds = retry_after_seconds(response)
+    if response.status_code == 503 and seconds is None:
+        return None
+    return seconds if seconds is not None else ART_SERVICE_RETRY_SECONDS
+
+
+def _is_service_outage(error):
+    """Like _is_outage, except that the service saying it is busy is throttling, not an outage."""
+    return _is_outage(error) and _service_retry_after(error) is None
+
+
+def resolve_art(song_title, artist_name, headers=None, priority=PRIORITY_CURRENT):
+    """
+    Resolves art through the shared service first, falling back to a direct iTunes lookup
+    when the service is not configured or unreachable (then skipped for a few minutes),
+    or busy (then skipped for its Retry-After time).
+    Raises CircuitOpenError without a request while iTunes is considered down, and
+    RateLimitedError when the lookup budget is used up.
+    """
+    global _service_busy_until
+    if ART_SERVICE_URL and time.monotonic() >= _service_busy_until:
+        try:
+            return SERVICE_BREAKER.call(service_lookup, song_title, artist_name, headers=headers,
+                                        is_failure=_is_service_outage)
+        except CircuitOpenError:
+            pass
+        except (requests.exceptions.RequestException, ValueError) as e:
+            retry_after = _service_retry_after(e)
+            if retry_after is not None:
+                _service_busy_until = time.monotonic() + retry_after
+                eventlog.info("art", "Art service busy, using iTunes directly", seconds=retry_after)
+            else:
+                eventlog.warning("art", "Art service unavailable, using iTunes directly", error=str(e))
+    return limited_itunes_lookup(song_title, artist_name, headers=headers, priority=priority)
+
+
+def art_lookup_stats():
+    stats = {"itunes": ITUNES_BREAKER.snapshot(), "rate_limit": ITUNES_LIMITER.snapshot()}
+    if ART_SERVICE_URL:
+        stats["service"] = SERVICE_BREAKER.snapshot()
+    return stats
+
+
+class ArtCache(dict):
+    """
+    Title -> (art_url, duration_ms) mapping persisted as JSON between runs.
+    Entries of (None, None) record lookups that found nothing, so they are not repeated.
+    Setting an entry only marks the cache dirty; `start_autosave()` writes it from a
+    background thread, and `stop_autosave()` writes whatever is left. Each save merges
+    with the file under a lock, so entries another process saved meanwhile are kept.
+    """
+
+    def __init__(self, path=None, max_entries=MAX_CACHE_ENTRIES):
+        super().__init__()
+        self.path = path or os.path.join(get_app_data_dir(), CACHE_FILE_NAME)
+        self.max_entries = max_entries
+        self.saves = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def load(cls, path=None, max_entries=MAX_CACHE_ENTRIES):
+        cache = cls(path, max_entries)
+        try:
+            items = _read_entries(cache.path)
+            # The file is written in insertion order, so the newest entries are at the end
+            for key, value in items[-max_entries:] if max_entries else items:
+                dict.__setitem__(cache, key, value)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            eventlog.warning("art", "Art cache could not be read, starting empty", error=str(e))
+        return cache
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if self.max_entries and key not in self and len(self) >= self.max_entries:
+                del self[next(iter(self))]
+            super().__setitem__(key, tuple(value))
+            self._dirty = True
+
+    def _merge(self, items):
+        """
+        Adds entries another process saved. Ours win, except that art found elsewhere replaces
+        a recorded miss. Returns the entries to write, the file's own first (they are older).
+        """
+        with self._lock:
+            merged = {}
+            for key, value in items:
+                ours = dict.get(self, key)
+                if ours is None or (not ours[0] and value[0]):
+                    merged[key] = value
+                    dict.__setitem__(self, key, value)
+            merged.update((key, value) for key, value in dict.items(self) if key not in merged)
+            while self.max_entries and len(self) > self.max_entries:
+                del self[next(iter(self))]
+            self._dirty = False
+        items = list(merged.items())
+        return dict(items[-self.max_entries:] if self.max_entries else items)
+
+    def save(self):
+        """
+        Atomically writes the cache to disk (write to temp file, then replace), merged with what
+        is on disk. The file lock keeps a cache warmer's save from being overwritten by ours.
+        """
+        # Saves in this process go one at a time, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            tmp_path = None
+            try:
+                with _file_lock(self.path):
+                    try:
+                        items = _read_entries(self.path)
+                    except FileNotFoundError:
+                        items = []
+                    except ValueError as e:
+                        eventlog.warning("art", "Art cache file unreadable, overwriting it", error=str(e))
+                        items = []
+                    snapshot = self._merge(items)
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                                    prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(snapshot, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                self.saves += 1
+            except OSError as e:
+                self._dirty = True
+                eventlog.error("art", "Failed to save art cache", error=str(e))
+                if tmp_path and os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    def flush(self):
+        """Saves the cache if anything changed since the last save."""
+        if self._dirty:
+            self.save()
+
+    def start_autosave(self, interval=CACHE_SAVE_INTERVAL_SECONDS):
+        """Starts the background saver; repeated calls are ignored."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="artcache-save", daemon=True)
+        self._thread.start()
+
+    def stop_autosave(self, timeout=2.0):
+        """Stops the background saver and writes any unsaved entries."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self, interval):
+        while not self._stop_event.wait(interval):
+            self.flush()
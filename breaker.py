@@ -0,0 +1,118 @@
+"""
+Circuit breaker for calls to flaky remote services (art lookups).
+
+closed     calls go through; `failure_threshold` consecutive failures open it.
+open       calls fail at once with CircuitOpenError for `reset_timeout` seconds.
+half_open  one probe call is let through: success closes the circuit, failure
+           opens it again with the timeout doubled (up to `max_reset_timeout`).
+"""
+import threading
+import time
+
+import requests
+
+import eventlog
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of making the call while the circuit is open."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=15.0, max_reset_timeout=300.0,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.short_circuited = 0
+        self.transitions = {}
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        eventlog.log(eventlog.WARNING if state == STATE_OPEN else eventlog.INFO, "breaker", "Circuit changed state",
+                     circuit=self.name, transition=key)
+        self.state = state
+
+    def _open(self):
+        self._transition(STATE_OPEN)
+        self.opened_at = self.clock()
+
+    def allow(self):
+        """Returns True if a call may go ahead now (claims the probe slot when half-open)."""
+        with self._lock:
+            if self.state == STATE_OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self._transition(STATE_HALF_OPEN)
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            if self.state != STATE_CLOSED:
+                self.reset_timeout = self.base_reset_timeout
+                self._transition(STATE_CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == STATE_CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Gives back the probe slot claimed by allow() when the call ended up not being made."""
+        with self._lock:
+            self._probing = False
+
+    def call(self, fn, *args, is_failure=lambda e: True, **kwargs):
+        """
+        Runs `fn` through the breaker. Exceptions for which `is_failure(e)` is True count
+        towards opening the circuit; all exceptions are re-raised.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return self.call_allowed(fn, *args, is_failure=is_failure, **kwargs)
+
+    def call_allowed(self, fn, *args, is_failure=lambda e: True, **kwargs):
+        """Like call(), for a caller that already got True from allow()."""
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == STATE_OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (self.clock() - self.opened_at)), 1)
+            return {"state": self.state, "failures": self.failures, "short_circuited": self.short_circuited,
+                    "transitions": dict(self.transitions), "retry_in_seconds": retry_in}
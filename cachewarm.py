@@ -0,0 +1,216 @@
+"""
+Bulk cache warming for the persistent album art cache.
+
+Reads a Qobuz library/playlist export (CSV or JSON) or a plain text list of
+"Song Title - Artist Name" lines, resolves art and duration for every track
+and stores them in the same cache the RPC synchronizers read.
+
+Usage:
+    python cachewarm.py my_playlist.json --workers 4 --rate 10
+"""
+import argparse
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+import requests
+
+from artcache import ArtCache, itunes_lookup, make_cache_key
+from ratelimit import ITUNES_RATE_PER_MINUTE, PRIORITY_BACKGROUND, PriorityRateLimiter, retry_after_seconds
+from titleparse import SEPARATOR, UNKNOWN_ARTIST, candidate_splits
+
+DEFAULT_WORKERS = 4
+# iTunes allows roughly 20 lookups a minute per address, shared with a running app whose limiter
+# can't see this process; half is left for the app's own lookups of the track being shown
+DEFAULT_RATE_PER_MINUTE = ITUNES_RATE_PER_MINUTE // 2
+SAVE_EVERY = 25
+MAX_ATTEMPTS = 3
+
+TITLE_FIELDS = ('title', 'track', 'track name', 'song', 'name')
+ARTIST_FIELDS = ('artist', 'artist name', 'performer', 'album artist')
+
+
+# --- 1. INPUT PARSING ---
+
+def _pick(row, fields):
+    lowered = {str(k).strip().lower(): v for k, v in row.items()}
+    for field in fields:
+        value = lowered.get(field)
+        if isinstance(value, dict):
+            value = value.get('name')
+        if value:
+            return str(value).strip()
+    return None
+
+
+def _tracks_from_json(data):
+    # Qobuz API exports nest tracks as {"tracks": {"items": [...]}}
+    if isinstance(data, dict):
+        data = data.get('tracks', data.get('items', []))
+        if isinstance(data, dict):
+            data = data.get('items', [])
+    for item in data:
+        if isinstance(item, str):
+            yield from _tracks_from_lines([item])
+        elif isinstance(item, dict):
+            title = _pick(item, TITLE_FIELDS)
+            artist = _pick(item, ARTIST_FIELDS)
+            if title and artist:
+                yield title, artist
+
+
+def _tracks_from_csv(f):
+    for row in csv.DictReader(f):
+        title = _pick(row, TITLE_FIELDS)
+        artist = _pick(row, ARTIST_FIELDS)
+        if title and artist:
+            yield title, artist
+
+
+def _tracks_from_lines(lines):
+    for line in lines:
+        if SEPARATOR in line:
+            # Same reading of the line as the app gives the window title, so the cache keys match
+            title, artist = candidate_splits(line)[0]
+            if artist != UNKNOWN_ARTIST:
+                yield title, artist
+
+
+def read_tracks(path):
+    """Returns a de-duplicated list of (song_title, artist_name) from a CSV, JSON or text file."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.json'):
+            tracks = list(_tracks_from_json(json.load(f)))
+        elif path.lower().endswith('.csv'):
+            tracks = list(_tracks_from_csv(f))
+        else:
+            tracks = list(_tracks_from_lines(f))
+    seen = set()
+    unique = []
+    for title, artist in tracks:
+        key = make_cache_key(title, artist)
+        if key not in seen:
+            seen.add(key)
+            unique.append((title, artist))
+    return unique
+
+
+# --- 2. WARMING ---
+
+class CacheWarmer:
+    def __init__(self, cache, tracks, workers=DEFAULT_WORKERS, rate_per_minute=DEFAULT_RATE_PER_MINUTE,
+                 lookup=itunes_lookup):
+        self.cache = cache
+        self.lookup = lookup
+        self.workers = max(1, workers)
+        # Lookups run at background priority, evenly spaced (burst of 1) so all workers together
+        # stay under `rate_per_minute`
+        self.limiter = PriorityRateLimiter(rate_per_minute, burst=1, reserve=0)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # Anything already cached (hit or recorded miss) was handled by a previous run
+        self.pending = [t for t in tracks if make_cache_key(*t) not in cache]
+        self.skipped = len(tracks) - len(self.pending)
+        self.stats = {"found": 0, "not_found": 0, "errors": 0}
+        self._unsaved = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _resolve(self, song_title, artist_name):
+        for attempt in range(MAX_ATTEMPTS):
+            if not self.limiter.acquire(PRIORITY_BACKGROUND, stop_event=self._stop_event):
+                return None
+            try:
+                return self.lookup(song_title, artist_name)
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status in (403, 429):
+                    self.limiter.throttled(retry_after_seconds(e.response))
+                elif status is not None and status < 500:
+                    break
+            except requests.exceptions.RequestException:
+                self._stop_event.wait(2 ** attempt)
+        return None
+
+    def _record(self, key, result):
+        with self._lock:
+            if result is None:
+                self.stats["errors"] += 1
+                return
+            self.cache[key] = result
+            self.stats["found" if result[0] else "not_found"] += 1
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._unsaved = 0
+                self.cache.save()
+
+    def _worker(self, work):
+        while not self._stop_event.is_set():
+            try:
+                song_title, artist_name = work.get_nowait()
+            except queue.Empty:
+                return
+            result = self._resolve(song_title, artist_name)
+            if not self._stop_event.is_set():
+                self._record(make_cache_key(song_title, artist_name), result)
+
+    def run(self, report_interval=2.0, out=sys.stdout):
+        work = queue.Queue()
+        for track in self.pending:
+            work.put(track)
+        threads = [threading.Thread(target=self._worker, args=(work,), daemon=True) for _ in range(self.workers)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=report_interval)
+                self._report(started, out)
+        except KeyboardInterrupt:
+            print("\nInterrupted, saving progress (re-run to resume)...", file=out)
+            self.stop()
+            for t in threads:
+                t.join(timeout=10)
+        finally:
+            self.cache.save()
+        self._report(started, out)
+        return self.stats
+
+    def _report(self, started, out):
+        with self._lock:
+            done = sum(self.stats.values())
+            stats = dict(self.stats)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = done / elapsed
+        remaining = len(self.pending) - done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        limiter = self.limiter.snapshot()
+        print(f"[{done}/{len(self.pending)}] found={stats['found']} not_found={stats['not_found']} "
+              f"errors={stats['errors']} skipped={self.skipped} | {rate * 60:.1f} lookups/min | "
+              f"queued={limiter['queued']['background']} wait p50={limiter['wait_ms']['background']['p50']}ms "
+              f"| ETA {eta}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fill the Qobuz-RPC album art cache from a track list.")
+    parser.add_argument('input', help="CSV/JSON export of a library or playlist, or a 'Title - Artist' text file")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent lookup workers")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_PER_MINUTE, help="Max lookups per minute")
+    parser.add_argument('--cache', default=None, help="Cache file path (defaults to the app's cache)")
+    args = parser.parse_args(argv)
+
+    tracks = read_tracks(args.input)
+    cache = ArtCache.load(args.cache)
+    warmer = CacheWarmer(cache, tracks, workers=args.workers, rate_per_minute=args.rate)
+    print(f"{len(tracks)} tracks read, {warmer.skipped} already cached, {len(warmer.pending)} to resolve.")
+    stats = warmer.run()
+    return 0 if stats["errors"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Cover art thumbnails and accent colour for the desktop window.
+
+ThumbnailCache downloads each art URL once, decodes and downscales it with
+Pillow and stores the result as a raw PPM under the app data folder, keyed by a
+hash of the URL. A repeat play then costs one small file read: no download and
+no JPEG decode. Tk reads PPM natively, so the window only wraps the bytes in a
+PhotoImage. accent_color() picks the dominant saturated colour of a thumbnail,
+vectorized with NumPy when it is installed.
+
+CoverArtSink does all of this on its own sink worker (see sinks.py) and hands
+the finished image data and accent to a callback, which the app forwards to the
+Tk thread. Without Pillow only thumbnails already in the cache can be shown.
+"""
+import base64
+import hashlib
+import io
+import os
+
+import requests
+
+import eventlog
+from artcache import get_app_data_dir
+from sinks import Sink, atomic_write
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+THUMBNAIL_SIZE = 96
+THUMBNAIL_DIR_NAME = "thumbnails"
+MAX_THUMBNAILS = 2000
+DOWNLOAD_TIMEOUT = 5
+# Pixels greyer or darker than this don't vote for the accent colour
+MIN_CHROMA = 32
+MIN_VALUE = 48
+QUANT_SHIFT = 5  # 8 levels per channel, 512 colour bins
+
+
+def encode_ppm(width, height, pixels):
+    return f"P6\n{width} {height}\n255\n".encode('ascii') + pixels
+
+
+def ppm_pixels(data):
+    """The RGB bytes of a PPM written by encode_ppm."""
+    return data.split(b"\n", 3)[3]
+
+
+# --- 1. ACCENT COLOUR ---
+
+def _accent_numpy(pixels):
+    rgb = np.frombuffer(pixels, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    high, low = rgb.max(axis=1), rgb.min(axis=1)
+    weights = np.where((high - low >= MIN_CHROMA) & (high >= MIN_VALUE), high - low, 0)
+    if not weights.any():
+        return None
+    q = rgb >> QUANT_SHIFT
+    bins = (q[:, 0] << 6) | (q[:, 1] << 3) | q[:, 2]
+    best = np.bincount(bins, weights=weights, minlength=512).argmax()
+    members = bins == best
+    # Weighted mean of the winning bin, so the colour isn't snapped to the bin's corner
+    color = (rgb[members] * weights[members, None]).sum(axis=0) / weights[members].sum()
+    return tuple(int(round(c)) for c in color)
+
+
+def _accent_python(pixels):
+    scores = {}
+    for i in range(0, len(pixels) - 2, 3):
+        r, g, b = pixels[i], pixels[i + 1], pixels[i + 2]
+        high, low = max(r, g, b), min(r, g, b)
+        if high - low < MIN_CHROMA or high < MIN_VALUE:
+            continue
+        key = (r >> QUANT_SHIFT, g >> QUANT_SHIFT, b >> QUANT_SHIFT)
+        w = high - low
+        total = scores.get(key)
+        if total is None:
+            scores[key] = [w, r * w, g * w, b * w]
+        else:
+            total[0] += w
+            total[1] += r * w
+            total[2] += g * w
+            total[3] += b * w
+    if not scores:
+        return None
+    w, r, g, b = max(scores.values(), key=lambda total: total[0])
+    return round(r / w), round(g / w), round(b / w)
+
+
+def accent_color(pixels):
+    """Dominant saturated colour of packed RGB bytes as '#rrggbb', or None for a grey/dark image."""
+    color = _accent_numpy(pixels) if NUMPY_AVAILABLE else _accent_python(pixels)
+    return '#%02x%02x%02x' % color if color else None
+
+
+# --- 2. THUMBNAIL CACHE ---
+
+class ThumbnailCache:
+
+    def __init__(self, directory=None, size=THUMBNAIL_SIZE, max_entries=MAX_THUMBNAILS):
+        self.directory = directory or os.path.join(get_app_data_dir(), THUMBNAIL_DIR_NAME)
+        self.size = size
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "downloads": 0, "errors": 0}
+        self._session = requests.Session()
+        os.makedirs(self.directory, exist_ok=True)
+        self._prune()
+
+    def path_for(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".ppm")
+
+    def get(self, url):
+        """
+        Returns the thumbnail for `url` as PPM bytes, or None if it isn't cached and Pillow is missing.
+        Raises RequestException or OSError if the download or decode fails.
+        """
+        path = self.path_for(url)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # keeps recently shown covers out of _prune
+            self.stats["hits"] += 1
+            return data
+        except FileNotFoundError:
+            pass
+        if not PIL_AVAILABLE:
+            return None
+        try:
+            response = self._session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            image = Image.open(io.BytesIO(response.content)).convert("RGB")
+            image.thumbnail((self.size, self.size))
+            data = encode_ppm(image.width, image.height, image.tobytes())
+            atomic_write(path, data)
+        except (requests.exceptions.RequestException, OSError):
+            self.stats["errors"] += 1
+            raise
+        self.stats["downloads"] += 1
+        return data
+
+    def _prune(self):
+        """Drops the least recently shown thumbnails past `max_entries`."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".ppm")]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                os.remove(entry.path)
+        except OSError as e:
+            eventlog.warning("cover", "Could not prune cover thumbnails", error=str(e))
+
+    def close(self):
+        self._session.close()
+
+
+# --- 3. SINK ---
+
+class CoverArtSink(Sink):
+    """
+    Calls `on_cover(image_data, accent)` whenever the shown cover changes, from the sink worker.
+    `image_data` is base64 PPM ready for tk.PhotoImage(data=...); both are None when there is no cover.
+    """
+
+    name = "cover"
+
+    def __init__(self, on_cover, cache=None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_cover = on_cover
+        self.cache = cache
+        self._art_url = None
+
+    def write(self, state):
+        art_url = state["art_url"] if state["state"] == "playing" else None
+        if art_url == self._art_url:
+            return
+        self._art_url = art_url
+        if self.cache is None:
+            self.cache = ThumbnailCache()
+        image_data = accent = None
+        if art_url:
+            try:
+                ppm = self.cache.get(art_url)
+            except (requests.exceptions.RequestException, OSError) as e:
+                eventlog.warning("cover", "Cover thumbnail failed", url=art_url, error=str(e))
+                ppm = None
+            if ppm:
+                accent = accent_color(ppm_pixels(ppm))
+                image_data = base64.b64encode(ppm).decode('ascii')
+        self.on_cover(image_data, accent)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def stats(self):
+        stats = super().stats()
+        if self.cache is not None:
+            stats["thumbnails"] = dict(self.cache.stats)
+        return stats
@@ -0,0 +1,179 @@
+"""
+Self-healing Discord IPC connection.
+
+`PresenceConnection` wraps a pypresence `Presence` with the same
+update/clear/close interface. Instead of failing when Discord is not
+running (or restarts mid-session) it keeps reconnecting in the background
+with capped exponential backoff and jitter. Once the pipe is back, it
+replays the last presence that was set.
+"""
+import random
+import threading
+import time
+
+import eventlog
+
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+HEALTH_CHECK_SECONDS = 5.0
+
+
+class PresenceConnection:
+
+    def __init__(self, presence_factory, client_id, on_state_change=None, on_first_presence=None,
+                 initial_backoff=INITIAL_BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS):
+        self.presence_factory = presence_factory
+        self.client_id = client_id
+        self.on_state_change = on_state_change
+        # Called once with the monotonic time at which a presence first reached Discord
+        self.on_first_presence = on_first_presence
+        self.first_presence_at = None
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.reconnects = 0
+        self._ever_connected = False
+        self._rpc = None
+        self._last_presence = None  # kwargs of the last update, or None when cleared
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._disconnected_since = time.monotonic()
+        self._disconnected_total = 0.0
+        self._thread = None
+
+    # --- Connection state ---
+
+    def _set_connected(self, connected):
+        if connected == self.connected:
+            return
+        now = time.monotonic()
+        self.connected = connected
+        if connected:
+            self._disconnected_total += now - self._disconnected_since
+        else:
+            self._disconnected_since = now
+        if self.on_state_change:
+            self.on_state_change(connected)
+
+    def _mark_sent(self):
+        if self.first_presence_at is None:
+            self.first_presence_at = time.monotonic()
+            if self.on_first_presence:
+                self.on_first_presence(self.first_presence_at)
+
+    def _drop(self, error):
+        """Marks the pipe as broken and wakes the reconnect loop."""
+        eventlog.warning("discord", "Connection lost", error=str(error))
+        rpc, self._rpc = self._rpc, None
+        if rpc is not None:
+            try:
+                rpc.close()
+            except Exception as e:
+                eventlog.debug("discord", "Error closing the old connection", error=str(e))
+        self._set_connected(False)
+        self._wake.set()
+
+    def _try_connect(self):
+        try:
+            rpc = self.presence_factory(self.client_id)
+            rpc.connect()
+        except Exception as e:
+            eventlog.info("discord", "Connection attempt failed", error=str(e))
+            return False
+        with self._lock:
+            if self._closed.is_set():
+                rpc.close()
+                return False
+            self._rpc = rpc
+            if self._ever_connected:
+                self.reconnects += 1
+            self._ever_connected = True
+            self._set_connected(True)
+            # Replay whatever the synchronizer published while we were away
+            try:
+                if self._last_presence is not None:
+                    rpc.update(**self._last_presence)
+                    self._mark_sent()
+            except Exception as e:
+                self._drop(e)
+                return False
+            return True
+
+    def _is_healthy(self):
+        # pypresence keeps an asyncio writer for the pipe; a closing writer means Discord went away
+        writer = getattr(self._rpc, 'sock_writer', None)
+        return writer is None or not writer.is_closing()
+
+    def _supervise(self):
+        backoff = self.initial_backoff
+        while not self._closed.is_set():
+            if self.connected:
+                backoff = self.initial_backoff
+                self._wake.wait(HEALTH_CHECK_SECONDS)
+                self._wake.clear()
+                with self._lock:
+                    if self.connected and not self._is_healthy():
+                        self._drop("pipe closed")
+                continue
+            if self._try_connect():
+                continue
+            # Full jitter keeps many clients from reconnecting in lockstep after Discord restarts
+            self._closed.wait(random.uniform(0, backoff))
+            backoff = min(self.max_backoff, backoff * 2)
+
+    # --- Presence-compatible API ---
+
+    def connect(self):
+        """Tries once synchronously, then keeps (re)connecting in the background. Returns the first result."""
+        connected = self._try_connect()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._supervise, daemon=True)
+            self._thread.start()
+        return connected
+
+    def update(self, **kwargs):
+        with self._lock:
+            self._last_presence = kwargs
+            if not self.connected:
+                return False
+            try:
+                self._rpc.update(**kwargs)
+                self._mark_sent()
+                return True
+            except Exception as e:
+                self._drop(e)
+                return False
+
+    def clear(self):
+        with self._lock:
+            self._last_presence = None
+            if not self.connected:
+                return False
+            try:
+                self._rpc.clear()
+                return True
+            except Exception as e:
+                self._drop(e)
+                return False
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        with self._lock:
+            rpc, self._rpc = self._rpc, None
+            if rpc is not None:
+                try:
+                    rpc.close()
+                except Exception:
+                    pass
+            if self.connected:
+                self.connected = False
+                self._disconnected_since = time.monotonic()
+
+    def stats(self):
+        disconnected = self._disconnected_total
+        if not self.connected:
+            disconnected += time.monotonic() - self._disconnected_since
+        return {"connected": self.connected, "reconnects": self.reconnects,
+                "disconnected_seconds": round(disconnected, 1)}
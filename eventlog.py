@@ -0,0 +1,194 @@
+"""
+Structured, leveled event log shared by the synchronizers, the local API and the updater.
+
+`info(source, message, **fields)` (and debug/warning/error) only appends a tuple
+to a fixed-size in-memory ring: no formatting, no I/O and no lock on the calling
+thread, so it is cheap enough for the poll loop and request handlers. Events
+below the current level are dropped before anything is built.
+
+`start_flush()` starts a background thread that writes new events as JSON lines
+to a rotating file (qobuz-rpc.log next to the art cache) and echoes them to the
+console, so console runs look as before while windowed builds, where print goes
+nowhere, still keep a record. Until then (command-line tools) events are
+printed as they happen. `recent(n)` returns the last n events for the
+log window and GET /logs.
+"""
+import collections
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+RING_SIZE = 2000
+LOG_FILE_NAME = "qobuz-rpc.log"
+MAX_LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+def format_event(event):
+    seq, t, level, source, message, fields = event
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+    extra = " ".join(f"{k}={v}" for k, v in fields.items())
+    return f"{stamp} {LEVEL_NAMES[level].upper():<7} [{source}] {message}" + (f" ({extra})" if extra else "")
+
+
+def event_to_dict(event):
+    seq, t, level, source, message, fields = event
+    return {"seq": seq, "t": round(t, 3), "level": LEVEL_NAMES[level], "source": source, "message": message,
+            **({"fields": fields} if fields else {})}
+
+
+class EventLog:
+
+    def __init__(self, size=RING_SIZE, level=INFO):
+        self.level = level
+        self._ring = collections.deque(maxlen=size)
+        # next() on itertools.count is atomic under the GIL, as is deque.append
+        self._seq = itertools.count(1)
+        self._flushed_seq = 0
+        self._echoed_seq = 0
+        self.lost = 0  # events overwritten in the ring before they reached the file
+        self.path = None
+        self.echo = True
+        self._file = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._flush_lock = threading.Lock()
+
+    def log(self, level, source, message, **fields):
+        if level < self.level:
+            return
+        event = (next(self._seq), time.time(), level, source, message, fields)
+        self._ring.append(event)
+        if self._thread is None and self.echo:
+            print(format_event(event))
+            self._echoed_seq = event[0]
+
+    def debug(self, source, message, **fields):
+        self.log(DEBUG, source, message, **fields)
+
+    def info(self, source, message, **fields):
+        self.log(INFO, source, message, **fields)
+
+    def warning(self, source, message, **fields):
+        self.log(WARNING, source, message, **fields)
+
+    def error(self, source, message, **fields):
+        self.log(ERROR, source, message, **fields)
+
+    def recent(self, n=100, min_level=DEBUG):
+        """The last `n` events at or above `min_level`, oldest first."""
+        events = [e for e in self._ring.copy() if e[2] >= min_level]
+        return events[-n:] if n else events
+
+    # --- File flushing ---
+
+    def start_flush(self, path=None, echo=True):
+        """Starts the background writer; repeated calls are ignored."""
+        if self._thread is not None:
+            return
+        from artcache import get_app_data_dir  # artcache logs through this module
+        self.path = path or os.path.join(get_app_data_dir(), LOG_FILE_NAME)
+        self.echo = echo
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="eventlog-flush", daemon=True)
+        self._thread.start()
+
+    def stop_flush(self, timeout=2.0):
+        """Writes whatever is pending and stops the writer."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._stop_event.wait(FLUSH_INTERVAL_SECONDS):
+            self.flush()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def flush(self):
+        with self._flush_lock:
+            new = [e for e in self._ring.copy() if e[0] > self._flushed_seq]
+            if not new:
+                return
+            if new[0][0] > self._flushed_seq + 1:
+                self.lost += new[0][0] - self._flushed_seq - 1
+            self._flushed_seq = new[-1][0]
+            if self.echo and sys.stdout is not None:
+                for event in new:
+                    if event[0] > self._echoed_seq:
+                        print(format_event(event))
+            if self.path is None:
+                return
+            try:
+                self._open()
+                self._file.write("".join(json.dumps(event_to_dict(e), ensure_ascii=False, default=str) + "\n"
+                                         for e in new))
+                self._file.flush()
+                if self._file.tell() >= MAX_LOG_BYTES:
+                    self._rotate()
+            except OSError as e:
+                self.path = None  # keep the ring working without a file
+                print(f"Event log file disabled: {e}")
+
+    def stats(self):
+        return {"buffered": len(self._ring), "level": LEVEL_NAMES[self.level], "lost": self.lost,
+                "path": self.path}
+
+
+# One log per process; modules call the functions below
+EVENTS = EventLog()
+log = EVENTS.log
+debug = EVENTS.debug
+info = EVENTS.info
+warning = EVENTS.warning
+error = EVENTS.error
+recent = EVENTS.recent
+start_flush = EVENTS.start_flush
+stop_flush = EVENTS.stop_flush
+
+
+def show_log_window(master, n=200):
+    """Read-only window with the last `n` events; the Copy button puts them on the clipboard for support."""
+    import tkinter as tk
+
+    text = "\n".join(format_event(e) for e in recent(n)) or "No events yet."
+    window = tk.Toplevel(master)
+    window.title("Event Log")
+    window.geometry("700x400")
+    window.configure(bg='#36393F')
+    box = tk.Text(window, bg='#2F3136', fg='#FFFFFF', font=('Consolas', 9), wrap='none', relief='flat')
+    box.insert('1.0', text)
+    box.config(state=tk.DISABLED)
+    box.see(tk.END)
+    box.pack(fill='both', expand=True, padx=10, pady=(10, 5))
+
+    def copy():
+        window.clipboard_clear()
+        window.clipboard_append(text)
+
+    tk.Button(window, text="Copy", command=copy, bg='#40444B', fg='#FFFFFF', relief='flat',
+              activebackground='#40444B', activeforeground='#FFFFFF').pack(pady=(0, 10))
@@ -0,0 +1,329 @@
+"""
+Local listening history (SQLite, WAL mode).
+
+`record_play` only appends to an in-memory buffer; a background writer
+flushes the buffer in batches (one transaction per batch), so the
+synchronizer never waits on disk. Aggregate tables per artist, track and day
+are updated in the same transactions, so top-N and per-day queries read a few
+indexed rows instead of scanning years of plays.
+
+Export:
+    python history.py export plays.csv        (or .json)
+    python history.py top
+"""
+import argparse
+import collections
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import eventlog
+from artcache import get_app_data_dir
+
+HISTORY_FILE_NAME = "history.sqlite3"
+FLUSH_INTERVAL_SECONDS = 5.0
+FLUSH_BATCH_SIZE = 50
+MAX_BUFFERED_PLAYS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    album TEXT,
+    duration_ms INTEGER,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS plays_played_at ON plays (played_at);
+CREATE INDEX IF NOT EXISTS plays_artist ON plays (artist, played_at);
+
+CREATE TABLE IF NOT EXISTS artist_stats (
+    artist TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL,
+    last_played REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artist_stats_plays ON artist_stats (plays DESC);
+
+CREATE TABLE IF NOT EXISTS track_stats (
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    plays INTEGER NOT NULL,
+    last_played REAL NOT NULL,
+    PRIMARY KEY (title, artist)
+);
+CREATE INDEX IF NOT EXISTS track_stats_plays ON track_stats (plays DESC);
+
+CREATE TABLE IF NOT EXISTS day_stats (
+    day TEXT PRIMARY KEY,
+    plays INTEGER NOT NULL,
+    listened_ms INTEGER NOT NULL
+);
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class HistoryStore:
+
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL_SECONDS):
+        self.path = path or os.path.join(get_app_data_dir(), HISTORY_FILE_NAME)
+        self.flush_interval = flush_interval
+        self._buffer = collections.deque(maxlen=MAX_BUFFERED_PLAYS)
+        # Held for appends and re-queues, so a failed batch can't push out plays recorded meanwhile
+        self._buffer_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flushed = threading.Condition()
+        self.stats = {"recorded": 0, "written": 0, "batches": 0, "errors": 0, "dropped": 0}
+
+        writer = _connect(self.path)
+        writer.executescript(SCHEMA)
+        writer.commit()
+        self._writer_conn = writer
+        self._reader_conn = _connect(self.path)
+        self._reader_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._write_behind, daemon=True)
+        self._thread.start()
+
+    # --- Hot path ---
+
+    def record_play(self, title, artist, album=None, duration_ms=None, source=None, played_at=None):
+        """Never blocks on disk; the play is written with the next batch."""
+        with self._buffer_lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                # Disk has been failing for a long time; the oldest buffered play gives way
+                self.stats["dropped"] += 1
+            played_at = time.time() if played_at is None else played_at
+            self._buffer.append((played_at, title, artist, album, duration_ms, source))
+            self.stats["recorded"] += 1
+        if len(self._buffer) >= FLUSH_BATCH_SIZE:
+            self._wake.set()
+
+    # --- Write-behind ---
+
+    def _take_batch(self):
+        batch = []
+        while self._buffer:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def _requeue(self, batch):
+        """
+        Puts a failed batch back in front of the plays recorded since. If both don't fit, the
+        oldest plays of the batch are dropped (and counted); extendleft on the full deque would
+        push out the newest ones instead.
+        """
+        with self._buffer_lock:
+            overflow = len(batch) + len(self._buffer) - self._buffer.maxlen
+            if overflow > 0:
+                self.stats["dropped"] += overflow
+                batch = batch[overflow:]
+            self._buffer.extendleft(reversed(batch))
+        return max(overflow, 0)
+
+    def _write_batch(self, batch):
+        rows = []
+        for played_at, title, artist, album, duration_ms, source in batch:
+            day = time.strftime("%Y-%m-%d", time.localtime(played_at))
+            rows.append((played_at, day, title, artist, album, duration_ms, source))
+        conn = self._writer_conn
+        with conn:
+            conn.executemany("INSERT INTO plays (played_at, day, title, artist, album, duration_ms, source) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO artist_stats (artist, plays, last_played) VALUES (?, 1, ?) "
+                             "ON CONFLICT(artist) DO UPDATE SET plays = plays + 1, "
+                             "last_played = max(last_played, excluded.last_played)",
+                             [(r[3], r[0]) for r in rows])
+            conn.executemany("INSERT INTO track_stats (title, artist, plays, last_played) VALUES (?, ?, 1, ?) "
+                             "ON CONFLICT(title, artist) DO UPDATE SET plays = plays + 1, "
+                             "last_played = max(last_played, excluded.last_played)",
+                             [(r[2], r[3], r[0]) for r in rows])
+            conn.executemany("INSERT INTO day_stats (day, plays, listened_ms) VALUES (?, 1, ?) "
+                             "ON CONFLICT(day) DO UPDATE SET plays = plays + 1, "
+                             "listened_ms = listened_ms + excluded.listened_ms",
+                             [(r[1], r[5] or 0) for r in rows])
+
+    def _flush_once(self):
+        batch = self._take_batch()
+        if batch:
+            try:
+                self._write_batch(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                dropped = self._requeue(batch)
+                eventlog.error("history", "History write failed; plays kept for retry", plays=len(batch) - dropped,
+                               dropped=dropped, error=str(e))
+        with self._flushed:
+            self._flushed.notify_all()
+
+    def _write_behind(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush_once()
+        self._flush_once()
+
+    def flush(self, timeout=5.0):
+        """Asks the writer to flush now and waits for it (export and shutdown use this)."""
+        with self._flushed:
+            self._wake.set()
+            self._flushed.wait(timeout)
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._writer_conn.close()
+        with self._reader_lock:
+            self._reader_conn.close()
+
+    # --- Queries (separate read connection; WAL readers don't block the writer) ---
+
+    def _query(self, sql, params=()):
+        with self._reader_lock:
+            return self._reader_conn.execute(sql, params).fetchall()
+
+    def top_artists(self, limit=10, since=None):
+        if since is None:
+            return self._query("SELECT artist, plays FROM artist_stats ORDER BY plays DESC LIMIT ?", (limit,))
+        return self._query("SELECT artist, COUNT(*) AS n FROM plays WHERE played_at >= ? "
+                           "GROUP BY artist ORDER BY n DESC LIMIT ?", (since, limit))
+
+    def top_tracks(self, limit=10, since=None):
+        if since is None:
+            return self._query("SELECT title, artist, plays FROM track_stats ORDER BY plays DESC LIMIT ?", (limit,))
+        return self._query("SELECT title, artist, COUNT(*) AS n FROM plays WHERE played_at >= ? "
+                           "GROUP BY title, artist ORDER BY n DESC LIMIT ?", (since, limit))
+
+    def plays_by_day(self, days=30):
+        first_day = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+        return self._query("SELECT day, plays, listened_ms FROM day_stats WHERE day > ? ORDER BY day", (first_day,))
+
+    def total_plays(self):
+        return self._query("SELECT COALESCE(SUM(plays), 0) FROM day_stats")[0][0]
+
+    def iter_plays(self, batch_size=1000):
+        """Yields every play in order without loading the whole table."""
+        last_id = 0
+        while True:
+            rows = self._query("SELECT id, played_at, title, artist, album, duration_ms, source FROM plays "
+                               "WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+
+def open_default_store():
+    """Opens the app's history database, or returns None (history disabled) if it can't be opened."""
+    try:
+        return HistoryStore()
+    except (sqlite3.Error, OSError) as e:
+        eventlog.warning("history", "Listening history disabled", error=str(e))
+        return None
+
+
+# --- EXPORT / CLI ---
+
+EXPORT_COLUMNS = ("id", "played_at", "title", "artist", "album", "duration_ms", "source")
+
+
+def export_history(store, path):
+    store.flush()
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.json'):
+            json.dump([dict(zip(EXPORT_COLUMNS, row)) for row in store.iter_plays()], f, ensure_ascii=False)
+        else:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            writer.writerows(store.iter_plays())
+
+
+def format_summary(store, limit=10):
+    lines = [f"Total plays: {store.total_plays()}", "", "Top artists:"]
+    lines += [f"  {plays:>5}  {artist}" for artist, plays in store.top_artists(limit)]
+    lines += ["", "Top tracks:"]
+    lines += [f"  {plays:>5}  {title} - {artist}" for title, artist, plays in store.top_tracks(limit)]
+    lines += ["", "Last 7 days:"]
+    lines += [f"  {day}  {plays:>4} plays  {listened_ms // 60000:>4} min" for day, plays, listened_ms
+              in store.plays_by_day(7)]
+    return "\n".join(lines)
+
+
+# --- GUI ---
+
+def show_stats_window(master, store):
+    """Opens a stats window; the queries run on a worker thread and only the finished text touches Tk."""
+    import tkinter as tk
+    from tkinter import messagebox
+
+    if store is None:
+        messagebox.showinfo("Listening Stats", "Listening history is not available.")
+        return
+
+    window = tk.Toplevel(master)
+    window.title("Listening Stats")
+    window.configure(bg='#36393F')
+    text = tk.Text(window, width=70, height=30, bg='#2F3136', fg='#FFFFFF', font=('Consolas', 10), relief='flat')
+    text.pack(fill='both', expand=True, padx=10, pady=10)
+    text.insert('end', "Loading...")
+    text.config(state=tk.DISABLED)
+
+    def _show(summary):
+        if not window.winfo_exists():
+            return
+        text.config(state=tk.NORMAL)
+        text.delete('1.0', 'end')
+        text.insert('end', summary)
+        text.config(state=tk.DISABLED)
+
+    def _load():
+        try:
+            summary = format_summary(store)
+        except sqlite3.Error as e:
+            summary = f"History unavailable: {e}"
+        master.after(0, lambda: _show(summary))
+
+    threading.Thread(target=_load, daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Qobuz-RPC listening history")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Export every play to CSV or JSON")
+    export.add_argument('output')
+    top = sub.add_parser('top', help="Print top artists/tracks and recent days")
+    top.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--db', default=None, help="History database path (defaults to the app's)")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db)
+    try:
+        if args.command == 'export':
+            export_history(store, args.output)
+            print(f"Exported to {args.output}")
+        else:
+            print(format_summary(store, args.limit))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Single-instance guard for the desktop app.
+
+The first instance binds a loopback "lock socket"; the bind itself is the lock,
+and the OS releases it even if the process crashes. A second launch fails to
+bind, connects to the running instance instead, hands over its command and
+exits, all within a few milliseconds and before any GUI or cache is loaded.
+Commands are accepted from the moment the lock is held; those arriving while the
+first instance is still starting up are queued and run once it calls serve().
+
+Wire protocol: one line "QOBUZ-RPC <command>\n", answered with "OK\n" or "ERR <reason>\n".
+"""
+import socket
+import sys
+import threading
+
+INSTANCE_MAGIC = "QOBUZ-RPC"
+INSTANCE_COMMANDS = ("show", "start", "stop")
+CONNECT_TIMEOUT_SECONDS = 0.5
+# A peer that accepted the connection but doesn't answer within this is taken to be a busy instance
+REPLY_TIMEOUT_SECONDS = 2.0
+
+
+class InstanceLock:
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self._sock = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._on_command = None
+        self._pending = []
+
+    def acquire(self):
+        """Returns True if this process is now the only instance."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if sys.platform == 'win32':
+            # Without this, Windows lets a second process bind the same port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((self.host, self.port))
+            sock.listen(4)
+        except OSError:
+            sock.close()
+            return False
+        self._sock = sock
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return True
+
+    def serve(self, on_command):
+        """
+        Runs commands from later launches from now on, starting with any queued since acquire().
+        `on_command(command)` runs on the lock thread (or the caller's, for queued commands).
+        """
+        # Held while queued commands run, so a new one can't overtake them
+        with self._lock:
+            for command in self._pending:
+                on_command(command)
+            self._pending = []
+            self._on_command = on_command
+
+    def _dispatch(self, command):
+        with self._lock:
+            if self._on_command is None:
+                self._pending.append(command)
+            else:
+                self._on_command(command)
+
+    def _accept_loop(self):
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                conn.settimeout(CONNECT_TIMEOUT_SECONDS)
+                try:
+                    line = conn.makefile('r', encoding='utf-8').readline().strip()
+                    magic, _, command = line.partition(' ')
+                    if magic != INSTANCE_MAGIC or command not in INSTANCE_COMMANDS:
+                        conn.sendall(b"ERR unknown command\n")
+                        continue
+                    self._dispatch(command)
+                    conn.sendall(b"OK\n")
+                except OSError:
+                    continue
+
+    def release(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                # close() alone doesn't wake a blocked accept() on Linux
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+def send_instance_command(command, port, host='127.0.0.1'):
+    """
+    Hands `command` to the running instance. Returns False if nothing accepted the connection or
+    whatever holds the port answered but not as an instance. A peer that accepted and then stays
+    silent counts as a running instance that is busy, not as a foreign program.
+    """
+    try:
+        conn = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT_SECONDS)
+    except OSError:
+        return False
+    with conn:
+        try:
+            conn.settimeout(REPLY_TIMEOUT_SECONDS)
+            conn.sendall(f"{INSTANCE_MAGIC} {command}\n".encode('utf-8'))
+            reply = conn.makefile('r', encoding='utf-8').readline()
+        except socket.timeout:
+            return True
+        except OSError:
+            return False
+    return reply.startswith("OK")
@@ -0,0 +1,58 @@
+import tkinter as tk
+
+from macOS import RPC_AVAILABLE, QobuzRPCApp, RPCSynchronizer
+from mpris import MPRIS_AVAILABLE, MprisTrackSource
+from pipeline import TrackRecord
+
+
+# --- 1. RPC SYNCHRONIZER THREAD (MPRIS) ---
+
+class MprisRPCSynchronizer(RPCSynchronizer):
+    """
+    Linux synchronizer driven by MPRIS D-Bus signals instead of polling.
+    MPRIS usually supplies art and length itself, so the pipeline only asks iTunes when it doesn't.
+    """
+
+    def __init__(self, app_instance, client_id, bus='SESSION'):
+        super().__init__(app_instance, client_id)
+        self.bus = bus
+
+    def _on_track(self, track):
+        if track is None:
+            self.pipeline.submit(TrackRecord.closed(source="mpris"))
+            return
+        self.pipeline.submit(TrackRecord.from_fields(
+            track["title"], artist=track["artist"], album=track["album"], art_url=track["art_url"],
+            duration_ms=track["length_ms"], position_ms=track["position_ms"], playing=track["playing"],
+            source="mpris", raw=track))
+
+    def run(self):
+        """The main execution loop for the thread."""
+        if not RPC_AVAILABLE or not MPRIS_AVAILABLE:
+            self.app.update_status("Error: Missing Libraries", color=self.app.color_status_fail)
+            return
+
+        self.connect_discord()
+        self.pipeline.start()
+        self.art_cache.start_autosave()
+        source = MprisTrackSource(self._on_track, bus=self.bus)
+        source.start()
+        # Signals arrive on the MPRIS thread and go straight into the pipeline; nothing to poll here
+        self._stop_event.wait()
+        source.stop()
+        self.pipeline.stop()
+        self.art_cache.stop_autosave()
+        if self.recorder:
+            self.recorder.close()
+
+
+# --- 2. TKINTER GUI ---
+
+class LinuxRPCApp(QobuzRPCApp):
+    synchronizer_class = MprisRPCSynchronizer
+
+
+if __name__ == '__main__':
+    root = tk.Tk()
+    app = LinuxRPCApp(root)
+    root.mainloop()
@@ -0,0 +1,251 @@
+"""
+Load generator for the local API (POST /update).
+
+By default it starts the real `create_local_api` server in-process on a free
+port, wired to a longserver synchronizer with Discord and art lookups faked,
+and reports the process's RSS growth. --trace-memory adds tracemalloc figures
+(Python-level growth and peak) at the cost of roughly 3x lower throughput, so
+don't compare its latencies with untraced runs. Pass --url to drive an
+already running longserver instead (no memory figures).
+
+Usage:
+    python loadtest.py --concurrency 8 --rate 200 --duration 20 --titles changing
+    python loadtest.py --concurrency 32 --rate 0 --titles same          # as fast as possible
+    python loadtest.py --titles burst --burst-size 50 --lookup-latency 0.2
+    python loadtest.py --url http://127.0.0.1:5000 --rate 20
+
+With a fixed --rate, latency is measured from each request's scheduled send
+time, so a server that falls behind shows up in p99 instead of being hidden
+by the workers slowing down.
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import requests
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from artcache import ArtCache
+from replay import FakePresence, ReplayApp, _percentile
+
+
+# --- 1. IN-PROCESS SERVER WITH FAKE BACKENDS ---
+
+class CountingPresence(FakePresence):
+    """FakePresence that only counts, so the harness itself doesn't grow with the number of updates."""
+
+    def __init__(self):
+        super().__init__()
+        self.update_count = 0
+
+    def update(self, **kwargs):
+        self.update_count += 1
+        return True
+
+
+class HeadlessApp(ReplayApp):
+    """What create_local_api needs from QobuzRPCApp, without Tk."""
+
+    def __init__(self):
+        self.running = True
+        self.rpc_thread = None
+
+
+def start_local_server(lookup_latency=0.0):
+    """Starts the local API on a free port. Returns (base_url, sync, stop)."""
+    from werkzeug.serving import make_server
+    from longserver import CLIENT_ID, RPCSynchronizer, create_local_api
+
+    # Per-request access logging would dominate the measurement
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app = HeadlessApp()
+    sync = RPCSynchronizer(app, CLIENT_ID)
+    sync.rpc = CountingPresence()
+    sync.art_cache = ArtCache(path=os.path.join(tempfile.mkdtemp(prefix="qobuz-load-"), "art_cache.json"))
+
+    def fake_lookup(song_title, artist_name):
+        if lookup_latency:
+            time.sleep(lookup_latency)
+        return f"https://example.invalid/art/{abs(hash((song_title, artist_name)))}.jpg", 200000
+
+    sync.fetch_album_art_and_duration = fake_lookup
+    app.rpc_thread = sync
+    sync.pipeline.start()
+
+    server = make_server('127.0.0.1', 0, create_local_api(app), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        sync.pipeline.stop()
+
+    return f"http://127.0.0.1:{server.server_port}", sync, stop
+
+
+# --- 2. LOAD GENERATION ---
+
+def title_generator(mode, burst_size=20, artists=50):
+    """Yields window titles: 'same' repeats one, 'changing' never repeats, 'burst' repeats each `burst_size` times."""
+    for i in itertools.count():
+        if mode == "same":
+            yield "Load Test Song - Load Test Artist"
+        elif mode == "changing":
+            yield f"Song {i} - Artist {i % artists}"
+        else:
+            n = i // burst_size
+            yield f"Song {n} - Artist {n % artists}"
+
+
+class LoadRun:
+
+    def __init__(self, url, concurrency, rate, duration, titles, timeout=5.0):
+        self.url = url.rstrip('/') + "/update"
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self._titles = titles
+        self._slots = itertools.count()
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = {}
+        self.started = None
+
+    def _next(self):
+        with self._lock:
+            return next(self._slots), next(self._titles)
+
+    def _error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def _worker(self, deadline):
+        session = requests.Session()
+        while True:
+            slot, title = self._next()
+            scheduled = self.started + slot / self.rate if self.rate else time.perf_counter()
+            if scheduled >= deadline:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = scheduled if self.rate else time.perf_counter()
+            try:
+                response = session.post(self.url, json={"title": title}, timeout=self.timeout)
+                if response.status_code != 200:
+                    self._error(f"http_{response.status_code}")
+                    continue
+            except requests.exceptions.RequestException as e:
+                self._error(type(e).__name__)
+                continue
+            latency = time.perf_counter() - sent
+            with self._lock:
+                self.latencies.append(latency)
+
+    def run(self):
+        self.started = time.perf_counter()
+        deadline = self.started + self.duration
+        workers = [threading.Thread(target=self._worker, args=(deadline,), daemon=True)
+                   for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - self.started
+
+
+# --- 3. REPORT ---
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _rss_kb():
+    """Current RSS with psutil; without it, the peak RSS (Unix only), which still shows growth."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss // 1024
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_load_test(url=None, concurrency=4, rate=100.0, duration=10.0, titles="changing", burst_size=20,
+                  lookup_latency=0.0, trace_memory=False):
+    sync = stop = None
+    if url is None:
+        if trace_memory:
+            tracemalloc.start()
+        url, sync, stop = start_local_server(lookup_latency)
+        traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = _rss_kb()
+        threads_before = threading.active_count()
+
+    load = LoadRun(url, concurrency, rate, duration, title_generator(titles, burst_size))
+    elapsed = load.run()
+
+    ok = len(load.latencies)
+    failed = sum(load.errors.values())
+    report = {
+        "requests": ok + failed,
+        "throughput_rps": round((ok + failed) / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(failed / (ok + failed), 4) if ok + failed else 0.0,
+        "errors": load.errors,
+        "latency_ms": {"p50": _ms(_percentile(load.latencies, 50)), "p99": _ms(_percentile(load.latencies, 99)),
+                       "max": _ms(max(load.latencies, default=0.0))},
+    }
+    if sync is not None:
+        sync.pipeline.drain()
+        rss_after = _rss_kb()
+        report["rss_growth_kb"] = rss_after - rss_before if rss_before is not None else None
+        if trace_memory:
+            traced_after, traced_peak = tracemalloc.get_traced_memory()
+            report["traced_growth_kb"] = round((traced_after - traced_before) / 1024, 1)
+            report["traced_peak_kb"] = round(traced_peak / 1024, 1)
+        report.update({
+            "thread_growth": threading.active_count() - threads_before,
+            "art_cache_entries": len(sync.art_cache),
+            "discord_updates": sync.rpc.update_count,
+            "pipeline": sync.pipeline.stats(),
+            "reconciler": sync.reconciler.snapshot(),
+        })
+        stop()
+        if trace_memory:
+            tracemalloc.stop()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Qobuz-RPC local API (POST /update).")
+    parser.add_argument('--url', default=None, help="Target a running server instead of an in-process one")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=100.0, help="Total requests per second (0 = unthrottled)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to generate load")
+    parser.add_argument('--titles', choices=("same", "changing", "burst"), default="changing")
+    parser.add_argument('--burst-size', type=int, default=20, help="Repeats per title in burst mode")
+    parser.add_argument('--lookup-latency', type=float, default=0.0, help="Simulated art lookup delay in seconds")
+    parser.add_argument('--trace-memory', action='store_true', help="Also report tracemalloc growth (slows the server)")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args.url, args.concurrency, args.rate, args.duration, args.titles, args.burst_size,
+                           args.lookup_latency, args.trace_memory)
+    width = max(len(k) for k in report)
+    for key, value in report.items():
+        print(f"{key.ljust(width)}  {value}")
+    return 1 if report["error_rate"] > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
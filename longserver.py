@@ -23,9 +23,27 @@ from tkinter import messagebox
 import threading
 import time
 import os
+import subprocess
+import sys
 import requests
 from packaging.version import parse as parse_version
 from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+import eventlog
+from artcache import ArtCache, art_lookup_stats, resolve_art
+from pushchannel import PlaybackEventServer
+from reconcile import Reconciler
+from discordconn import PresenceConnection
+from recorder import SessionRecorder
+from history import open_default_store, show_stats_window
+from eventlog import show_log_window
+from coverart import THUMBNAIL_SIZE, CoverArtSink
+from sinks import SinkPublisher
+from pipeline import TrackRecord, build_presence_pipeline
+from titleparse import TITLES
+from instance import INSTANCE_COMMANDS, InstanceLock, send_instance_command
+from updater import Updater, UpdateError, apply_pending_update, remove_old_files
+from supervisor import Supervisor
 
 # --- External Windows and RPC Libraries ---
 try:
@@ -41,7 +59,7 @@ try:
     IsWindowVisible = ctypes.windll.user32.IsWindowVisible
 except (ImportError, AttributeError):
     RPC_AVAILABLE = False
-    print("Warning: Missing required libraries. RPC functionality disabled.")
+    eventlog.warning("startup", "Missing required libraries. RPC functionality disabled.")
 
 
     class Presence:
@@ -67,6 +85,27 @@ VERSION_URL = "https://raw.githubusercontent.com/Seeyaflying/Qobuz-RPC/main/late
 DOWNLOAD_URL = "https://github.com/Seeyaflying/Qobuz-RPC/releases/latest"
 CLIENT_ID = "928957672907227147"
 QOBUZ_PROCESS_NAME = "Qobuz.exe"
+LOCAL_API_PORT = 5000
+PUSH_CHANNEL_PORT = 5001
+# Seconds Stop and Close wait for workers to finish
+WORKER_STOP_DEADLINE_SECONDS = 5
+# Loopback port held by the running instance; later launches hand their command to it
+INSTANCE_PORT = 5002
+# Auto-start mode (also `longserver.py start`): RPC starts at launch and the update check is deferred
+AUTOSTART_ENV_VAR = "QOBUZ_RPC_AUTOSTART"
+UPDATE_CHECK_DEFER_SECONDS = 30
+# Release manifest for in-place updates of the standalone build (see updater.py)
+UPDATE_MANIFEST_URL = os.environ.get("QOBUZ_RPC_UPDATE_MANIFEST_URL",
+                                     "https://github.com/Seeyaflying/Qobuz-RPC/releases/latest/download/manifest.json")
+
+
+def get_install_dir():
+    """Folder of the standalone build, or None when running from source (never self-update a checkout)."""
+    if os.environ.get("QOBUZ_RPC_INSTALL_DIR"):
+        return os.environ["QOBUZ_RPC_INSTALL_DIR"]
+    if "__compiled__" in globals():
+        return os.path.dirname(os.path.abspath(sys.argv[0]))
+    return None
 
 
 def fetch_latest_version(url, max_retries=3):
@@ -75,7 +114,8 @@ def fetch_latest_version(url, max_retries=3):
             response = requests.get(url, timeout=5)
             response.raise_for_status()
             return response.text.strip()
-        except requests.exceptions.RequestException:
+        except requests.exceptions.RequestException as e:
+            eventlog.warning("updater", "Version check failed", attempt=attempt + 1, error=str(e))
             if attempt < max_retries - 1:
                 time.sleep(2 ** attempt)
     return None
@@ -92,75 +132,95 @@ def check_for_updates_logic(local_version, version_url, download_url):
                        f"Please download from:\n{download_url}")
             return {"status": "update", "message": message, "remote_version": remote_version_str}
         return {"status": "ok", "message": f"Running latest version (v{local_version})."}
-    except Exception:
+    except Exception as e:
+        eventlog.warning("updater", "Unreadable version file", content=remote_version_str[:40], error=str(e))
         return {"status": "error", "message": "Update check failed (Parsing Error)."}
 
 
 class RPCSynchronizer(threading.Thread):
+    # Seconds between window title checks (the soak test shortens it to run in accelerated time)
+    poll_interval = 2
+
     def __init__(self, app_instance, client_id):
         super().__init__()
         self.app = app_instance
         self.client_id = client_id
         self._stop_event = threading.Event()
         self.rpc = None
-        self.art_cache = {}
-
-    def force_update_presence(self, title):
-        def _update_task():
-            try:
-                if not self.rpc:
-                    print("RPC not connected, cannot update presence.")
-                    return
-                if not title:
-                    self.rpc.clear()
-                    self.app.update_status("Qobuz: Cleared by remote")
-                    return
-
-                song_title, artist_name = (title.rsplit(' - ', 1) + ["Unknown Artist"])[:2]
-                self.app.update_status(f"Qobuz: Searching for art for '{song_title}'...")
-                art_url, _ = self.fetch_album_art_and_duration(song_title.strip(), artist_name.strip())
-
-                self.rpc.update(
-                    details=song_title,
-                    state=f"by {artist_name}",
-                    large_image=art_url or "qobuz",
-                    large_text=f"{song_title} - {artist_name}",
-                    small_image="qobuz_icon",
-                    small_text="Qobuz Player"
-                )
-                self.app.update_status(f"Qobuz: Updated to '{song_title}'")
-            except Exception as e:
-                print(f"Force update failed: {e}")
-                self.app.update_status(f"Qobuz: Update failed", color=self.app.color_status_fail)
-
-        self.app.master.after(0, _update_task)
+        self._last_poll_error = None
+        # Loaded in run(), in parallel with the Discord connection and the first Qobuz scan
+        self.art_cache = None
+        self.started_at = time.monotonic()
+        self.first_presence = threading.Event()
+        self.time_to_first_presence = None
+        # Poll, POST /update and the push channel race each other; only the authoritative observation is published
+        self.reconciler = Reconciler()
+        # Optional session recording for replay.py (QOBUZ_RPC_RECORD=<path>)
+        self.recorder = SessionRecorder.from_env()
+        # Parsing, art lookup and publishing run off the Tk thread in the shared pipeline
+        self.pipeline = build_presence_pipeline(self, self.recorder, getattr(app_instance, 'history', None),
+                                                getattr(app_instance, 'sinks', None))
+        self._submit_lock = threading.Lock()
+
+    def _submit(self, observation, record):
+        # Accept and submit together, so an older accepted record can't be handed over after a newer one
+        with self._submit_lock:
+            if self.reconciler.accept(observation):
+                self.pipeline.submit(record)
+                return
+        if self.recorder:
+            self.recorder.record({"t": record.t, "src": record.source, "seq": record.seq, "raw": record.raw,
+                                  "out": "dropped"})
+
+    def force_update_presence(self, title, source="push"):
+        observation = self.reconciler.observe(source, title, key=title or "")
+        self._submit(observation, TrackRecord.from_title(title, source=source, seq=observation.seq))
+
+    def apply_playback_event(self, event):
+        """Publishes a structured event from the push channel; no title parsing, and no lookup if art is given."""
+        observation = self.reconciler.observe("stream", event)
+        self._submit(observation, TrackRecord.from_fields(
+            event["title"].strip(), artist=(event["artist"] or "").strip(), album=event["album"],
+            art_url=event["art_url"],
+            duration_ms=event["duration"] * 1000 if event["duration"] else None,
+            position_ms=event["position"] * 1000 if event["position"] is not None else None,
+            playing=not event["paused"], track_id=event["track_id"],
+            source="stream", seq=observation.seq, raw=event))
 
     def fetch_album_art_and_duration(self, song_title, artist_name):
-        search_term = f"{song_title} {artist_name}"
-        url = f"https://itunes.apple.com/search?term={search_term}&entity=song&limit=1"
         try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            if data.get('resultCount', 0) > 0 and data['results']:
-                result = data['results'][0]
-                art_url = result.get('artworkUrl100', '').replace('100x100bb', '512x512bb')
-                duration_ms = result.get('trackTimeMillis')
-                return art_url, duration_ms
+            return resolve_art(song_title, artist_name)
         except Exception as e:
-            print(f"Failed to fetch art/duration from iTunes: {e}")
+            eventlog.warning("sync", "Art lookup failed", title=song_title, error=str(e))
         return None, None
 
-    def stop(self):
+    def release(self, clear_presence=False):
+        """Stops the pipeline and closes what the thread opened, without touching the GUI status."""
         self._stop_event.set()
+        self.pipeline.stop()
+        if self.art_cache is not None:
+            self.art_cache.stop_autosave()
         if self.rpc:
             try:
-                self.rpc.clear()
+                if clear_presence:
+                    self.rpc.clear()
                 self.rpc.close()
             except Exception as e:
-                print(f"Error closing RPC: {e}")
+                eventlog.warning("sync", "Error closing RPC", error=str(e))
+        if self.recorder:
+            self.recorder.close()
+
+    def stop(self):
+        self.release(clear_presence=True)
         self.app.update_status("Stopped")
 
+    def _poll_failed(self, what, error):
+        """Logs a polling failure once per distinct error; repeats go to debug so they can't flood the log."""
+        message = f"{type(error).__name__}: {error}"
+        level = eventlog.DEBUG if message == self._last_poll_error else eventlog.WARNING
+        self._last_poll_error = message
+        eventlog.log(level, "sync", what, error=message)
+
     def get_qobuz_handle(self):
         try:
             for proc in psutil.process_iter(['name', 'pid']):
@@ -173,7 +233,8 @@ class RPCSynchronizer(threading.Thread):
                     hwnds = []
                     win32gui.EnumWindows(callback, hwnds)
                     if hwnds: return hwnds[0]
-        except Exception:
+        except Exception as e:
+            self._poll_failed("Qobuz window lookup failed", e)
             return None
 
     def get_window_title_by_handle(self, hwnd):
@@ -182,22 +243,47 @@ class RPCSynchronizer(threading.Thread):
             buff = ctypes.create_unicode_buffer(length + 1)
             GetWindowText(hwnd, buff, length + 1)
             return buff.value
-        except Exception:
+        except Exception as e:
+            self._poll_failed("Window title read failed", e)
             return None
 
+    def _on_discord_state(self, connected):
+        if connected:
+            self.app.update_status("Discord connected.", color=self.app.color_status_ok)
+        else:
+            self.app.update_status("Discord disconnected. Reconnecting...", color=self.app.color_status_fail)
+
+    def _on_first_presence(self, sent_at):
+        self.time_to_first_presence = sent_at - self.started_at
+        self.first_presence.set()
+        eventlog.info("startup", "First presence sent", ms=round(self.time_to_first_presence * 1000))
+
+    def _connect_discord(self):
+        if not self.rpc.connect():
+            self.app.update_status("Waiting for Discord...", color=self.app.color_status_fail)
+
+    def _load_art_cache(self):
+        self.art_cache = ArtCache.load()
+        self.art_cache.start_autosave()
+        # Observations submitted before this point wait in the pipeline's latest-wins slot
+        self.pipeline.start()
+
+    def startup_stats(self):
+        ttfp = self.time_to_first_presence
+        return {"time_to_first_presence_ms": round(ttfp * 1000, 1) if ttfp is not None else None}
+
     def run(self):
         if not RPC_AVAILABLE:
             self.app.update_status("Error: Missing Libraries", color=self.app.color_status_fail)
             return
-        try:
-            self.app.update_status("Connecting to Discord...")
-            self.rpc = Presence(self.client_id)
-            self.rpc.connect()
-            self.app.update_status("Connected. Waiting for Qobuz...")
-        except Exception as e:
-            self.app.update_status("Connection Failed", color=self.app.color_status_fail)
-            messagebox.showerror("RPC Error", f"Failed to connect to Discord: {e}. Is Discord running?")
-            return
+        self.app.update_status("Connecting to Discord...")
+        # Keeps retrying in the background and replays the presence after Discord restarts. Updates made
+        # before the pipe is up are held and sent on connect, so presence appears once both Discord and a
+        # title are available, whichever comes last.
+        self.rpc = PresenceConnection(Presence, self.client_id, on_state_change=self._on_discord_state,
+                                      on_first_presence=self._on_first_presence)
+        threading.Thread(target=self._connect_discord, daemon=True).start()
+        threading.Thread(target=self._load_art_cache, daemon=True).start()
 
         last_title = ""
         while not self._stop_event.is_set():
@@ -206,25 +292,147 @@ class RPCSynchronizer(threading.Thread):
                 current_title = self.get_window_title_by_handle(qobuz_handle)
                 if current_title and current_title != last_title:
                     last_title = current_title
-                    self.force_update_presence(last_title)
+                    self.force_update_presence(last_title, source="poll")
             elif last_title != "":
                 last_title = ""
-                self.force_update_presence(None)
-            time.sleep(2)
+                self.force_update_presence(None, source="poll")
+            self._stop_event.wait(self.poll_interval)
+
+
+def create_local_api(app):
+    """Builds the local Flask API. `app` needs `running` and `rpc_thread` (the load test passes a headless one)."""
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/update', methods=['POST'])
+    def update_presence_route():
+        if app.running and app.rpc_thread:
+            data = request.get_json()
+            song_title = data.get('title') if data else None
+            if song_title is not None:
+                app.rpc_thread.force_update_presence(song_title)
+                return jsonify({"status": "ok"}), 200
+        return jsonify({"status": "error", "message": "RPC is not running"}), 503
+
+    @flask_app.route('/stats', methods=['GET'])
+    def stats_route():
+        if app.rpc_thread:
+            return jsonify({"status": "ok", "reconciler": app.rpc_thread.reconciler.snapshot(),
+                            "pipeline": app.rpc_thread.pipeline.stats(),
+                            "discord": app.rpc_thread.rpc.stats() if app.rpc_thread.rpc else None,
+                            "startup": app.rpc_thread.startup_stats(),
+                            "art_lookups": art_lookup_stats(),
+                            "titles": TITLES.stats(),
+                            "sinks": app.sinks.stats() if getattr(app, 'sinks', None) else None}), 200
+        return jsonify({"status": "error", "message": "RPC is not running"}), 503
+
+    @flask_app.route('/logs', methods=['GET'])
+    def logs_route():
+        """Last N events, e.g. GET /logs?n=200&level=warning, for diagnosing support issues."""
+        n = request.args.get('n', default=100, type=int)
+        min_level = eventlog.LEVELS_BY_NAME.get(request.args.get('level', 'debug'), eventlog.DEBUG)
+        return jsonify({"status": "ok", "log": eventlog.EVENTS.stats(),
+                        "events": [eventlog.event_to_dict(e) for e in eventlog.recent(n, min_level)]}), 200
+
+    @flask_app.route('/shutdown', methods=['POST'])
+    def shutdown():
+        os._exit(0)
+        return 'Server shutting down...'
+
+    return flask_app
+
+
+class LocalApiServer(threading.Thread):
+    """The local API as a stoppable worker. Binds in the constructor, so a taken port fails the start."""
+
+    def __init__(self, app, host='127.0.0.1', port=LOCAL_API_PORT):
+        super().__init__(daemon=True)
+        try:
+            self.server = make_server(host, port, create_local_api(app), threaded=True)
+        except SystemExit:
+            # werkzeug calls sys.exit() when the port is taken instead of raising
+            raise OSError(f"port {port} is already in use")
+
+    def run(self):
+        eventlog.info("api", "Local API listening", port=self.server.server_port)
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class UpdateCheckWorker(threading.Thread):
+    """One long-lived thread for update checks and the download that follows, instead of a thread per click."""
+
+    def __init__(self, app):
+        super().__init__(daemon=True)
+        self.app = app
+        self._requested = threading.Event()
+        self._stop_event = threading.Event()
+        self._deferred = False
+
+    def request(self, deferred=False):
+        """Queues a check; requests made while one is pending are merged into it."""
+        self._deferred = deferred
+        self._requested.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._requested.set()
+
+    def _wait_for_first_presence(self):
+        # Low priority at launch: let the first presence go out before competing for the network
+        deadline = time.monotonic() + UPDATE_CHECK_DEFER_SECONDS
+        while time.monotonic() < deadline and not self._stop_event.is_set():
+            sync = self.app.rpc_thread
+            if sync is None or sync.first_presence.wait(0.5):
+                return
+
+    def _download(self, update_info):
+        try:
+            manifest = Updater(get_install_dir(), UPDATE_MANIFEST_URL).stage()
+        except (requests.exceptions.RequestException, UpdateError, OSError, ValueError) as e:
+            eventlog.error("updater", "Update download failed", error=str(e))
+            self.app.master.after(0, lambda: messagebox.showinfo("Update Available", update_info['message']))
+            return
+        self.app.master.after(0, lambda: self.app.update_status(
+            f"Update v{manifest['version']} downloaded. Restart to install.", color=self.app.color_status_ok))
+
+    def run(self):
+        while True:
+            self._requested.wait()
+            if self._stop_event.is_set():
+                return
+            self._requested.clear()
+            if self._deferred:
+                self._wait_for_first_presence()
+            update_info = check_for_updates_logic(LOCAL_VERSION, VERSION_URL, DOWNLOAD_URL)
+            self.app.master.after(0, lambda info=update_info: self.app._handle_update_result_gui(info))
+            if update_info["status"] == "update" and get_install_dir() and not self._stop_event.is_set():
+                self._download(update_info)
 
 
 class QobuzRPCApp:
-    def __init__(self, master):
+    def __init__(self, master, autostart=False):
         self.master = master
+        self.autostart = autostart
         master.title(f"Qobuz Discord RPC Synchronizer (v{LOCAL_VERSION})")
-        master.geometry("550x450")
+        master.geometry("550x655")
         master.resizable(False, False)
         master.configure(bg='#36393F')
         master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        self.rpc_thread = None
-        self.server_thread = None
         self.running = False
+        eventlog.start_flush()
+        self.history = open_default_store()
+        # The cover art shown in the window is one more now-playing sink, so it is fetched off the Tk thread
+        self.sinks = SinkPublisher.from_env(extra=[CoverArtSink(self._cover_ready)])
+        # Owns the synchronizer, local API, push channel and update checker; the last three live across Start/Stop
+        self.supervisor = Supervisor(on_change=lambda name, state: self.master.after(0, self._show_worker_states))
+        self.supervisor.add("sync", self._new_synchronizer)
+        self.supervisor.add("api", lambda: LocalApiServer(self))
+        self.supervisor.add("push", lambda: PlaybackEventServer(self._handle_playback_event, port=PUSH_CHANNEL_PORT))
+        self.supervisor.add("updates", lambda: UpdateCheckWorker(self))
 
         # --- Your Original Styles ---
         self.font_main = ('Inter', 12)
@@ -268,6 +476,19 @@ class QobuzRPCApp:
                                      fg=self.color_status_ok, font=self.font_status)
         self.status_label.grid(row=row_idx, column=0, sticky='ew')
 
+        row_idx += 1
+        # Blank placeholder keeps the layout fixed until the first cover arrives
+        self.cover_placeholder = tk.PhotoImage(width=THUMBNAIL_SIZE, height=THUMBNAIL_SIZE)
+        self.cover_image = None
+        self.cover_label = tk.Label(self.main_frame, image=self.cover_placeholder, bg=master['bg'],
+                                    highlightthickness=3, highlightbackground=master['bg'])
+        self.cover_label.grid(row=row_idx, column=0, pady=(10, 0))
+
+        row_idx += 1
+        self.workers_var = tk.StringVar(value="")
+        tk.Label(self.main_frame, textvariable=self.workers_var, bg=master['bg'], fg='#C0C4CC',
+                 font=('Inter', 9)).grid(row=row_idx, column=0, sticky='ew')
+
         row_idx += 1
         self.button_frame = tk.Frame(self.main_frame, bg=master['bg'], pady=20)
         self.button_frame.grid(row=row_idx, column=0, sticky='s')
@@ -294,51 +515,100 @@ class QobuzRPCApp:
         tk.Button(version_frame, text="Check for Updates", command=self.check_for_updates, width=25, height=1,
                   bg='#5865F2', fg=self.color_text, font=('Inter', 11), relief='flat', activebackground='#5865F2',
                   activeforeground=self.color_text, cursor="hand2").pack()
-
+        tk.Button(version_frame, text="Listening Stats", command=lambda: show_stats_window(master, self.history),
+                  width=25, height=1, bg='#40444B', fg=self.color_text, font=('Inter', 11), relief='flat',
+                  activebackground='#40444B', activeforeground=self.color_text, cursor="hand2").pack(pady=(5, 0))
+        tk.Button(version_frame, text="Event Log", command=lambda: show_log_window(master),
+                  width=25, height=1, bg='#40444B', fg=self.color_text, font=('Inter', 11), relief='flat',
+                  activebackground='#40444B', activeforeground=self.color_text, cursor="hand2").pack(pady=(5, 0))
+
+        if autostart:
+            self.start_rpc()
         self._start_initial_update_check()
 
-    def run_server(self):
-        flask_app = Flask(__name__)
+    @property
+    def rpc_thread(self):
+        return self.supervisor.current("sync")
+
+    def _new_synchronizer(self):
+        sync = RPCSynchronizer(self, CLIENT_ID)
+        sync.daemon = True
+        return sync
 
-        @flask_app.route('/update', methods=['POST'])
-        def update_presence_route():
-            if self.running and self.rpc_thread:
-                data = request.get_json()
-                song_title = data.get('title') if data else None
-                if song_title is not None:
-                    self.rpc_thread.force_update_presence(song_title)
-                    return jsonify({"status": "ok"}), 200
-            return jsonify({"status": "error", "message": "RPC is not running"}), 503
+    def _cover_ready(self, image_data, accent):
+        """Called on the cover sink's worker; only the finished image is handed to the Tk thread."""
+        try:
+            self.master.after(0, self._show_cover, image_data, accent)
+        except (RuntimeError, tk.TclError):
+            pass  # window already closed
+
+    def _show_cover(self, image_data, accent):
+        self.cover_image = tk.PhotoImage(data=image_data, format='PPM') if image_data else None
+        self.cover_label.config(image=self.cover_image or self.cover_placeholder,
+                                highlightbackground=accent or self.master['bg'])
 
-        @flask_app.route('/shutdown', methods=['POST'])
-        def shutdown():
-            os._exit(0)
-            return 'Server shutting down...'
+    def _show_worker_states(self):
+        states = self.supervisor.states()
+        self.workers_var.set("   ".join(f"{name}: {info['state']}" + (f" ({info['restarts']} restarts)"
+                                                                          if info['restarts'] else "")
+                                        for name, info in states.items()))
 
-        flask_app.run(host='127.0.0.1', port=5000, debug=False)
+    def _handle_playback_event(self, event):
+        if self.running and self.rpc_thread:
+            self.rpc_thread.apply_playback_event(event)
 
     def start_rpc(self):
         if self.running: return
+        if not RPC_AVAILABLE:
+            # The synchronizer would exit at once and the supervisor would keep restarting it
+            self.update_status("Error: Missing Libraries", color=self.color_status_fail)
+            return
         self.running = True
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.update_status("RPC and Server Running...")
-        self.rpc_thread = RPCSynchronizer(self, CLIENT_ID)
-        self.rpc_thread.daemon = True
-        self.rpc_thread.start()
-        self.server_thread = threading.Thread(target=self.run_server, daemon=True)
-        self.server_thread.start()
+        self.supervisor.start("sync")
+        # Long-lived: started by the first Start only, reused afterwards
+        self.supervisor.start("api")
+        self.supervisor.start("push")
 
     def stop_rpc(self):
         if not self.running: return
         self.running = False
-        self.start_button.config(state=tk.NORMAL)
+        self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.DISABLED)
-        if self.rpc_thread: self.rpc_thread.stop()
-        self.update_status("Stopped", color=self.color_text)
+        threading.Thread(target=self._stop_synchronizer, daemon=True).start()
+
+    def _stop_synchronizer(self):
+        # Joined before Start is enabled again, so an old loop never overlaps a new one
+        stopped = self.supervisor.stop("sync", WORKER_STOP_DEADLINE_SECONDS)
+        self.master.after(0, lambda: self._on_synchronizer_stopped(stopped))
+
+    def _on_synchronizer_stopped(self, stopped):
+        if not self.running:
+            self.start_button.config(state=tk.NORMAL)
+        if stopped:
+            self.update_status("Stopped", color=self.color_text)
+        else:
+            self.update_status("Stopped (synchronizer did not exit in time)", color=self.color_status_fail)
+
+    def handle_instance_command(self, command):
+        """Runs a command handed over by a second launch (see instance.py). Called on the Tk thread."""
+        if command == "start":
+            self.start_rpc()
+        elif command == "stop":
+            self.stop_rpc()
+        self.master.deiconify()
+        self.master.lift()
+        self.master.focus_force()
 
     def on_close(self):
-        if self.running: self.stop_rpc()
+        self.running = False
+        self.supervisor.on_change = None
+        self.supervisor.shutdown(WORKER_STOP_DEADLINE_SECONDS)
+        if self.history: self.history.close()
+        if self.sinks: self.sinks.close()
+        eventlog.stop_flush()
         self.master.destroy()
 
     def update_status(self, message, color=None):
@@ -353,18 +623,23 @@ class QobuzRPCApp:
             self.status_label.config(fg=self.color_text)
 
     def _start_initial_update_check(self):
-        threading.Thread(target=self._check_for_updates_async, daemon=True).start()
+        self.supervisor.start("updates")
+        self._request_update_check(deferred=self.autostart)
 
-    def check_for_updates(self):
-        threading.Thread(target=self._check_for_updates_async, daemon=True).start()
+    def _request_update_check(self, deferred=False):
+        worker = self.supervisor.current("updates") or self.supervisor.start("updates")
+        if worker is not None:
+            worker.request(deferred)
 
-    def _check_for_updates_async(self):
-        update_info = check_for_updates_logic(LOCAL_VERSION, VERSION_URL, DOWNLOAD_URL)
-        self.master.after(0, lambda: self._handle_update_result_gui(update_info))
+    def check_for_updates(self):
+        self._request_update_check()
 
     def _handle_update_result_gui(self, update_info):
         message = update_info.get('message')
-        if update_info["status"] == "update" and message:
+        if update_info["status"] == "update" and message and get_install_dir():
+            # The update worker downloads it next
+            self.update_status(f"Downloading update v{update_info.get('remote_version', '?')}...")
+        elif update_info["status"] == "update" and message:
             self.update_status(f"Update available! v{update_info.get('remote_version', '?')}",
                                color=self.color_status_fail)
             messagebox.showinfo("Update Available", message)
@@ -373,6 +648,33 @@ class QobuzRPCApp:
 
 
 if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else "show"
+    if command not in INSTANCE_COMMANDS:
+        sys.exit(f"Usage: longserver.py [{'|'.join(INSTANCE_COMMANDS)}]")
+
+    instance_lock = InstanceLock(INSTANCE_PORT)
+    if not instance_lock.acquire():
+        if send_instance_command(command, INSTANCE_PORT):
+            sys.exit(0)
+        eventlog.warning("instance", "Port in use by another program; starting without the single-instance guard",
+                         port=INSTANCE_PORT)
+
+    install_dir = get_install_dir()
+    if install_dir:
+        remove_old_files(install_dir)
+        try:
+            installed = apply_pending_update(install_dir)
+        except (OSError, ValueError, UpdateError) as e:
+            installed = None
+            eventlog.error("updater", "Staged update could not be installed", error=str(e))
+        if installed:
+            # The running process still has the old binaries loaded; start the new ones
+            instance_lock.release()
+            subprocess.Popen([sys.argv[0]] + sys.argv[1:])
+            sys.exit(0)
+
     root = tk.Tk()
-    app = QobuzRPCApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = QobuzRPCApp(root, autostart=command == "start" or os.environ.get(AUTOSTART_ENV_VAR) == "1")
+    instance_lock.serve(lambda cmd: root.after(0, app.handle_instance_command, cmd))
+    root.mainloop()
+    instance_lock.release()
\ No newline at end of file
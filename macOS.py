@@ -4,8 +4,17 @@ import threading
 import time
 import os
 import requests
-import subprocess  # New dependency for macOS AppleScript execution
 from packaging.version import parse as parse_version
+import eventlog
+from artcache import ArtCache, resolve_art
+from breaker import CircuitOpenError
+from osahelper import OsaTrackHelper
+from discordconn import PresenceConnection
+from pipeline import TrackRecord, build_presence_pipeline
+from recorder import SessionRecorder
+from history import open_default_store, show_stats_window
+from eventlog import show_log_window
+from sinks import SinkPublisher
 
 # --- 1. Versioning and Update Configuration ---
 LOCAL_VERSION = "1.0.0"
@@ -22,14 +31,14 @@ try:
 except ImportError:
     # Handle missing dependencies gracefully
     RPC_AVAILABLE = False
-    print("Warning: Missing required libraries. RPC functionality disabled.")
+    eventlog.warning("startup", "Missing required libraries. RPC functionality disabled.")
 
 
     # Define stubs to prevent immediate crash during import
     class Presence:
         def __init__(self, client_id): pass
 
-        def connect(self): print("RPC connection stub.")
+        def connect(self): eventlog.info("discord", "RPC connection stub")
 
         def update(self, **kwargs): pass
 
@@ -54,6 +63,7 @@ def fetch_latest_version(url, max_retries=3):
             response.raise_for_status()
             return response.text.strip()
         except requests.exceptions.RequestException as e:
+            eventlog.warning("updater", "Version check failed", attempt=attempt + 1, error=str(e))
             if attempt < max_retries - 1:
                 time.sleep(2 ** attempt)
     return None
@@ -82,7 +92,8 @@ def check_for_updates_logic(local_version, version_url, download_url):
 
         return {"status": "ok", "message": f"Running latest version (v{local_version})."}
 
-    except Exception:
+    except Exception as e:
+        eventlog.warning("updater", "Unreadable version file", content=remote_version_str[:40], error=str(e))
         return {"status": "error", "message": "Update check failed (Parsing Error)."}
 
 
@@ -99,102 +110,71 @@ class RPCSynchronizer(threading.Thread):
         self.client_id = client_id
         self._stop_event = threading.Event()
         self.rpc = None
-        self.start_time = None
+        # One long-lived osascript process instead of one per poll
+        self.track_helper = None
         # Cache stores (song title - artist) -> (art_url, duration_ms) mapping
-        self.art_cache = {}
+        self.art_cache = ArtCache.load()
+        self.recorder = SessionRecorder.from_env()
+        self.pipeline = build_presence_pipeline(self, self.recorder, getattr(app_instance, 'history', None),
+                                                getattr(app_instance, 'sinks', None))
 
     def fetch_album_art_and_duration(self, song_title, artist_name):
         """
-        Queries the iTunes public search API for the album art URL and track duration.
-        Returns: (art_url: str or None, duration_ms: int or None)
+        Resolves the album art URL and track duration (shared art service first, then the iTunes search API).
+        Returns: (art_url: str or None, duration_ms: int or None), a LookupResult on success
         """
-        search_term = f"{song_title} {artist_name}"
-        url = f"https://itunes.apple.com/search?term={search_term}&entity=song&limit=1"
-
         try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get('resultCount', 0) > 0 and data['results']:
-                result = data['results'][0]
-                art_url = result.get('artworkUrl100', None)
-                duration_ms = result.get('trackTimeMillis', None)
-
-                if art_url:
-                    # Replace the size component for a higher quality image
-                    large_art_url = art_url.replace('100x100bb', '512x512bb')
-                    return large_art_url, duration_ms
+            result = resolve_art(song_title, artist_name)
+            if result[0]:
+                return result
+        except CircuitOpenError:
+            pass  # iTunes is unreachable; show the default asset without waiting for another timeout
         except requests.exceptions.RequestException as e:
             self.app.update_status(f"Qobuz: Art search failed (API Error)", color=self.app.color_status_fail)
-            print(f"Failed to fetch art/duration from iTunes (Request Error): {e}")
+            eventlog.warning("sync", "Art lookup failed (request error)", title=song_title, error=str(e))
         except Exception as e:
             self.app.update_status(f"Qobuz: Art search failed (Parse Error)", color=self.app.color_status_fail)
-            print(f"Failed to process art/duration response: {e}")
+            eventlog.warning("sync", "Art lookup failed (unreadable response)", title=song_title, error=str(e))
 
         return None, None
 
     def stop(self):
         """Signals the thread to stop and clears RPC."""
         self._stop_event.set()
+        self.pipeline.stop()
         if self.rpc:
             try:
                 self.rpc.clear()
                 self.rpc.close()
             except Exception as e:
-                print(f"Error while closing RPC: {e}")
+                eventlog.warning("sync", "Error while closing RPC", error=str(e))
         self.app.update_status("Stopped")
 
+    def _on_discord_state(self, connected):
+        """Reflects background connection changes in the GUI."""
+        if connected:
+            self.app.update_status("Discord connected.", color=self.app.color_status_ok)
+        else:
+            self.app.update_status("Discord disconnected. Reconnecting...", color=self.app.color_status_fail)
+
+    def connect_discord(self):
+        """Connects to Discord; if it isn't running yet, keeps retrying in the background and replays the presence."""
+        self.app.update_status("Connecting to Discord...")
+        self.rpc = PresenceConnection(Presence, self.client_id, on_state_change=self._on_discord_state)
+        if self.rpc.connect():
+            self.app.update_status("Connected. Waiting for Qobuz...")
+        else:
+            self.app.update_status("Waiting for Discord...", color=self.app.color_status_fail)
+
     # --- MACOS SPECIFIC TRACKING FUNCTION ---
     def get_qobuz_track_info_macos(self):
         """
-        Uses AppleScript to check if Qobuz is running and get the current track info.
+        Asks the persistent AppleScript helper whether Qobuz is running and for the current track info.
         Returns: The title string ("Song Title - Artist Name"), "Qobuz" (if running but paused), or None (if not running).
         """
-        # AppleScript to get current track and artist, or "Qobuz" if running but idle
-        applescript = f'''
-        tell application "{QOBUZ_APPLICATION_NAME}"
-            if it is running then
-                try
-                    set trackName to name of current track
-                    set artistName to artist of current track
-                    return trackName & " - " & artistName
-                on error
-                    # Running but not playing (idle/paused)
-                    return "{QOBUZ_APPLICATION_NAME}"
-                end try
-            else
-                return ""
-            end if
-        end tell
-        '''
-        try:
-            process = subprocess.Popen(['osascript', '-e', applescript],
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       text=True)
-            # Use a short timeout for responsiveness
-            stdout, stderr = process.communicate(timeout=2)
-
-            if process.returncode != 0:
-                # osascript failed (e.g., app is not open, or permission issue)
-                if "Application isn't running" in stderr:
-                    return None  # Not running
-                # Return 'Qobuz' as a fallback if the app is running but AppleScript failed
-                return QOBUZ_APPLICATION_NAME
-
-            title = stdout.strip()
-            if not title:
-                return None  # Not running or script failed silently
-
-            return title
-
-        except subprocess.TimeoutExpired:
-            print("AppleScript command timed out.")
-            return None
-        except Exception as e:
-            print(f"AppleScript execution failed: {e}")
-            return None
+        if self.track_helper is None:
+            self.track_helper = OsaTrackHelper()
+        return self.track_helper.query()
 
     # Removed: get_qobuz_handle and get_window_title_by_handle
 
@@ -204,17 +184,11 @@ class RPCSynchronizer(threading.Thread):
             self.app.update_status("Error: Missing Libraries", color=self.app.color_status_fail)
             return
 
-        try:
-            self.app.update_status("Connecting to Discord...")
-            self.rpc = Presence(self.client_id)
-            self.rpc.connect()
-            self.app.update_status("Connected. Waiting for Qobuz...")
-        except Exception as e:
-            self.app.update_status("Connection Failed", color=self.app.color_status_fail)
-            messagebox.showerror("RPC Error", f"Failed to connect to Discord: {e}. Is Discord running?")
-            print(f"RPC Connection Failed: {e}")
-            return
+        self.connect_discord()
 
+        # Parsing, art lookup and publishing run in the shared pipeline; this loop only observes
+        self.pipeline.start()
+        self.art_cache.start_autosave()
         last_title = ""
 
         while not self._stop_event.is_set():
@@ -225,73 +199,31 @@ class RPCSynchronizer(threading.Thread):
             if current_title is None:
                 # Qobuz application is not running
                 if last_title != "":
-                    self.rpc.clear()
-                    self.app.update_status("Qobuz Closed. Listening...")
+                    self.pipeline.submit(TrackRecord.closed())
                     last_title = ""
-                self.start_time = None
                 time.sleep(5)
                 continue
 
-            # Skip None check, as get_qobuz_track_info_macos should return a string or None
-
             if current_title != last_title:
+                # "Song Title - Artist Name", or just "Qobuz" when idle/paused
                 last_title = current_title
-
-                # Check if the title is just 'Qobuz' (idle/paused)
-                if last_title.strip() == QOBUZ_APPLICATION_NAME:
-                    self.rpc.clear()
-                    self.app.update_status("Qobuz: Idle/Paused")
-                    self.start_time = None
-
-                else:
-                    # Playing music! Attempt to parse "Song Title - Artist Name"
-                    try:
-                        title_parts = last_title.rsplit(' - ', 1)
-
-                        song_title = title_parts[0].strip()
-                        artist_name = title_parts[1].strip() if len(title_parts) > 1 else "Unknown Artist"
-
-                        # --- Dynamic Album Art Logic ---
-                        cache_key = last_title
-                        art_url = self.art_cache.get(cache_key, (None, None))[0]
-
-                        if art_url is None:
-                            self.app.update_status(f"Qobuz: Searching for album art for '{song_title}'...")
-                            art_url, duration_ms = self.fetch_album_art_and_duration(song_title, artist_name)
-                            if art_url:
-                                self.art_cache[cache_key] = (art_url, duration_ms)  # Cache result
-
-                        self.start_time = None
-                        large_image_asset = art_url if art_url else "qobuz"
-
-                        # Update Discord Rich Presence
-                        self.rpc.update(
-                            details=song_title,
-                            state=f"by {artist_name}",
-                            large_image=large_image_asset,
-                            large_text=f"{song_title} - {artist_name}",
-                            small_image="qobuz_icon",
-                            small_text="Qobuz Player"
-                        )
-
-                        self.app.update_status(f"Qobuz: Playing '{song_title}'")
-
-                    except Exception as e:
-                        self.rpc.clear()
-                        self.app.update_status(f"Qobuz: Runtime Error", color=self.app.color_status_fail)
-                        print(f"RPC Update failed: {e}")
-                        self.start_time = None
+                self.pipeline.submit(TrackRecord.from_title(current_title))
 
             time.sleep(1)
 
         # Final cleanup when loop ends
+        self.pipeline.stop()
+        self.art_cache.stop_autosave()
+        if self.recorder:
+            self.recorder.close()
+        if self.track_helper:
+            self.track_helper.close()
         try:
             if self.rpc:
                 self.rpc.clear()
-                if self.rpc.sock:
-                    self.rpc.close()
-        except Exception:
-            pass
+                self.rpc.close()
+        except Exception as e:
+            eventlog.warning("sync", "Error while closing RPC", error=str(e))
 
 
 # --- 4. TKINTER GUI CLASS (Unchanged) ---
@@ -299,10 +231,13 @@ class RPCSynchronizer(threading.Thread):
 class QobuzRPCApp:
     """The main Tkinter application class for the GUI."""
 
+    # Platform entry points (e.g. linux.py) swap in their own track source here
+    synchronizer_class = RPCSynchronizer
+
     def __init__(self, master):
         self.master = master
         master.title(f"Qobuz Discord RPC Synchronizer (v{LOCAL_VERSION})")
-        master.geometry("550x450")
+        master.geometry("550x525")
         master.resizable(False, False)
         master.configure(bg='#36393F')
 
@@ -310,6 +245,9 @@ class QobuzRPCApp:
 
         self.rpc_thread = None
         self.running = False
+        eventlog.start_flush()
+        self.history = open_default_store()
+        self.sinks = SinkPublisher.from_env()
 
         # --- Styling ---
         self.font_main = ('Inter', 12)
@@ -397,6 +335,12 @@ class QobuzRPCApp:
                   width=25, height=1, bg='#5865F2', fg=self.color_text, font=('Inter', 11),
                   relief='flat', activebackground='#5865F2', activeforeground=self.color_text,
                   cursor="hand2").pack()
+        tk.Button(version_frame, text="Listening Stats", command=lambda: show_stats_window(master, self.history),
+                  width=25, height=1, bg='#40444B', fg=self.color_text, font=('Inter', 11), relief='flat',
+                  activebackground='#40444B', activeforeground=self.color_text, cursor="hand2").pack(pady=(5, 0))
+        tk.Button(version_frame, text="Event Log", command=lambda: show_log_window(master),
+                  width=25, height=1, bg='#40444B', fg=self.color_text, font=('Inter', 11), relief='flat',
+                  activebackground='#40444B', activeforeground=self.color_text, cursor="hand2").pack(pady=(5, 0))
         # ----------------------------------------
 
         # Start update check immediately on load
@@ -460,7 +404,7 @@ class QobuzRPCApp:
                                  "The hardcoded Client ID in the script file is invalid. Please correct it.")
             return
 
-        self.rpc_thread = RPCSynchronizer(self, client_id_to_use)
+        self.rpc_thread = self.synchronizer_class(self, client_id_to_use)
         self.rpc_thread.daemon = True
         self.rpc_thread.start()
         self.running = True
@@ -485,6 +429,11 @@ class QobuzRPCApp:
         """Handles closing the application gracefully."""
         if self.running:
             self.stop_rpc()
+        if self.history:
+            self.history.close()
+        if self.sinks:
+            self.sinks.close()
+        eventlog.stop_flush()
         self.master.destroy()
 
 
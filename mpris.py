@@ -0,0 +1,241 @@
+"""
+Event-driven MPRIS track source for Linux.
+
+Subscribes to org.freedesktop.DBus.Properties.PropertiesChanged (and Seeked)
+for org.mpris.MediaPlayer2 players on the session bus. Nothing is polled:
+the player's state is read once when it appears and afterwards only updated
+from signals, except that Position (which MPRIS never signals) is re-read
+whenever the playback status changes. Requires the pure-Python `jeepney` D-Bus library.
+"""
+import collections
+import threading
+import time
+
+import eventlog
+
+try:
+    from jeepney import DBusAddress, MatchRule, new_method_call, HeaderFields, MessageType
+    from jeepney.bus_messages import message_bus
+    from jeepney.io.blocking import open_dbus_connection, Proxy
+except ImportError:
+    MPRIS_AVAILABLE = False
+else:
+    MPRIS_AVAILABLE = True
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+
+def is_qobuz_player(bus_name, metadata):
+    """Default player filter: a native Qobuz client, or a browser tab playing from qobuz.com."""
+    if "qobuz" in bus_name.lower():
+        return True
+    url = metadata.get("xesam:url") or ""
+    return "qobuz.com" in str(url)
+
+
+def _unwrap(value):
+    # jeepney returns variants as (signature, value) pairs
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str):
+        return _unwrap(value[1])
+    if isinstance(value, dict):
+        return {k: _unwrap(v) for k, v in value.items()}
+    return value
+
+
+def make_track(bus_name, metadata, status, position_us):
+    """Builds the track dict handed to listeners from raw MPRIS properties."""
+    artists = metadata.get("xesam:artist") or []
+    if isinstance(artists, str):
+        artists = [artists]
+    length_us = metadata.get("mpris:length")
+    return {
+        "player": bus_name,
+        "title": metadata.get("xesam:title") or "",
+        "artist": ", ".join(a for a in artists if a) or "Unknown Artist",
+        "album": metadata.get("xesam:album") or "",
+        "art_url": metadata.get("mpris:artUrl") or None,
+        "length_ms": int(length_us) // 1000 if length_us else None,
+        "position_ms": int(position_us) // 1000 if position_us is not None else None,
+        "playing": status == "Playing",
+        "observed_at": time.time(),
+    }
+
+
+class MprisTrackSource(threading.Thread):
+    """
+    Background thread that calls `on_change(track)` whenever the selected
+    player's track, playback status or position changes, and `on_change(None)`
+    when it disappears. `bus` may be 'SESSION' or a private bus address.
+    """
+
+    def __init__(self, on_change, bus='SESSION', player_filter=is_qobuz_player, wakeup_interval=1.0):
+        super().__init__(daemon=True)
+        self.on_change = on_change
+        self.bus = bus
+        self.player_filter = player_filter
+        self.wakeup_interval = wakeup_interval
+        self._stop_event = threading.Event()
+        self._conn = None
+        self._owners = {}   # unique name (":1.42") -> well-known MPRIS name
+        self._players = {}  # well-known MPRIS name -> {"metadata", "status", "position"}
+        self._active = None
+        self.signals_received = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    # --- D-Bus helpers ---
+
+    def _call(self, bus_name, path, interface, method, signature=None, body=()):
+        address = DBusAddress(path, bus_name=bus_name, interface=interface)
+        reply = self._conn.send_and_get_reply(new_method_call(address, method, signature, body), timeout=2)
+        if reply.header.message_type == MessageType.error:
+            raise RuntimeError(f"{method} on {bus_name} failed: {reply.body}")
+        return reply.body
+
+    def _add_player(self, name):
+        try:
+            owner = self._call("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                               "GetNameOwner", "s", (name,))[0]
+            props = _unwrap(self._call(name, MPRIS_PATH, PROPERTIES_INTERFACE, "GetAll", "s",
+                                       (PLAYER_INTERFACE,))[0])
+        except Exception as e:
+            eventlog.warning("mpris", "Could not read player", player=name, error=str(e))
+            return
+        self._owners[owner] = name
+        self._players[name] = {
+            "metadata": props.get("Metadata") or {},
+            "status": props.get("PlaybackStatus") or "Stopped",
+            "position": props.get("Position"),
+        }
+
+    def _read_position(self, name):
+        """
+        Asks the player for its current Position. MPRIS never signals Position changes, so the
+        value from the last signal is stale after a pause/resume. Returns None if the call fails.
+        """
+        try:
+            return _unwrap(self._call(name, MPRIS_PATH, PROPERTIES_INTERFACE, "Get", "ss",
+                                      (PLAYER_INTERFACE, "Position"))[0])
+        except Exception as e:
+            eventlog.debug("mpris", "Could not read position", player=name, error=str(e))
+            return None
+
+    def _remove_player(self, name):
+        self._players.pop(name, None)
+        for owner, known in list(self._owners.items()):
+            if known == name:
+                del self._owners[owner]
+
+    # --- State ---
+
+    def _select_player(self):
+        """Prefers a matching player that is playing, then any matching player."""
+        matching = [n for n, p in self._players.items() if self.player_filter(n, p["metadata"])]
+        playing = [n for n in matching if self._players[n]["status"] == "Playing"]
+        if self._active in playing:
+            return self._active
+        if playing:
+            return playing[0]
+        return self._active if self._active in matching else (matching[0] if matching else None)
+
+    def _publish(self):
+        name = self._select_player()
+        self._active = name
+        if name is None:
+            self.on_change(None)
+            return
+        player = self._players[name]
+        self.on_change(make_track(name, player["metadata"], player["status"], player["position"]))
+
+    def _handle_signal(self, msg):
+        self.signals_received += 1
+        member = msg.header.fields.get(HeaderFields.member)
+        sender = msg.header.fields.get(HeaderFields.sender)
+
+        if member == "NameOwnerChanged":
+            name, old_owner, new_owner = msg.body
+            if not name.startswith(MPRIS_PREFIX):
+                return
+            if old_owner:
+                self._remove_player(name)
+            if new_owner:
+                self._add_player(name)
+            self._publish()
+            return
+
+        name = self._owners.get(sender)
+        if name is None:
+            return
+        player = self._players[name]
+        if member == "PropertiesChanged":
+            interface, changed, _invalidated = msg.body
+            if interface != PLAYER_INTERFACE:
+                return
+            changed = _unwrap(changed)
+            if "Metadata" in changed:
+                player["metadata"] = changed["Metadata"] or {}
+                # A new track starts at 0 unless the player says otherwise
+                player["position"] = changed.get("Position", 0)
+            if "PlaybackStatus" in changed:
+                player["status"] = changed["PlaybackStatus"]
+            if "Position" in changed:
+                player["position"] = changed["Position"]
+            elif "PlaybackStatus" in changed:
+                position = self._read_position(name)
+                if position is not None:
+                    player["position"] = position
+            if not ({"Metadata", "PlaybackStatus", "Position"} & changed.keys()):
+                return
+        elif member == "Seeked":
+            player["position"] = msg.body[0]
+        self._publish()
+
+    # --- Thread ---
+
+    def run(self):
+        if not MPRIS_AVAILABLE:
+            eventlog.error("mpris", "MPRIS support requires the 'jeepney' package")
+            return
+        try:
+            self._conn = open_dbus_connection(bus=self.bus)
+        except Exception as e:
+            eventlog.error("mpris", "Could not connect to D-Bus", error=str(e))
+            return
+
+        rules = [
+            MatchRule(type='signal', interface=PROPERTIES_INTERFACE, member='PropertiesChanged', path=MPRIS_PATH),
+            MatchRule(type='signal', interface=PLAYER_INTERFACE, member='Seeked', path=MPRIS_PATH),
+            MatchRule(type='signal', sender='org.freedesktop.DBus', interface='org.freedesktop.DBus',
+                      member='NameOwnerChanged'),
+        ]
+        rules[0].add_arg_condition(0, PLAYER_INTERFACE)
+        rules[2].add_arg_condition(0, MPRIS_PREFIX.rstrip('.'), kind='namespace')
+
+        signals = collections.deque(maxlen=1024)
+        bus_proxy = Proxy(message_bus, self._conn)
+        filters = [self._conn.filter(rule, queue=signals) for rule in rules]
+        try:
+            for rule in rules:
+                bus_proxy.AddMatch(rule)
+            for name in bus_proxy.ListNames()[0]:
+                if name.startswith(MPRIS_PREFIX):
+                    self._add_player(name)
+            self._publish()
+
+            while not self._stop_event.is_set():
+                try:
+                    # Blocks on the socket; the timeout only lets stop() be noticed
+                    msg = self._conn.recv_until_filtered(signals, timeout=self.wakeup_interval)
+                except TimeoutError:
+                    continue
+                self._handle_signal(msg)
+        except Exception as e:
+            eventlog.error("mpris", "Track source stopped", error=str(e))
+        finally:
+            for f in filters:
+                f.close()
+            self._conn.close()
@@ -0,0 +1,208 @@
+"""
+Long-lived AppleScript (JXA) helper for the macOS build.
+
+Instead of spawning `osascript` for every poll, one helper process is started
+and queried over stdin/stdout with a line protocol:
+
+    client -> helper:  "query"            helper -> client:  "TRACK\t<Song Title - Artist Name>"
+                       "quit"                                "IDLE"     (running, nothing playing)
+                                                             "CLOSED"   (Qobuz not running)
+                                                             "ERROR\t<message>"
+
+The helper writes "READY" once at startup. Any executable speaking this
+protocol can be passed as `command`, which is how the client is exercised
+on Linux with a fake helper script (tests/fake_osa_helper.py).
+"""
+import queue
+import subprocess
+import threading
+import time
+
+import eventlog
+
+QOBUZ_APPLICATION_NAME = "Qobuz"
+
+HELPER_SCRIPT = r'''
+ObjC.import('Foundation');
+var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+var stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+
+function send(line) {
+    stdout.writeData($(line + "\n").dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function clean(text) {
+    return String(text).replace(/[\r\n\t]+/g, " ");
+}
+
+function query() {
+    var qobuz = Application("%(app)s");
+    if (!qobuz.running()) return "CLOSED";
+    try {
+        var track = qobuz.currentTrack();
+        return "TRACK\t" + clean(track.name()) + " - " + clean(track.artist());
+    } catch (e) {
+        return "IDLE";
+    }
+}
+
+send("READY");
+var buffer = "";
+var running = true;
+while (running) {
+    var data = stdin.availableData;
+    if (data.length == 0) break;
+    buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+    var lines = buffer.split("\n");
+    buffer = lines.pop();
+    for (var i = 0; i < lines.length; i++) {
+        var command = lines[i].trim();
+        if (command == "quit") { running = false; break; }
+        if (command == "query") {
+            try { send(query()); } catch (e) { send("ERROR\t" + clean(e)); }
+        }
+    }
+}
+''' % {"app": QOBUZ_APPLICATION_NAME}
+
+CRASH_LOOP_SECONDS = 5.0
+DEFAULT_COMMAND = ['osascript', '-l', 'JavaScript', '-e', HELPER_SCRIPT]
+
+
+class HelperError(Exception):
+    pass
+
+
+class OsaTrackHelper:
+    """
+    Client for the persistent helper process. Restarts the helper automatically
+    (with capped backoff) if it dies, hangs or returns garbage.
+    """
+
+    def __init__(self, command=None, timeout=2.0, startup_timeout=10.0, max_backoff=30.0):
+        self.command = command or DEFAULT_COMMAND
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.max_backoff = max_backoff
+        self.starts = 0
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._backoff = 0.0
+        self._next_start = 0.0
+        self._started_at = 0.0
+
+    # --- Process management ---
+
+    def _reader(self, process, lines):
+        for line in process.stdout:
+            lines.put(line.rstrip('\r\n'))
+        lines.put(None)  # EOF marker
+
+    def _start(self):
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, text=True, encoding='utf-8', bufsize=1)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._reader, args=(self._process, self._lines), daemon=True).start()
+        if self._read_line(self.startup_timeout) != "READY":
+            raise HelperError("Helper did not report READY")
+
+    def _kill(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout=1)
+        except Exception:
+            pass
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _read_line(self, timeout):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise HelperError("Helper timed out")
+        if line is None:
+            raise HelperError("Helper exited")
+        return line
+
+    def _ensure_running(self):
+        if self._process is not None and self._process.poll() is None:
+            return True
+        if self._process is not None:
+            self._kill()
+        if time.monotonic() < self._next_start:
+            return False
+        try:
+            self._start()
+        except (OSError, HelperError) as e:
+            self._kill()
+            self._delay_restart()
+            eventlog.error("osa", "AppleScript helper failed to start", error=str(e))
+            return False
+        if self.starts:
+            eventlog.info("osa", "AppleScript helper restarted", restarts=self.starts)
+        self.starts += 1
+        self._started_at = time.monotonic()
+        return True
+
+    def _delay_restart(self):
+        self._backoff = min(self.max_backoff, max(1.0, self._backoff * 2))
+        self._next_start = time.monotonic() + self._backoff
+
+    @property
+    def restarts(self):
+        return max(0, self.starts - 1)
+
+    # --- Public API ---
+
+    def query(self):
+        """
+        Returns the title string ("Song Title - Artist Name"), "Qobuz" (running but idle),
+        or None (not running, or the helper is unavailable).
+        """
+        with self._lock:
+            if not self._ensure_running():
+                return None
+            try:
+                self._process.stdin.write("query\n")
+                self._process.stdin.flush()
+                reply = self._read_line(self.timeout)
+            except (OSError, ValueError, HelperError) as e:
+                eventlog.warning("osa", "AppleScript helper failed, restarting", error=str(e))
+                self._kill()
+                # A helper that keeps dying right after start is backed off instead of respawned every poll
+                if time.monotonic() - self._started_at < CRASH_LOOP_SECONDS:
+                    self._delay_restart()
+                else:
+                    self._backoff = 0.0
+                return None
+
+        kind, _, payload = reply.partition('\t')
+        if kind == "TRACK" and payload.strip():
+            return payload.strip()
+        if kind == "IDLE":
+            return QOBUZ_APPLICATION_NAME
+        if kind == "CLOSED":
+            return None
+        if kind == "ERROR":
+            # Running but the script failed (e.g. permissions); treat like idle as the old code did
+            return QOBUZ_APPLICATION_NAME
+        eventlog.warning("osa", "Unexpected reply from AppleScript helper", reply=reply)
+        return None
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                try:
+                    self._process.stdin.write("quit\n")
+                    self._process.stdin.flush()
+                    self._process.wait(timeout=1)
+                except Exception:
+                    pass
+            self._kill()
@@ -0,0 +1,426 @@
+"""
+Shared observe -> parse -> enrich -> publish pipeline used by every entry point.
+
+Observers (window polling, AppleScript, MPRIS, the local API) only build a
+`TrackRecord` and `submit` it. Each stage runs on its own thread and is
+connected to the next by a `LatestChannel`: a one-slot channel where a newer
+record replaces one that hasn't been picked up yet. A slow stage (e.g. an art
+lookup) therefore never queues up stale work, and the stages before it keep
+running. Every stage is timed separately.
+"""
+import collections
+import itertools
+import threading
+import time
+
+import eventlog
+from artcache import make_cache_key
+from titleparse import TITLES, UNKNOWN_ARTIST
+
+IDLE_TITLE = "Qobuz"
+# Timeline (position) changes smaller than this don't trigger a new Discord update
+POSITION_DRIFT_SECONDS = 2.0
+
+STATE_PLAYING = "playing"
+STATE_IDLE = "idle"
+STATE_CLOSED = "closed"
+
+_record_fields = ("source", "seq", "t", "observed_at", "raw", "state", "title", "artist", "album",
+                  "art_url", "duration_ms", "position_ms", "track_id", "lookup", "query", "obs")
+
+
+class TrackRecord(collections.namedtuple("TrackRecord", _record_fields)):
+    """
+    Immutable observation passed between stages. `raw` is what the observer saw
+    (window title or event dict); `title`/`artist` stay None until parsed.
+    `lookup` holds the (art_url, duration_ms) result if the enrich stage made a request, and
+    `query` the (title, artist) it asked for, which can differ from the final title/artist.
+    `obs` numbers the observation when it enters a Pipeline, tying its recorded outcome to it.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_title(cls, raw, source="poll", seq=0):
+        return cls(source, seq, time.time(), time.monotonic(), raw, None, None, None, None,
+                   None, None, None, None, None, None, None)
+
+    @classmethod
+    def from_fields(cls, title, artist=None, album=None, art_url=None, duration_ms=None, position_ms=None,
+                    playing=True, track_id=None, source="stream", seq=0, raw=None):
+        state = STATE_PLAYING if playing and title else STATE_IDLE
+        return cls(source, seq, time.time(), time.monotonic(), raw, state, title,
+                   artist or UNKNOWN_ARTIST, album, art_url, duration_ms, position_ms, track_id, None, None, None)
+
+    @classmethod
+    def closed(cls, source="poll", seq=0):
+        return cls(source, seq, time.time(), time.monotonic(), None, STATE_CLOSED, None, None, None,
+                   None, None, None, None, None, None, None)
+
+
+# --- 1. CHANNELS AND STAGES ---
+
+class LatestChannel:
+    """
+    One-slot channel with latest-wins backpressure. Older records (lower seq) never replace newer ones.
+    `on_drop(item, reason)` is called for every item that won't be delivered.
+    """
+
+    def __init__(self, on_drop=None):
+        self._item = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self.on_drop = on_drop
+        self.replaced = 0  # pending items overwritten by a newer one
+        self.rejected = 0  # items refused because a newer one was already pending
+
+    def put(self, item):
+        with self._cond:
+            pending = self._item
+            if pending is not None and item.seq and pending.seq and item.seq < pending.seq:
+                self.rejected += 1
+                dropped, reason, accepted = item, "stale", False
+            else:
+                if pending is not None:
+                    self.replaced += 1
+                dropped, reason, accepted = pending, "superseded", True
+                self._item = item
+                self._cond.notify()
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped, reason)
+        return accepted
+
+    def get(self, timeout=None):
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def empty(self):
+        with self._cond:
+            return self._item is None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageTimer:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self):
+        avg = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "avg_ms": round(avg * 1000, 3), "max_ms": round(self.max * 1000, 3)}
+
+
+class Pipeline:
+    """
+    Runs `stages` (a list of (name, callable)) on one thread each. A stage returns the
+    record to pass on (possibly a new one via `_replace`) or None to stop it there.
+    With a `recorder`, every submitted observation is recorded as it enters, and so is
+    its fate if it is superseded, rejected as stale, or lost to a failing stage; the
+    last stage records the outcome of the rest.
+    """
+
+    def __init__(self, stages, recorder=None):
+        self.stages = stages
+        self.recorder = recorder
+        self.channels = [LatestChannel(self._dropped) for _ in stages]
+        self._obs = itertools.count(1)
+        self.timers = {name: StageTimer() for name, _ in stages}
+        self.end_to_end = StageTimer()
+        self._busy = [False] * len(stages)
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(len(self.stages)):
+            thread = threading.Thread(target=self._run_stage, args=(index,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        for channel in self.channels:
+            channel.close()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(max(0.0, deadline - time.monotonic()))
+
+    def submit(self, record):
+        """Hands a new observation to the first stage. Returns False if a newer one is already pending."""
+        record = record._replace(obs=next(self._obs))
+        if self.recorder is not None:
+            self.recorder.record({"t": record.t, "src": record.source, "seq": record.seq, "raw": record.raw,
+                                  "obs": record.obs})
+        return self.channels[0].put(record)
+
+    def _record_outcome(self, record, outcome, **fields):
+        if self.recorder is not None:
+            self.recorder.record({"obs": record.obs, "out": outcome, **fields})
+
+    def _dropped(self, record, reason):
+        self._record_outcome(record, reason)
+
+    def drain(self, timeout=5.0):
+        """Waits until every channel is empty and no stage is working (used by replays and tests)."""
+        deadline = time.monotonic() + timeout
+        idle_checks = 0
+        while time.monotonic() < deadline:
+            if all(c.empty() for c in self.channels) and not any(self._busy):
+                # Checked twice so a record between get() and the busy flag isn't missed
+                idle_checks += 1
+                if idle_checks >= 2:
+                    return True
+            else:
+                idle_checks = 0
+            time.sleep(0.002)
+        return False
+
+    def _run_stage(self, index):
+        name, fn = self.stages[index]
+        timer = self.timers[name]
+        inbox = self.channels[index]
+        outbox = self.channels[index + 1] if index + 1 < len(self.channels) else None
+        while not self._stop_event.is_set():
+            record = inbox.get(timeout=1.0)
+            if record is None:
+                continue
+            self._busy[index] = True
+            started = time.perf_counter()
+            try:
+                result = fn(record)
+            except Exception as e:
+                eventlog.error("pipeline", "Stage failed", stage=name, error=f"{type(e).__name__}: {e}")
+                self._record_outcome(record, "error", stage=name)
+                result = None
+            finally:
+                timer.add(time.perf_counter() - started)
+            if result is not None:
+                if outbox is not None:
+                    outbox.put(result)
+                else:
+                    self.end_to_end.add(time.monotonic() - result.observed_at)
+            self._busy[index] = False
+
+    def stats(self):
+        stats = {name: timer.snapshot() for name, timer in self.timers.items()}
+        stats["end_to_end"] = self.end_to_end.snapshot()
+        stats["replaced"] = sum(c.replaced for c in self.channels)
+        stats["rejected"] = sum(c.rejected for c in self.channels)
+        return stats
+
+
+# --- 2. PRESENCE STAGES ---
+
+class ParseStage:
+    """
+    Turns a raw 'Song Title - Artist Name' window title into title/artist (see titleparse.py).
+    Structured records pass through, and teach the parser their artist.
+    """
+
+    def __init__(self, parser=None):
+        self.parser = parser or TITLES
+
+    def __call__(self, record):
+        if record.state is not None:
+            if record.state == STATE_PLAYING:
+                self.parser.learn(record.artist)
+            return record
+        raw = record.raw
+        if not raw:
+            return record._replace(state=STATE_CLOSED)
+        if raw.strip() == IDLE_TITLE:
+            return record._replace(state=STATE_IDLE)
+        song_title, artist_name = self.parser.parse(raw)
+        return record._replace(state=STATE_PLAYING, title=song_title, artist=artist_name)
+
+
+class EnrichStage:
+    """Adds art and duration from the synchronizer's cache, looking up only titles it has no entry for."""
+
+    def __init__(self, sync, parser=None):
+        self.sync = sync
+        self.parser = parser or TITLES
+
+    def _look_up(self, record):
+        """
+        Returns ((title, artist), query, lookup result); query and result are None if no lookup
+        was made. For a parsed window title, the artist of the match picks the right split, and
+        a title that found nothing isn't looked up again for a while.
+        """
+        track = (record.title, record.artist)
+        raw = record.raw if isinstance(record.raw, str) else None
+        candidates = self.parser.peek(raw) if raw else None
+        if not candidates or track not in candidates:
+            return track, track, self.sync.fetch_album_art_and_duration(*track)
+        if not self.parser.should_look_up(raw):
+            return track, None, None
+        # 'Unknown Artist' in the search term only makes a match less likely
+        query = (record.title, "" if record.artist == UNKNOWN_ARTIST else record.artist)
+        lookup = self.sync.fetch_album_art_and_duration(*query)
+        if not lookup[0]:
+            self.parser.missed(raw)
+            return track, query, lookup
+        return self.parser.confirm(raw, getattr(lookup, 'artist', None)) or track, query, lookup
+
+    def __call__(self, record):
+        if record.state != STATE_PLAYING:
+            return record
+        art_url = record.art_url
+        # Discord can only show http(s) images; anything else (e.g. file:// from MPRIS) needs a lookup
+        if art_url and art_url.startswith(("http://", "https://")):
+            return record
+        cached = self.sync.art_cache.get(make_cache_key(record.title, record.artist))
+        # A cached (None, None) is a recorded miss (e.g. from cachewarm.py) and isn't looked up again
+        art_url, duration_ms = cached or (None, None)
+        lookup = query = None
+        if cached is None:
+            self.sync.app.update_status(f"Qobuz: Searching for album art for '{record.title}'...")
+            (title, artist), query, lookup = self._look_up(record)
+            art_url, duration_ms = lookup or (None, None)
+            if art_url:
+                # Only marks the cache dirty; the synchronizer saves it in the background
+                self.sync.art_cache[make_cache_key(title, artist)] = (art_url, duration_ms)
+            record = record._replace(title=title, artist=artist)
+        return record._replace(art_url=art_url, duration_ms=record.duration_ms or duration_ms, lookup=lookup,
+                               query=query)
+
+
+class PublishStage:
+    """
+    Sends the record to Discord unless it matches what is already shown, records it if
+    enabled, and logs each new track (not timeline re-syncs) to the listening history.
+    Whatever goes to Discord is also queued for the other now-playing sinks, if any.
+    """
+
+    def __init__(self, sync, recorder=None, history=None, sinks=None):
+        self.sync = sync
+        self.recorder = recorder
+        self.history = history
+        self.sinks = sinks
+        self._published = None  # (identity, timeline start) or the state name for idle/closed
+        self.published = 0
+        self.skipped = 0
+
+    def reset(self):
+        self._published = None
+
+    def _record(self, record, outcome, payload=None):
+        if self.recorder is None:
+            return
+        # The observation itself was recorded by Pipeline.submit; this line only adds its outcome
+        entry = {"obs": record.obs, "out": outcome}
+        if record.title is not None:
+            entry["track"] = [record.title, record.artist]
+        if record.lookup is not None:
+            entry["lookup"] = list(record.lookup)
+            entry["query"] = list(record.query)
+            if getattr(record.lookup, 'artist', None):
+                entry["matched"] = record.lookup.artist
+        if outcome == "published":
+            entry["pub"] = payload
+        self.recorder.record(entry)
+
+    def _fan_out(self, record, start=None):
+        if self.sinks is None:
+            return
+        playing = record.state == STATE_PLAYING
+        self.sinks.publish({
+            "state": record.state,
+            "title": record.title if playing else None,
+            "artist": record.artist if playing else None,
+            "album": record.album if playing else None,
+            "art_url": record.art_url if playing else None,
+            "duration_ms": record.duration_ms if playing else None,
+            "started_at": start,
+            "source": record.source,
+            "updated_at": record.t,
+        })
+
+    def __call__(self, record):
+        rpc, app = self.sync.rpc, self.sync.app
+        if rpc is None:
+            self._record(record, "no_rpc")
+            return None
+
+        if record.state != STATE_PLAYING:
+            if self._published == record.state:
+                self.skipped += 1
+                self._record(record, "skipped")
+                return None
+            rpc.clear()
+            self._fan_out(record)
+            self._published = record.state
+            self.published += 1
+            self._record(record, "published")
+            app.update_status("Qobuz: Idle/Paused" if record.state == STATE_IDLE else "Qobuz Closed. Listening...")
+            return record
+
+        start = None
+        if record.position_ms is not None:
+            start = record.t - record.position_ms / 1000
+        identity = (record.track_id or record.title, record.artist, record.album, record.art_url)
+        previous = self._published
+        if isinstance(previous, tuple) and previous[0] == identity and (
+                start is None or previous[1] is not None and abs(previous[1] - start) < POSITION_DRIFT_SECONDS):
+            self.skipped += 1
+            self._record(record, "skipped")
+            return None
+
+        timestamps = {}
+        if start is not None:
+            timestamps["start"] = int(start)
+            if record.duration_ms:
+                timestamps["end"] = int(start + record.duration_ms / 1000)
+        payload = dict(
+            details=record.title,
+            state=f"by {record.artist}",
+            large_image=record.art_url or "qobuz",
+            large_text=f"{record.title} - {record.album or record.artist}",
+            small_image="qobuz_icon",
+            small_text="Qobuz Player",
+            **timestamps
+        )
+        rpc.update(**payload)
+        self._fan_out(record, start)
+        self._published = (identity, start)
+        self.published += 1
+        self._record(record, "published", payload)
+        if self.history is not None and not (isinstance(previous, tuple) and previous[0] == identity):
+            self.history.record_play(record.title, record.artist, record.album, record.duration_ms, record.source)
+        eventlog.debug("pipeline", "Published", title=record.title, artist=record.artist, origin=record.source)
+        app.update_status(f"Qobuz: Playing '{record.title}'")
+        return record
+
+
+def build_presence_pipeline(sync, recorder=None, history=None, sinks=None):
+    """
+    Standard pipeline for a synchronizer. `sync` needs `app`, `rpc`, `art_cache` and
+    `fetch_album_art_and_duration`; `rpc` may be assigned after the pipeline starts.
+    `history` is an optional HistoryStore that receives one play per new track, and
+    `sinks` an optional SinkPublisher that gets every state sent to Discord.
+    """
+    publisher = PublishStage(sync, recorder, history, sinks)
+    pipeline = Pipeline([
+        ("parse", ParseStage()),
+        ("enrich", EnrichStage(sync)),
+        ("publish", publisher),
+    ], recorder)
+    pipeline.publisher = publisher
+    return pipeline
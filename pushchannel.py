@@ -0,0 +1,260 @@
+"""
+Persistent WebSocket channel for structured playback events from web-player clients.
+
+A client opens one connection (ws://127.0.0.1:5001/) and streams one JSON text
+frame per change, e.g.:
+
+    {"track_id": "12345", "title": "Song", "artist": "Artist", "album": "Album",
+     "duration": 215.0, "position": 12.3, "paused": false, "art_url": "https://..."}
+
+`duration` and `position` are in seconds (finite, not negative) and `paused` is
+a JSON boolean; every field except `title` is optional.
+Nothing is sent back for a valid event. A malformed one is counted and answered
+with {"error": "..."}; a message larger than MAX_MESSAGE_BYTES closes the connection.
+
+Browsers send an Origin header with every WebSocket handshake, so only pages on
+an allowed origin (the Qobuz web player, plus any listed in
+QOBUZ_RPC_PUSH_ORIGINS, comma-separated) can connect; other web pages the user
+visits can't set their presence. Clients that send no Origin (native apps,
+scripts) are accepted.
+Implemented on the standard library only (RFC 6455, text frames, ping/close).
+"""
+import base64
+import hashlib
+import json
+import math
+import os
+import socketserver
+import struct
+import sys
+import threading
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_FRAME_BYTES = 64 * 1024
+# Limit for a whole message, however many continuation frames it is split into
+MAX_MESSAGE_BYTES = 64 * 1024
+CLOSE_MESSAGE_TOO_BIG = 1009
+# A client that hasn't finished the handshake within this is disconnected
+HANDSHAKE_TIMEOUT_SECONDS = 5.0
+
+ALLOWED_ORIGINS_ENV_VAR = "QOBUZ_RPC_PUSH_ORIGINS"
+DEFAULT_ALLOWED_ORIGINS = ("https://play.qobuz.com", "https://open.qobuz.com")
+
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+EVENT_FIELDS = ("track_id", "title", "artist", "album", "duration", "position", "paused", "art_url")
+TEXT_FIELDS = ("artist", "album", "art_url")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_playback_event(text):
+    """Validates a JSON event and returns a dict with every field in EVENT_FIELDS (missing ones as None)."""
+    data = json.loads(text)
+    if not isinstance(data, dict) or not isinstance(data.get("title"), str):
+        raise ValueError("event must be an object with a string 'title'")
+    event = {field: data.get(field) for field in EVENT_FIELDS}
+    for field in TEXT_FIELDS:
+        if event[field] is not None and not isinstance(event[field], str):
+            raise ValueError(f"'{field}' must be a string")
+    for field in ("duration", "position"):
+        if event[field] is not None:
+            # json.loads accepts NaN and Infinity, which would break the timestamps later on
+            event[field] = float(event[field])
+            if not math.isfinite(event[field]) or event[field] < 0:
+                raise ValueError(f"'{field}' must be a finite number of seconds")
+    if event["paused"] is not None and not isinstance(event["paused"], bool):
+        raise ValueError("'paused' must be a boolean")
+    event["paused"] = bool(event["paused"])
+    if event["track_id"] is not None:
+        event["track_id"] = str(event["track_id"])
+    return event
+
+
+def allowed_origins_from_env():
+    """DEFAULT_ALLOWED_ORIGINS plus those listed in QOBUZ_RPC_PUSH_ORIGINS."""
+    extra = os.environ.get(ALLOWED_ORIGINS_ENV_VAR, "")
+    return DEFAULT_ALLOWED_ORIGINS + tuple(o.strip().rstrip("/") for o in extra.split(",") if o.strip())
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("client closed connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send_frame(sock, opcode, payload=b""):
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack("!H", length)
+    else:
+        header += bytes([127]) + struct.pack("!Q", length)
+    sock.sendall(header + payload)
+
+
+def _unmask(payload, mask):
+    """XORs the payload with the repeating 4-byte mask, as one big-integer operation."""
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+def _recv_frame(sock):
+    first, second = _recv_exact(sock, 2)
+    fin, opcode = first & 0x80, first & 0x0F
+    if not second & 0x80:
+        raise ProtocolError("client frames must be masked")
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _recv_exact(sock, 8))[0]
+    if length > MAX_FRAME_BYTES:
+        raise ProtocolError("frame too large")
+    mask = _recv_exact(sock, 4)
+    return bool(fin), opcode, _unmask(_recv_exact(sock, length), mask)
+
+
+class _WebSocketHandler(socketserver.BaseRequestHandler):
+
+    def _handshake(self):
+        self.request.settimeout(HANDSHAKE_TIMEOUT_SECONDS)
+        data = b""
+        try:
+            while b"\r\n\r\n" not in data:
+                chunk = self.request.recv(4096)
+                if not chunk or len(data) > 16384:
+                    return False
+                data += chunk
+        except OSError:
+            return False
+        self.request.settimeout(None)
+        headers = {}
+        for line in data.split(b"\r\n")[1:]:
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if headers.get("upgrade", "").lower() != "websocket" or not key:
+            self.request.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        allowed = getattr(self.server.owner, 'allowed_origins', None)
+        origin = headers.get("origin")
+        if allowed is not None and origin is not None and origin.rstrip("/") not in allowed:
+            self.server.owner._count("forbidden")
+            self.request.sendall(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.request.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                              f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    def handle(self):
+        server = self.server.owner
+        if not self._handshake():
+            return
+        server._client_opened()
+        message, message_size = [], 0
+        try:
+            while True:
+                fin, opcode, payload = _recv_frame(self.request)
+                if opcode == OP_CLOSE:
+                    _send_frame(self.request, OP_CLOSE, payload[:2])
+                    return
+                if opcode == OP_PING:
+                    _send_frame(self.request, OP_PONG, payload)
+                    continue
+                if opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                    message_size += len(payload)
+                    if message_size > MAX_MESSAGE_BYTES:
+                        server._count("invalid")
+                        _send_frame(self.request, OP_CLOSE, struct.pack("!H", CLOSE_MESSAGE_TOO_BIG))
+                        return
+                    message.append(payload)
+                    if not fin:
+                        continue
+                    text, message, message_size = b"".join(message).decode("utf-8", "replace"), [], 0
+                    error = server._dispatch(text)
+                    if error:
+                        _send_frame(self.request, OP_TEXT, json.dumps({"error": error}).encode())
+        except (ConnectionError, OSError, ProtocolError):
+            pass
+        finally:
+            server._client_closed()
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # On Windows SO_REUSEADDR lets another process bind the same port and take over the clients
+    allow_reuse_address = sys.platform != "win32"
+
+
+class PlaybackEventServer:
+    """
+    Accepts WebSocket clients and calls `on_event(event_dict)` for every valid event frame.
+    `allowed_origins` defaults to allowed_origins_from_env().
+    """
+
+    def __init__(self, on_event, host='127.0.0.1', port=5001, allowed_origins=None):
+        self.on_event = on_event
+        self.host = host
+        self.port = port
+        self.allowed_origins = tuple(allowed_origins) if allowed_origins is not None else allowed_origins_from_env()
+        self.stats = {"clients": 0, "events": 0, "invalid": 0, "forbidden": 0}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._server = _ThreadingServer((self.host, self.port), _WebSocketHandler)
+        self._server.owner = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _client_opened(self):
+        with self._lock:
+            self.stats["clients"] += 1
+
+    def _client_closed(self):
+        with self._lock:
+            self.stats["clients"] -= 1
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _dispatch(self, text):
+        """Passes a valid event on; returns the reason a frame was rejected, or None."""
+        try:
+            event = parse_playback_event(text)
+        except (ValueError, TypeError) as e:
+            self._count("invalid")
+            return str(e) or type(e).__name__
+        self._count("events")
+        self.on_event(event)
+        return None
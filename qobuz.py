@@ -22,6 +22,14 @@ import time
 import os
 import requests
 from packaging.version import parse as parse_version
+import eventlog
+from artcache import ArtCache, resolve_art
+from discordconn import PresenceConnection
+from pipeline import TrackRecord, build_presence_pipeline
+from recorder import SessionRecorder
+from history import open_default_store, show_stats_window
+from eventlog import show_log_window
+from sinks import SinkPublisher
 
 # --- 1. Versioning and Update Configuration ---
 LOCAL_VERSION = "1.0.1"
@@ -38,7 +46,7 @@ try:
     import win32process
 except ImportError:
     RPC_AVAILABLE = False
-    print("Warning: Missing required libraries. RPC functionality disabled.")
+    eventlog.warning("startup", "Missing required libraries. RPC functionality disabled.")
 
 
     class Presence:
@@ -78,7 +86,8 @@ def fetch_latest_version(url, max_retries=3):
             response = requests.get(url, headers=HTTP_HEADERS, timeout=5)
             response.raise_for_status()
             return response.text.strip()
-        except requests.exceptions.RequestException:
+        except requests.exceptions.RequestException as e:
+            eventlog.warning("updater", "Version check failed", attempt=attempt + 1, error=str(e))
             if attempt < max_retries - 1:
                 time.sleep(2 ** attempt)
     return None
@@ -97,7 +106,8 @@ def check_for_updates_logic(local_version, version_url, download_url):
                        f"Download here:\n{download_url}")
             return {"status": "update", "message": message, "remote_version": remote_version_str}
         return {"status": "ok", "message": f"Running latest version (v{local_version})."}
-    except Exception:
+    except Exception as e:
+        eventlog.warning("updater", "Unreadable version file", content=remote_version_str[:40], error=str(e))
         return {"status": "error", "message": "Update check failed (Parsing Error)."}
 
 
@@ -110,34 +120,42 @@ class RPCSynchronizer(threading.Thread):
         self.client_id = client_id
         self._stop_event = threading.Event()
         self.rpc = None
-        self.art_cache = {}
+        self._last_poll_error = None
+        self.art_cache = ArtCache.load()
+        self.recorder = SessionRecorder.from_env()
+        self.pipeline = build_presence_pipeline(self, self.recorder, getattr(app_instance, 'history', None),
+                                                getattr(app_instance, 'sinks', None))
 
     def fetch_album_art_and_duration(self, song_title, artist_name):
-        search_term = f"{song_title} {artist_name}"
-        url = f"https://itunes.apple.com/search?term={search_term}&entity=song&limit=1"
         try:
-            response = requests.get(url, headers=HTTP_HEADERS, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            if data.get('resultCount', 0) > 0 and data['results']:
-                result = data['results'][0]
-                art_url = result.get('artworkUrl100', None)
-                if art_url:
-                    return art_url.replace('100x100bb', '512x512bb'), result.get('trackTimeMillis', None)
+            result = resolve_art(song_title, artist_name, headers=HTTP_HEADERS)
+            if result[0]:
+                return result
         except Exception as e:
-            print(f"iTunes API Error: {e}")
+            eventlog.warning("sync", "Art lookup failed", title=song_title, error=str(e))
         return None, None
 
     def stop(self):
         self._stop_event.set()
+        self.pipeline.stop()
+        self.art_cache.stop_autosave()
         if self.rpc:
             try:
                 self.rpc.clear()
                 self.rpc.close()
-            except:
-                pass
+            except Exception as e:
+                eventlog.warning("sync", "Error closing RPC", error=str(e))
+        if self.recorder:
+            self.recorder.close()
         self.app.update_status("Stopped")
 
+    def _poll_failed(self, what, error):
+        """Logs a polling failure once per distinct error; repeats go to debug so they can't flood the log."""
+        message = f"{type(error).__name__}: {error}"
+        level = eventlog.DEBUG if message == self._last_poll_error else eventlog.WARNING
+        self._last_poll_error = message
+        eventlog.log(level, "sync", what, error=message)
+
     def get_qobuz_handle(self):
         try:
             qobuz_pids = [proc.info['pid'] for proc in psutil.process_iter(['name', 'pid']) if
@@ -151,8 +169,8 @@ class RPCSynchronizer(threading.Thread):
                     try:
                         _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
                         if found_pid == pid and IsWindowVisible(hwnd): hwnds.append(hwnd)
-                    except:
-                        pass
+                    except Exception:
+                        pass  # the window closed mid-enumeration; keep going
                     return True
 
                 win32gui.EnumWindows(callback, hwnds)
@@ -162,7 +180,8 @@ class RPCSynchronizer(threading.Thread):
                 hwnds = get_hwnds_for_pid(pid)
                 if hwnds: return hwnds[0]
             return None
-        except:
+        except Exception as e:
+            self._poll_failed("Qobuz window lookup failed", e)
             return None
 
     def get_window_title_by_handle(self, hwnd):
@@ -171,30 +190,37 @@ class RPCSynchronizer(threading.Thread):
             buff = ctypes.create_unicode_buffer(length + 1)
             GetWindowText(hwnd, buff, length + 1)
             return buff.value
-        except:
+        except Exception as e:
+            self._poll_failed("Window title read failed", e)
             return None
 
+    def _on_discord_state(self, connected):
+        if connected:
+            self.app.update_status("Discord connected.", color=self.app.color_status_ok)
+        else:
+            self.app.update_status("Discord disconnected. Reconnecting...", color=self.app.color_status_fail)
+
     def run(self):
         if not RPC_AVAILABLE:
             self.app.update_status("Error: Missing Libraries", color=self.app.color_status_fail)
             return
-        try:
-            self.app.update_status("Connecting to Discord...")
-            self.rpc = Presence(self.client_id)
-            self.rpc.connect()
+        self.app.update_status("Connecting to Discord...")
+        # Keeps retrying in the background and replays the presence after Discord restarts
+        self.rpc = PresenceConnection(Presence, self.client_id, on_state_change=self._on_discord_state)
+        if self.rpc.connect():
             self.app.update_status("Connected. Waiting for Qobuz...")
-        except Exception as e:
-            self.app.update_status("Connection Failed", color=self.app.color_status_fail)
-            messagebox.showerror("RPC Error", f"Discord connection failed. Is it running?")
-            return
+        else:
+            self.app.update_status("Waiting for Discord...", color=self.app.color_status_fail)
 
+        # Parsing, art lookup and publishing run in the shared pipeline; this loop only observes
+        self.pipeline.start()
+        self.art_cache.start_autosave()
         last_title = ""
         while not self._stop_event.is_set():
             qobuz_handle = self.get_qobuz_handle()
             if qobuz_handle is None:
                 if last_title != "":
-                    self.rpc.clear()
-                    self.app.update_status("Qobuz Closed. Listening...")
+                    self.pipeline.submit(TrackRecord.closed())
                     last_title = ""
                 time.sleep(5);
                 continue
@@ -202,32 +228,7 @@ class RPCSynchronizer(threading.Thread):
             current_title = self.get_window_title_by_handle(qobuz_handle)
             if current_title and current_title != last_title:
                 last_title = current_title
-                if last_title.strip() == 'Qobuz':
-                    self.rpc.clear()
-                    self.app.update_status("Qobuz: Idle/Paused")
-                else:
-                    try:
-                        title_parts = last_title.rsplit(' - ', 1)
-                        song_title = title_parts[0].strip()
-                        artist_name = title_parts[1].strip() if len(title_parts) > 1 else "Unknown Artist"
-
-                        art_url = self.art_cache.get(last_title, (None, None))[0]
-                        if not art_url:
-                            self.app.update_status(f"Searching art for '{song_title}'...")
-                            art_url, dur = self.fetch_album_art_and_duration(song_title, artist_name)
-                            if art_url: self.art_cache[last_title] = (art_url, dur)
-
-                        self.rpc.update(
-                            details=song_title,
-                            state=f"by {artist_name}",
-                            large_image=art_url if art_url else "qobuz",
-                            large_text=f"{song_title} - {artist_name}",
-                            small_image="qobuz_icon",
-                            small_text="Qobuz Player"
-                        )
-                        self.app.update_status(f"Playing: {song_title}")
-                    except:
-                        pass
+                self.pipeline.submit(TrackRecord.from_title(current_title))
             time.sleep(1)
 
 
@@ -237,12 +238,15 @@ class QobuzRPCApp:
     def __init__(self, master):
         self.master = master
         master.title(f"Qobuz RPC (v{LOCAL_VERSION})")
-        master.geometry("550x450")
+        master.geometry("550x480")
         master.configure(bg='#36393F')
         master.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.rpc_thread = None
         self.running = False
+        eventlog.start_flush()
+        self.history = open_default_store()
+        self.sinks = SinkPublisher.from_env()
 
         # Colors & Fonts
         self.color_text = '#FFFFFF'
@@ -269,6 +273,12 @@ class QobuzRPCApp:
         tk.Button(master, text="Check for Updates", command=self.check_for_updates, bg='#40444B',
                   fg=self.color_text).pack(side=tk.BOTTOM, pady=20)
 
+        tk.Button(master, text="Listening Stats", command=lambda: show_stats_window(master, self.history),
+                  bg='#40444B', fg=self.color_text).pack(side=tk.BOTTOM)
+
+        tk.Button(master, text="Event Log", command=lambda: show_log_window(master),
+                  bg='#40444B', fg=self.color_text).pack(side=tk.BOTTOM, pady=(0, 5))
+
         # Initial check
         threading.Thread(target=self._check_for_updates_async, daemon=True).start()
 
@@ -300,6 +310,9 @@ class QobuzRPCApp:
 
     def on_close(self):
         self.stop_rpc()
+        if self.history: self.history.close()
+        if self.sinks: self.sinks.close()
+        eventlog.stop_flush()
         self.master.destroy()
 
 
@@ -0,0 +1,153 @@
+"""
+Client-side rate limiting for iTunes Search lookups.
+
+iTunes allows roughly 20 requests a minute per client, and everyone behind the
+same IP shares that budget. PriorityRateLimiter is a token bucket with two
+priority classes: PRIORITY_CURRENT (the track being shown) is always served
+first, and PRIORITY_BACKGROUND (cache warming, prefetching) queues behind it and
+only spends tokens above `reserve`, so background work never leaves a skip
+waiting for an empty bucket. After a 403/429 the caller reports it with
+`throttled()`, and nobody is served until the provider's back-off has passed.
+"""
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+import requests
+
+import eventlog
+
+PRIORITY_CURRENT = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_CURRENT: "current", PRIORITY_BACKGROUND: "background"}
+
+ITUNES_RATE_PER_MINUTE = 20
+DEFAULT_BURST = 5
+DEFAULT_RESERVE = 2
+THROTTLE_BACKOFF_SECONDS = 60
+WAIT_SAMPLES = 200
+# Waiters re-check their deadline and stop event at least this often
+MAX_WAIT_SLICE_SECONDS = 0.5
+
+
+class RateLimitedError(requests.exceptions.RequestException):
+    """Raised when a lookup could not get a token before its deadline."""
+
+
+def retry_after_seconds(response):
+    """The Retry-After header in seconds, or None if absent or given as a date."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _percentile_ms(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 1)
+
+
+class PriorityRateLimiter:
+    """Token bucket refilled at `rate_per_minute` up to `burst`; a rate of 0 disables limiting."""
+
+    def __init__(self, rate_per_minute=ITUNES_RATE_PER_MINUTE, burst=DEFAULT_BURST, reserve=DEFAULT_RESERVE):
+        self.rate = max(0.0, rate_per_minute) / 60.0
+        self.burst = max(1.0, float(burst))
+        self.reserve = max(0.0, min(float(reserve), self.burst - 1.0))
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []  # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._cond = threading.Condition()
+        self.granted = {p: 0 for p in PRIORITY_NAMES}
+        self.timed_out = {p: 0 for p in PRIORITY_NAMES}
+        self.throttle_count = 0
+        self._waits = {p: collections.deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _ready_in(self, priority, now):
+        """Seconds until a token is available to `priority`, ignoring anyone queued ahead."""
+        wait = self._paused_until - now
+        if self.rate:
+            needed = 1.0 + (self.reserve if priority == PRIORITY_BACKGROUND else 0.0)
+            wait = max(wait, (needed - self.tokens) / self.rate)
+        return max(0.0, wait)
+
+    def acquire(self, priority=PRIORITY_CURRENT, timeout=None, stop_event=None):
+        """
+        Waits for a token; waiters are served by priority, then in arrival order.
+        Returns False if `timeout` passed or `stop_event` was set first, and at once
+        if a throttle pause outlasts `timeout`.
+        """
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        entry = (priority, next(self._arrivals))
+        with self._cond:
+            if deadline is not None and self._paused_until > deadline:
+                # Throttled for longer than the caller will wait; don't sleep just to fail
+                self.timed_out[priority] += 1
+                return False
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    at_head = self._waiters[0] == entry
+                    wait = self._ready_in(priority, now) if at_head else MAX_WAIT_SLICE_SECONDS
+                    if at_head and wait <= 0:
+                        if self.rate:
+                            self.tokens -= 1.0
+                        self.granted[priority] += 1
+                        self._waits[priority].append(now - started)
+                        return True
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+                    if deadline is not None:
+                        if now >= deadline:
+                            self.timed_out[priority] += 1
+                            return False
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(min(wait, MAX_WAIT_SLICE_SECONDS))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def throttled(self, retry_after=None):
+        """The provider answered 403/429: empty the bucket and serve nobody for `retry_after` seconds."""
+        seconds = retry_after if retry_after is not None else THROTTLE_BACKOFF_SECONDS
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self._paused_until = max(self._paused_until, now + seconds)
+            self.throttle_count += 1
+        eventlog.warning("ratelimit", "iTunes is throttling lookups; pausing them", seconds=seconds)
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            queued = collections.Counter(priority for priority, _ in self._waiters)
+            return {
+                "rate_per_minute": round(self.rate * 60, 1),
+                "tokens": round(self.tokens, 2),
+                "paused_for_seconds": round(max(0.0, self._paused_until - now), 1),
+                "throttled": self.throttle_count,
+                "queued": {name: queued[p] for p, name in PRIORITY_NAMES.items()},
+                "granted": {name: self.granted[p] for p, name in PRIORITY_NAMES.items()},
+                "timed_out": {name: self.timed_out[p] for p, name in PRIORITY_NAMES.items()},
+                "wait_ms": {name: {"p50": _percentile_ms(self._waits[p], 50),
+                                   "max": _percentile_ms(self._waits[p], 100)}
+                            for p, name in PRIORITY_NAMES.items()},
+            }
@@ -0,0 +1,82 @@
+"""
+Ordering and precedence for track observations coming from several sources.
+
+Every observation is tagged with its source, a monotonic timestamp and a
+global sequence number at the moment it is made, before it is queued for
+processing. The reconciler then decides which observations may be published:
+
+1. Stale: an observation older (lower sequence number) than the last accepted
+   one is dropped, so a delayed poll result can't overwrite a newer push.
+2. Overridden: a lower-priority source is ignored while a higher-priority
+   source has reported within `hold_seconds` (stream > push > poll).
+3. Duplicate: an observation whose key equals the published state is dropped,
+   so repeated reports don't spend Discord's rate limit.
+"""
+import itertools
+import threading
+import time
+
+SOURCE_PRIORITY = {"poll": 0, "push": 1, "stream": 2}
+DEFAULT_HOLD_SECONDS = 10.0
+
+
+class Observation:
+    __slots__ = ("source", "seq", "timestamp", "payload", "key")
+
+    def __init__(self, source, seq, timestamp, payload, key):
+        self.source = source
+        self.seq = seq
+        self.timestamp = timestamp
+        self.payload = payload
+        self.key = key
+
+    def __repr__(self):
+        return f"Observation({self.source!r}, seq={self.seq}, key={self.key!r})"
+
+
+class Reconciler:
+
+    def __init__(self, hold_seconds=DEFAULT_HOLD_SECONDS, clock=time.monotonic):
+        self.hold_seconds = hold_seconds
+        self.clock = clock
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._authority = None  # (source, timestamp) of the last accepted observation
+        self._published_key = object()
+        self.stats = {"accepted": 0, "stale": 0, "overridden": 0, "duplicate": 0}
+
+    def observe(self, source, payload, key=None):
+        """Tags an observation at the moment it is made. `key=None` means it is never treated as a duplicate."""
+        if source not in SOURCE_PRIORITY:
+            raise ValueError(f"Unknown observation source: {source}")
+        with self._lock:
+            return Observation(source, next(self._counter), self.clock(), payload, key)
+
+    def accept(self, obs):
+        """Returns True if `obs` is now the authoritative state and should be published."""
+        with self._lock:
+            if obs.seq <= self._last_seq:
+                self.stats["stale"] += 1
+                return False
+            if self._authority is not None:
+                source, timestamp = self._authority
+                if (SOURCE_PRIORITY[source] > SOURCE_PRIORITY[obs.source]
+                        and obs.timestamp - timestamp < self.hold_seconds):
+                    self.stats["overridden"] += 1
+                    return False
+            self._last_seq = obs.seq
+            self._authority = (obs.source, obs.timestamp)
+            if obs.key is not None and obs.key == self._published_key:
+                self.stats["duplicate"] += 1
+                return False
+            self._published_key = obs.key
+            self.stats["accepted"] += 1
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["authority"] = self._authority[0] if self._authority else None
+            stats["last_seq"] = self._last_seq
+            return stats
@@ -0,0 +1,76 @@
+"""
+Append-only session recorder for track observations.
+
+Each observation is written as one compact JSON line when it enters the
+pipeline, and its outcome as a second line that refers back to it by `obs`:
+
+    {"t": 1718000000.123, "src": "poll", "seq": 7, "raw": "Song - Artist", "obs": 12}
+    {"obs": 12, "out": "published", "track": ["Song", "Artist"], "lookup": ["https://...", 215000],
+     "query": ["Song", "Artist"], "matched": "Artist", "pub": {...}}
+
+`raw` is the window title, or the event dict for structured sources (the push
+channel's "stream" and linux.py's "mpris"). `out` is published, skipped or
+no_rpc from the publish stage, superseded or stale when a newer observation
+replaced it in the pipeline, or error (with `stage`) when a stage failed. `lookup` (with the `query` sent and the
+`matched` artist, if the provider named one) is only present when a lookup was
+actually made, and `pub` only when a payload was sent to Discord (null for a
+clear). Observations the local API turned away before the pipeline are
+recorded as a single line with `"out": "dropped"`. Lines are buffered and
+flushed by size or on close, so recording costs next to nothing per tick.
+Set QOBUZ_RPC_RECORD=<path> to record a session; replay it with replay.py.
+"""
+import json
+import os
+import threading
+
+RECORD_ENV_VAR = "QOBUZ_RPC_RECORD"
+FLUSH_EVERY = 32
+
+
+class SessionRecorder:
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @classmethod
+    def from_env(cls):
+        """Returns a recorder if QOBUZ_RPC_RECORD is set, otherwise None."""
+        path = os.environ.get(RECORD_ENV_VAR)
+        return cls(path) if path else None
+
+    def record(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer and self._file:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path):
+    """Yields recorded entries in order, skipping a torn last line from an interrupted session."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
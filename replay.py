@@ -0,0 +1,183 @@
+"""
+Replays a recorded session (see recorder.py) through the longserver synchronizer
+with fake Discord and art backends, and reports latency, lookups and updates.
+
+Usage:
+    QOBUZ_RPC_RECORD=session.jsonl python longserver.py     # record a real session
+    python replay.py session.jsonl --speed 60                # replay 60x faster
+    python replay.py session.jsonl --speed 0 --lookup-latency 0.2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from artcache import ArtCache, LookupResult
+from reconcile import Reconciler
+from recorder import RECORD_ENV_VAR, read_recording
+
+
+# --- 1. FAKE BACKENDS ---
+
+class FakePresence:
+    """Stands in for the Discord connection; counts what would have been sent."""
+
+    def __init__(self):
+        self.updates = []
+        self.clears = 0
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+        return True
+
+    def clear(self):
+        self.clears += 1
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"connected": True, "reconnects": 0, "disconnected_seconds": 0.0}
+
+
+class FakeArtBackend:
+    """
+    Answers lookups from the results captured in the recording, with a configurable delay.
+    Results are keyed on the query that was sent (the track, in older recordings) and carry
+    the matched artist, so ambiguous window titles resolve to the same split as recorded.
+    """
+
+    def __init__(self, entries, latency=0.0):
+        self.latency = latency
+        self.lookups = 0
+        self.known = {}
+        for entry in entries:
+            key = entry.get("query") or entry.get("track")
+            if entry.get("lookup") and key:
+                art_url, duration_ms = entry["lookup"][:2]
+                self.known[tuple(key)] = LookupResult(art_url, duration_ms, entry.get("matched"))
+
+    def lookup(self, song_title, artist_name):
+        self.lookups += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.known.get((song_title, artist_name), LookupResult(None, None))
+
+
+class ReplayApp:
+    """Minimal stand-in for QobuzRPCApp that ignores status text."""
+    color_text = '#FFFFFF'
+    color_status_ok = '#43B581'
+    color_status_fail = '#F04747'
+
+    def update_status(self, message, color=None):
+        pass
+
+
+# --- 2. REPLAY ---
+
+def _mpris_event(raw):
+    """
+    A push-channel event for a recorded MPRIS observation, so it replays with its album, art
+    and position through the structured path. Older recordings only kept "Title - Artist".
+    """
+    if isinstance(raw, str):
+        title, _, artist = raw.rpartition(" - ")
+        raw = {"title": title or artist, "artist": artist if title else None}
+    return {"track_id": None, "title": raw.get("title") or "", "artist": raw.get("artist"),
+            "album": raw.get("album"), "art_url": raw.get("art_url"),
+            "duration": raw["length_ms"] / 1000 if raw.get("length_ms") else None,
+            "position": raw["position_ms"] / 1000 if raw.get("position_ms") is not None else None,
+            "paused": not raw.get("playing", True)}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def replay(entries, speed=0.0, lookup_latency=0.0):
+    """Feeds `entries` through a fresh synchronizer. `speed` is a time multiplier; 0 replays without waiting."""
+    os.environ.pop(RECORD_ENV_VAR, None)
+    from longserver import CLIENT_ID, RPCSynchronizer
+
+    backend = FakeArtBackend(entries, latency=lookup_latency)
+    # Outcome lines (no "src") describe an observation recorded earlier; only observations are replayed
+    entries, outcomes = [e for e in entries if "src" in e], entries
+    entries.sort(key=lambda e: (e["t"], e.get("seq", 0)))
+    presence = FakePresence()
+    sync = RPCSynchronizer(ReplayApp(), CLIENT_ID)
+    sync.rpc = presence
+    sync.art_cache = ArtCache(path=os.path.join(tempfile.mkdtemp(prefix="qobuz-replay-"), "art_cache.json"))
+    sync.fetch_album_art_and_duration = backend.lookup
+    # Precedence hold windows are judged on recorded time, not on the accelerated wall clock
+    virtual_now = [0.0]
+    sync.reconciler = Reconciler(clock=lambda: virtual_now[0])
+
+    sync.pipeline.start()
+
+    latencies = []
+    started = time.perf_counter()
+    first_t = entries[0]["t"] if entries else 0.0
+    for entry in entries:
+        if speed > 0:
+            delay = (entry["t"] - first_t) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        virtual_now[0] = entry["t"]
+        call_started = time.perf_counter()
+        if entry["src"] == "stream":
+            sync.apply_playback_event(entry["raw"])
+        elif entry["src"] == "mpris":
+            # MPRIS (linux.py) is structured like the push channel and replays as such
+            if entry["raw"]:
+                sync.apply_playback_event(_mpris_event(entry["raw"]))
+            else:
+                sync.force_update_presence(None, source="stream")
+        else:
+            sync.force_update_presence(entry["raw"], source=entry["src"])
+        latencies.append(time.perf_counter() - call_started)
+    sync.pipeline.drain()
+    sync.pipeline.stop()
+    pipeline_stats = sync.pipeline.stats()
+
+    return {
+        "observations": len(entries),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "recorded_seconds": round(entries[-1]["t"] - first_t, 3) if entries else 0.0,
+        "updates_sent": len(presence.updates),
+        "clears_sent": presence.clears,
+        "recorded_publishes": sum(1 for e in outcomes if e.get("out") == "published"),
+        "lookups_made": backend.lookups,
+        "recorded_lookups": sum(1 for e in outcomes if e.get("lookup")),
+        "submit_latency_ms": {"p50": round(_percentile(latencies, 50) * 1000, 3),
+                              "p95": round(_percentile(latencies, 95) * 1000, 3),
+                              "max": round(max(latencies, default=0.0) * 1000, 3)},
+        "publish_latency_ms": pipeline_stats["end_to_end"],
+        "stages": {name: pipeline_stats[name] for name, _ in sync.pipeline.stages},
+        "superseded_in_pipeline": pipeline_stats["replaced"],
+        "recorded_superseded": sum(1 for e in outcomes if e.get("out") in ("superseded", "stale")),
+        "reconciler": sync.reconciler.snapshot(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Qobuz-RPC session against the current build.")
+    parser.add_argument('recording', help="JSONL file written with QOBUZ_RPC_RECORD")
+    parser.add_argument('--speed', type=float, default=0.0, help="Replay speed multiplier (1 = real time, 0 = no waits)")
+    parser.add_argument('--lookup-latency', type=float, default=0.0, help="Simulated art lookup delay in seconds")
+    args = parser.parse_args(argv)
+
+    report = replay(list(read_recording(args.recording)), speed=args.speed, lookup_latency=args.lookup_latency)
+    width = max(len(k) for k in report)
+    for key, value in report.items():
+        print(f"{key.ljust(width)}  {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Fan-out of the now-playing state to outputs besides Discord.
+
+Each sink (OBS overlay files, a JSON file, a local WebSocket for stream
+widgets) has its own bounded queue and worker thread. PublishStage hands every
+published state to SinkPublisher.publish(), which never blocks: when a sink
+falls behind, its oldest pending state is dropped (only the newest matters), so
+a slow disk or a stalled client can't hold up Discord or the other sinks.
+Files are written to a temp file and then swapped in with os.replace.
+
+Sinks are enabled with environment variables:
+    QOBUZ_RPC_NOW_PLAYING_JSON   path of a JSON file holding the current state
+    QOBUZ_RPC_OBS_DIR            folder for now_playing.txt and cover.jpg (OBS text/image sources)
+    QOBUZ_RPC_WIDGET_PORT        port for ws://127.0.0.1:<port>/, which pushes the state as a JSON text frame
+"""
+import collections
+import json
+import os
+import select
+import socket
+import threading
+import time
+
+import requests
+
+import eventlog
+from pipeline import StageTimer
+from pushchannel import OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, ProtocolError, _recv_frame, _send_frame, \
+    _ThreadingServer, _WebSocketHandler
+
+JSON_ENV_VAR = "QOBUZ_RPC_NOW_PLAYING_JSON"
+OBS_DIR_ENV_VAR = "QOBUZ_RPC_OBS_DIR"
+WIDGET_PORT_ENV_VAR = "QOBUZ_RPC_WIDGET_PORT"
+
+DEFAULT_QUEUE_SIZE = 8
+OBS_TEXT_FILE = "now_playing.txt"
+OBS_IMAGE_FILE = "cover.jpg"
+OBS_TEXT_TEMPLATE = "{title} - {artist}"
+ART_DOWNLOAD_TIMEOUT = 5
+# A widget that doesn't take a frame within this is disconnected
+CLIENT_SEND_TIMEOUT = 1.0
+# OBS may hold the file open for a moment on Windows, which makes os.replace fail
+REPLACE_ATTEMPTS = 3
+
+
+def atomic_write(path, data):
+    """Writes bytes to `path` so readers see either the old or the new content, never a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05)
+
+
+# --- 1. SINK BASE ---
+
+class Sink:
+    """A bounded queue drained by one worker thread that calls `write(state)`."""
+
+    name = "sink"
+
+    def __init__(self, max_queue=DEFAULT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self.latency = StageTimer()  # publish() to write done
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, state):
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append((time.monotonic(), state))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                queued_at, state = self._pending.popleft()
+            try:
+                self.write(state)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                eventlog.warning("sinks", "Sink write failed", sink=self.name, error=str(e))
+            self.latency.add(time.monotonic() - queued_at)
+
+    def write(self, state):
+        raise NotImplementedError
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.close()
+
+    def close(self):
+        pass
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._pending)
+        return {"queued": queued, "delivered": self.delivered, "dropped": self.dropped, "errors": self.errors,
+                "latency": self.latency.snapshot()}
+
+
+# --- 2. SINKS ---
+
+class JsonFileSink(Sink):
+    name = "json"
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, state):
+        atomic_write(self.path, json.dumps(state, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+class ObsOverlaySink(Sink):
+    """A text file and the cover image, for OBS 'Text (read from file)' and 'Image' sources."""
+
+    name = "obs"
+
+    def __init__(self, directory, template=OBS_TEXT_TEMPLATE, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.template = template
+        self._art_url = None
+        self._session = requests.Session()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, state):
+        playing = state["state"] == "playing"
+        text = self.template.format(**state) if playing else ""
+        atomic_write(os.path.join(self.directory, OBS_TEXT_FILE), text.encode('utf-8'))
+        art_url = state["art_url"] if playing else None
+        if art_url == self._art_url:
+            return
+        image_path = os.path.join(self.directory, OBS_IMAGE_FILE)
+        if art_url:
+            response = self._session.get(art_url, timeout=ART_DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            atomic_write(image_path, response.content)
+        else:
+            try:
+                os.remove(image_path)
+            except FileNotFoundError:
+                pass
+        self._art_url = art_url
+
+    def close(self):
+        self._session.close()
+
+
+class _WidgetHandler(_WebSocketHandler):
+    """Registers the client for broadcasts; incoming frames other than ping/close are ignored."""
+
+    def handle(self):
+        sink = self.server.owner
+        if not self._handshake():
+            return
+        self.request.settimeout(CLIENT_SEND_TIMEOUT)
+        sink._client_opened(self.request)
+        try:
+            while not sink._closed:
+                # Wait for data with select so the send timeout doesn't cut a frame in half
+                readable, _, _ = select.select([self.request], [], [], 1.0)
+                if not readable:
+                    continue
+                fin, opcode, payload = _recv_frame(self.request)
+                if opcode == OP_CLOSE:
+                    with sink._send_lock:
+                        _send_frame(self.request, OP_CLOSE, payload[:2])
+                    return
+                if opcode == OP_PING:
+                    with sink._send_lock:
+                        _send_frame(self.request, OP_PONG, payload)
+        except (ConnectionError, OSError, ProtocolError, ValueError):
+            pass
+        finally:
+            sink._client_closed(self.request)
+
+
+class WidgetSocketSink(Sink):
+    """Local WebSocket server; every client gets the current state on connect and each change after."""
+
+    name = "widget"
+
+    def __init__(self, host='127.0.0.1', port=5003, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.clients_dropped = 0
+        self._clients = set()
+        self._latest = None
+        self._send_lock = threading.Lock()
+        self._server = None
+        self._server_thread = None
+
+    def start(self):
+        self._server = _ThreadingServer((self.host, self.port), _WidgetHandler)
+        self._server.owner = self
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+        super().start()
+
+    def _client_opened(self, sock):
+        with self._send_lock:
+            self._clients.add(sock)
+            if self._latest is not None:
+                self._send(sock, self._latest)
+
+    def _client_closed(self, sock):
+        with self._send_lock:
+            self._clients.discard(sock)
+
+    def _send(self, sock, payload):
+        """Call with _send_lock held. A client that times out or errors is disconnected."""
+        try:
+            _send_frame(sock, OP_TEXT, payload)
+        except OSError:
+            self._clients.discard(sock)
+            self.clients_dropped += 1
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def write(self, state):
+        payload = json.dumps(state, ensure_ascii=False).encode('utf-8')
+        with self._send_lock:
+            self._latest = payload
+            for sock in list(self._clients):
+                self._send(sock, payload)
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._send_lock:
+            for sock in self._clients:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._clients.clear()
+
+    def stats(self):
+        stats = super().stats()
+        with self._send_lock:
+            stats["clients"] = len(self._clients)
+        stats["clients_dropped"] = self.clients_dropped
+        return stats
+
+
+# --- 3. PUBLISHER ---
+
+class SinkPublisher:
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    @classmethod
+    def from_env(cls, extra=()):
+        """
+        Returns a started publisher for `extra` plus the sinks configured in the environment,
+        or None if that leaves none.
+        """
+        sinks = list(extra)
+        if os.environ.get(JSON_ENV_VAR):
+            sinks.append(JsonFileSink(os.environ[JSON_ENV_VAR]))
+        try:
+            if os.environ.get(OBS_DIR_ENV_VAR):
+                sinks.append(ObsOverlaySink(os.environ[OBS_DIR_ENV_VAR]))
+            if os.environ.get(WIDGET_PORT_ENV_VAR):
+                sinks.append(WidgetSocketSink(port=int(os.environ[WIDGET_PORT_ENV_VAR])))
+        except (OSError, ValueError) as e:
+            eventlog.warning("sinks", "Now-playing sink not enabled", error=str(e))
+        if not sinks:
+            return None
+        publisher = cls(sinks)
+        publisher.start()
+        return publisher
+
+    def start(self):
+        for sink in list(self.sinks):
+            try:
+                sink.start()
+            except OSError as e:
+                eventlog.error("sinks", "Sink could not start", sink=sink.name, error=str(e))
+                self.sinks.remove(sink)
+
+    def publish(self, state):
+        """Queues `state` for every sink; never blocks."""
+        for sink in self.sinks:
+            sink.submit(state)
+
+    def close(self, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        for sink in self.sinks:
+            sink.stop(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        return {sink.name: sink.stats() for sink in self.sinks}
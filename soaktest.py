@@ -0,0 +1,261 @@
+"""
+Soak test: days of listening and Start/Stop cycles in accelerated time.
+
+Runs the longserver synchronizer (with Discord, the Qobuz window and art
+lookups faked) against a simulated listening schedule, listening history
+included. Each Start/Stop cycle builds a fresh synchronizer while the local
+API server stays up across cycles, as in the app, and update checks run
+periodically against a local stub. At every sample it records traced memory, thread count and open file
+handles. It fails (exit code 1) when growth from the warmed-up baseline to
+the last sample goes past the thresholds, or when threads outlive the final
+shutdown, and prints the allocation sites that grew most.
+
+Usage:
+    python soaktest.py --days 3 --speed 1800
+    python soaktest.py --days 7 --speed 3600 --cycle-hours 12 --max-memory-growth-kb 2048
+"""
+import argparse
+import gc
+import http.server
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from history import HistoryStore
+from loadtest import CountingPresence, HeadlessApp
+
+TRACK_SECONDS = 210
+LISTENING_HOURS = (9, 23)  # Qobuz is open between these virtual hours, closed overnight
+
+
+# --- 1. SIMULATED WORLD ---
+
+class VirtualClock:
+    """Virtual seconds since the soak started, running `speed` times faster than the wall clock."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self._started = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self._started) * self.speed
+
+
+class FakeQobuz:
+    """Plays random tracks from a library of `library_size` titles during listening hours."""
+
+    def __init__(self, clock, library_size=3000, seed=7):
+        self.clock = clock
+        rng = random.Random(seed)
+        self.library = [f"Soak Song {i} - Soak Artist {rng.randrange(library_size // 10 or 1)}"
+                        for i in range(library_size)]
+        self._order = random.Random(seed + 1)
+        self._slot = -1
+        self._title = None
+
+    def is_open(self):
+        hour = (self.clock.now() / 3600) % 24
+        return LISTENING_HOURS[0] <= hour < LISTENING_HOURS[1]
+
+    def title(self):
+        slot = int(self.clock.now() // TRACK_SECONDS)
+        if slot != self._slot:
+            self._slot = slot
+            self._title = self._order.choice(self.library)
+        return self._title
+
+
+class _VersionHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"1.0.1"
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def open_file_handles():
+    if psutil is not None:
+        process = psutil.Process()
+        return process.num_handles() if hasattr(process, 'num_handles') else process.num_fds()
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+# --- 2. SOAK RUN ---
+
+class SoakRun:
+
+    def __init__(self, days, speed, cycle_hours, update_check_hours, sample_hours, workdir):
+        self.days = days
+        self.cycle_hours = cycle_hours
+        self.update_check_hours = update_check_hours
+        self.sample_hours = sample_hours
+        self.workdir = workdir
+        self.clock = VirtualClock(speed)
+        self.qobuz = FakeQobuz(self.clock)
+        self.samples = []
+        self.baseline = None
+        self.final = None
+        self.cycles = 0
+        self.update_checks = 0
+        self.leftover_threads = []
+
+    def _start_sync(self, app):
+        """A new synchronizer, as the app's supervisor creates per Start."""
+        import longserver
+
+        sync = longserver.RPCSynchronizer(app, longserver.CLIENT_ID)
+        sync.poll_interval = max(0.005, 2 / self.clock.speed)
+        sync.get_qobuz_handle = lambda: 1 if self.qobuz.is_open() else None
+        sync.get_window_title_by_handle = lambda hwnd: self.qobuz.title()
+        sync.fetch_album_art_and_duration = lambda song, artist: (f"https://example.invalid/{abs(hash(song))}.jpg",
+                                                                  TRACK_SECONDS * 1000)
+        app.rpc_thread = sync
+        sync.daemon = True
+        sync.start()
+        return sync
+
+    def _stop_sync(self, sync):
+        sync.stop()
+        sync.join(timeout=5)
+
+    def _update_check(self, url):
+        import longserver
+        threading.Thread(target=longserver.check_for_updates_logic,
+                         args=(longserver.LOCAL_VERSION, url, longserver.DOWNLOAD_URL), daemon=True).start()
+        self.update_checks += 1
+
+    def _sample(self, app):
+        # Count live objects only; synchronizers form reference cycles that wait for the cyclic GC
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        art_cache = app.rpc_thread.art_cache if app.rpc_thread else None
+        self.samples.append({"virtual_hours": round(self.clock.now() / 3600, 1), "traced_kb": round(traced / 1024, 1),
+                             "threads": threading.active_count(), "file_handles": open_file_handles(),
+                             "art_cache": len(art_cache) if art_cache is not None else None,
+                             "history_plays": app.history.stats["written"]})
+        # The first sample is taken right at startup; growth is measured from the second, once
+        # imports, the first Start and the caches have warmed up
+        if len(self.samples) == 2:
+            self.baseline = tracemalloc.take_snapshot()
+
+    def run(self):
+        import longserver
+        longserver.Presence = lambda client_id: CountingPresence()
+        longserver.RPC_AVAILABLE = True
+
+        version_server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _VersionHandler)
+        threading.Thread(target=version_server.serve_forever, daemon=True).start()
+        version_url = f"http://127.0.0.1:{version_server.server_port}/latest_version.txt"
+
+        # Art cache, history and everything else the app persists go to the soak's own folder
+        os.environ["APPDATA"] = self.workdir
+        app = HeadlessApp()
+        app.history = HistoryStore(flush_interval=0.2)
+        api = longserver.LocalApiServer(app, port=0)
+        api.start()
+        end = self.days * 86400
+        next_cycle = self.cycle_hours * 3600
+        next_check = next_sample = 0.0
+        running = self._start_sync(app)
+        while self.clock.now() < end:
+            now = self.clock.now()
+            if now >= next_cycle:
+                self._stop_sync(running)
+                running = self._start_sync(app)
+                self.cycles += 1
+                next_cycle += self.cycle_hours * 3600
+            if now >= next_check:
+                self._update_check(version_url)
+                next_check += self.update_check_hours * 3600
+            if now >= next_sample:
+                self._sample(app)
+                next_sample += self.sample_hours * 3600
+            time.sleep(0.01)
+        self._sample(app)
+        self.final = tracemalloc.take_snapshot()
+        self._stop_sync(running)
+        api.stop()
+        api.join(timeout=5)
+        app.history.close()
+        version_server.shutdown()
+        version_server.server_close()
+        time.sleep(0.5)
+        # Anything still alive after a full shutdown outlived its owner
+        self.leftover_threads = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+
+
+def growth(samples, key):
+    first, last = samples[1 if len(samples) > 2 else 0][key], samples[-1][key]
+    if first is None or last is None:
+        return None
+    return last - first
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak-test the synchronizer in accelerated time.")
+    parser.add_argument('--days', type=float, default=2.0, help="Virtual days to simulate")
+    parser.add_argument('--speed', type=float, default=1800.0, help="Virtual seconds per real second")
+    parser.add_argument('--cycle-hours', type=float, default=6.0, help="Virtual hours between Start/Stop cycles")
+    parser.add_argument('--update-check-hours', type=float, default=4.0)
+    parser.add_argument('--sample-hours', type=float, default=2.0)
+    parser.add_argument('--max-memory-growth-kb', type=float, default=4096.0)
+    parser.add_argument('--max-thread-growth', type=int, default=2)
+    parser.add_argument('--max-handle-growth', type=int, default=5)
+    parser.add_argument('--max-leftover-threads', type=int, default=0, help="Threads still alive after shutdown")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="qobuz-soak-")
+    tracemalloc.start(10)
+    soak = SoakRun(args.days, args.speed, args.cycle_hours, args.update_check_hours, args.sample_hours, workdir)
+    try:
+        soak.run()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for sample in soak.samples:
+        print(sample)
+    print(f"\n{soak.cycles} Start/Stop cycles, {soak.update_checks} update checks")
+    if soak.baseline is not None:
+        print("Top allocation growth since the baseline:")
+        for stat in soak.final.compare_to(soak.baseline, 'lineno')[:10]:
+            print(f"  {stat}")
+
+    if soak.leftover_threads:
+        print(f"Threads left after shutdown: {soak.leftover_threads}")
+
+    traced = growth(soak.samples, "traced_kb")
+    checks = [("traced_kb", round(traced, 1) if traced is not None else None, args.max_memory_growth_kb),
+              ("threads", growth(soak.samples, "threads"), args.max_thread_growth),
+              ("file_handles", growth(soak.samples, "file_handles"), args.max_handle_growth),
+              ("leftover", len(soak.leftover_threads), args.max_leftover_threads)]
+    failed = False
+    print()
+    for name, value, limit in checks:
+        if value is None:
+            print(f"{name:<14} n/a")
+            continue
+        status = "FAIL" if value > limit else "ok"
+        failed |= value > limit
+        print(f"{name:<14} growth {value:>10}  limit {limit:>8}  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
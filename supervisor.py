@@ -0,0 +1,178 @@
+"""
+Supervisor for the app's background workers.
+
+A worker is anything thread-like with `start()`, `stop()`, `join(timeout)` and
+`is_alive()` (RPCSynchronizer, the local API server, the push channel, the
+update checker), and optionally `release()` for cleaning up after a crash.
+Each is registered once with a factory. `start(name)` reuses a live worker
+instead of starting a second one, `stop(name)` stops and joins it within a
+deadline, and a monitor thread restarts workers that die on their own,
+backing off exponentially while they keep crashing. `states()` reports each
+worker for the GUI, and `on_change(name, state)` fires on every transition.
+"""
+import threading
+import time
+
+import eventlog
+
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+# A worker that stayed up this long counts as healthy again; its backoff starts over
+STABLE_SECONDS = 60.0
+CHECK_INTERVAL_SECONDS = 0.5
+
+STATE_STOPPED = "stopped"
+STATE_RUNNING = "running"
+STATE_RESTARTING = "restarting"
+STATE_STOPPING = "stopping"
+STATE_STUCK = "stuck"
+
+
+class _Slot:
+    __slots__ = ("name", "factory", "worker", "wanted", "state", "restarts", "backoff", "retry_at", "started_at",
+                 "error")
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.worker = None
+        self.wanted = False
+        self.state = STATE_STOPPED
+        self.restarts = 0
+        self.backoff = INITIAL_BACKOFF_SECONDS
+        self.retry_at = 0.0
+        self.started_at = 0.0
+        self.error = None
+
+
+class Supervisor:
+
+    def __init__(self, on_change=None, check_interval=CHECK_INTERVAL_SECONDS):
+        self.on_change = on_change
+        self.check_interval = check_interval
+        self._slots = {}
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def add(self, name, factory):
+        with self._lock:
+            self._slots[name] = _Slot(name, factory)
+
+    def _set_state(self, slot, state, error=None):
+        slot.state = state
+        slot.error = error
+        if self.on_change:
+            self.on_change(slot.name, state)
+
+    def _spawn(self, slot):
+        """Creates and starts a fresh worker; a failure is handled like a crash. Call with the lock held."""
+        try:
+            worker = slot.factory()
+            worker.start()
+        except Exception as e:
+            slot.worker = None
+            self._schedule_restart(slot, f"{type(e).__name__}: {e}")
+            return None
+        slot.worker = worker
+        slot.started_at = time.monotonic()
+        self._set_state(slot, STATE_RUNNING)
+        return worker
+
+    def _schedule_restart(self, slot, error):
+        now = time.monotonic()
+        if slot.started_at and now - slot.started_at >= STABLE_SECONDS:
+            slot.backoff = INITIAL_BACKOFF_SECONDS
+        slot.retry_at = now + slot.backoff
+        slot.backoff = min(MAX_BACKOFF_SECONDS, slot.backoff * 2)
+        eventlog.warning("supervisor", "Worker failed; restarting", worker=slot.name, error=error,
+                         retry_in=round(slot.retry_at - now, 1))
+        self._set_state(slot, STATE_RESTARTING, error)
+
+    def start(self, name):
+        """Starts the worker unless it is already running. Returns the live worker (None while restarting)."""
+        with self._lock:
+            slot = self._slots[name]
+            slot.wanted = True
+            if slot.worker is not None and slot.worker.is_alive():
+                return slot.worker
+            if slot.state == STATE_RESTARTING:
+                return None
+            slot.backoff = INITIAL_BACKOFF_SECONDS
+            return self._spawn(slot)
+
+    def stop(self, name, timeout=5.0):
+        """Stops the worker and waits up to `timeout` for it. Returns False if it is still alive afterwards."""
+        with self._lock:
+            slot = self._slots[name]
+            slot.wanted = False
+            worker, slot.worker = slot.worker, None
+            if worker is None or not worker.is_alive():
+                self._set_state(slot, STATE_STOPPED)
+                return True
+            self._set_state(slot, STATE_STOPPING)
+        try:
+            worker.stop()
+        except Exception as e:
+            eventlog.error("supervisor", "Worker failed to stop", worker=name, error=str(e))
+        worker.join(max(0.0, timeout))
+        stopped = not worker.is_alive()
+        if not stopped:
+            eventlog.error("supervisor", "Worker did not stop in time", worker=name, timeout=timeout)
+        with self._lock:
+            if not slot.wanted:
+                self._set_state(slot, STATE_STOPPED if stopped else STATE_STUCK)
+        return stopped
+
+    def current(self, name):
+        """The live worker, or None."""
+        slot = self._slots.get(name)
+        worker = slot.worker if slot else None
+        return worker if worker is not None and worker.is_alive() else None
+
+    def shutdown(self, timeout=5.0):
+        """Stops every worker (last added first) within one overall deadline."""
+        self._closed.set()
+        deadline = time.monotonic() + timeout
+        stopped = True
+        for name in reversed(list(self._slots)):
+            stopped &= self.stop(name, deadline - time.monotonic())
+        return stopped
+
+    def _release(self, name, worker):
+        """
+        Cleans up after a worker that died on its own, so what it started (pipeline threads,
+        the Discord reconnect thread) doesn't outlive it and compete with its replacement.
+        Uses the worker's release() if it has one: stop() is the user-facing path and may
+        report "Stopped" while the worker is in fact being restarted.
+        """
+        try:
+            getattr(worker, 'release', worker.stop)()
+        except Exception as e:
+            eventlog.warning("supervisor", "Crashed worker failed to clean up", worker=name, error=str(e))
+
+    def _watch(self):
+        while not self._closed.wait(self.check_interval):
+            now = time.monotonic()
+            dead = []
+            with self._lock:
+                for slot in self._slots.values():
+                    if not slot.wanted:
+                        continue
+                    if slot.state == STATE_RUNNING and (slot.worker is None or not slot.worker.is_alive()):
+                        if slot.worker is not None:
+                            dead.append((slot.name, slot.worker))
+                        slot.worker = None
+                        self._schedule_restart(slot, "exited unexpectedly")
+                    elif slot.state == STATE_RESTARTING and now >= slot.retry_at:
+                        slot.restarts += 1
+                        self._spawn(slot)
+            # Outside the lock, since stop() may block; the replacement is spawned on a later pass
+            for name, worker in dead:
+                self._release(name, worker)
+
+    def states(self):
+        with self._lock:
+            return {name: {"state": slot.state, "restarts": slot.restarts, "error": slot.error}
+                    for name, slot in self._slots.items()}
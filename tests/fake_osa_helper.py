@@ -0,0 +1,41 @@
+"""
+Stand-in for the AppleScript helper in osahelper.py, speaking the same line protocol.
+
+Usage: fake_osa_helper.py [--no-ready] [--exit-after N] [--hang-after N] REPLY...
+Each "query" is answered with the next REPLY (cycling); "quit" exits.
+"""
+import argparse
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-ready', action='store_true', help="Never write READY")
+    parser.add_argument('--exit-after', type=int, help="Exit without a reply on query number N+1")
+    parser.add_argument('--hang-after', type=int, help="Stop answering after N queries")
+    parser.add_argument('replies', nargs='*', default=["IDLE"])
+    args = parser.parse_args()
+
+    if args.no_ready:
+        time.sleep(60)
+        return 0
+    print("READY", flush=True)
+    queries = 0
+    for line in sys.stdin:
+        command = line.strip()
+        if command == "quit":
+            return 0
+        if command != "query":
+            continue
+        if args.exit_after is not None and queries >= args.exit_after:
+            return 1
+        if args.hang_after is not None and queries >= args.hang_after:
+            time.sleep(60)
+        print(args.replies[queries % len(args.replies)], flush=True)
+        queries += 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
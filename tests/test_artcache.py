@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+
+import requests
+
+import artcache
+from artcache import ArtCache, LookupResult
+from breaker import STATE_CLOSED, STATE_OPEN, CircuitBreaker
+
+
+def test_setting_entries_only_marks_the_cache_dirty(tmp_path):
+    cache = ArtCache(path=str(tmp_path / "art_cache.json"))
+    cache["Song - Artist"] = ("https://art", 1000)
+    assert not os.path.exists(cache.path)
+
+    cache.flush()
+    cache.flush()
+    assert cache.saves == 1
+    with open(cache.path, encoding='utf-8') as f:
+        assert json.load(f) == {"Song - Artist": ["https://art", 1000]}
+
+
+def test_stop_autosave_writes_pending_entries(tmp_path):
+    cache = ArtCache(path=str(tmp_path / "art_cache.json"))
+    cache.start_autosave(interval=60)
+    cache["Song - Artist"] = ("https://art", 1000)
+    cache.stop_autosave()
+    assert ArtCache.load(cache.path) == {"Song - Artist": ("https://art", 1000)}
+
+
+def test_concurrent_saves_of_one_file_keep_every_entry(tmp_path):
+    path = str(tmp_path / "art_cache.json")
+    caches = [ArtCache(path=path) for _ in range(4)]
+    for i, cache in enumerate(caches):
+        for j in range(200):
+            cache[f"Song {j} - Artist {i}"] = ("https://art", j)
+
+    def save_repeatedly(cache):
+        for _ in range(20):
+            cache.save()
+
+    threads = [threading.Thread(target=save_repeatedly, args=(cache,)) for cache in caches]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(ArtCache.load(path)) == 800
+    assert sorted(os.listdir(tmp_path)) == ["art_cache.json", "art_cache.json.lock"]
+
+
+def test_save_keeps_entries_another_process_wrote(tmp_path):
+    path = str(tmp_path / "art_cache.json")
+    app = ArtCache.load(path)
+    app["Song - Artist"] = (None, None)
+
+    # A cache warm run finishes while the app is open
+    warmer = ArtCache.load(path)
+    warmer["Song - Artist"] = ("https://art", 1000)
+    warmer["Other - Artist"] = (None, None)
+    warmer.save()
+
+    app["Mine - Artist"] = ("https://mine", 2000)
+    app.save()
+    assert ArtCache.load(path) == {"Song - Artist": ("https://art", 1000), "Other - Artist": (None, None),
+                                   "Mine - Artist": ("https://mine", 2000)}
+    # The running app picks up what the warmer found
+    assert app["Song - Artist"] == ("https://art", 1000)
+
+
+def _http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+
+def _fake_service(monkeypatch, error):
+    breaker = CircuitBreaker("art-service", failure_threshold=1, reset_timeout=300, max_reset_timeout=300)
+    calls = {"service": 0, "itunes": 0}
+
+    def service_lookup(*args, **kwargs):
+        calls["service"] += 1
+        raise error
+
+    def itunes(*args, **kwargs):
+        calls["itunes"] += 1
+        return LookupResult("https://art", 1000)
+
+    monkeypatch.setattr(artcache, "ART_SERVICE_URL", "http://service")
+    monkeypatch.setattr(artcache, "SERVICE_BREAKER", breaker)
+    monkeypatch.setattr(artcache, "_service_busy_until", 0.0)
+    monkeypatch.setattr(artcache, "service_lookup", service_lookup)
+    monkeypatch.setattr(artcache, "limited_itunes_lookup", itunes)
+    return breaker, calls
+
+
+def test_busy_service_is_throttling_not_an_outage(monkeypatch):
+    breaker, calls = _fake_service(monkeypatch, _http_error(503, {"Retry-After": "10"}))
+
+    assert artcache.resolve_art("Song", "Artist") == ("https://art", 1000)
+    assert breaker.state == STATE_CLOSED
+    # Within Retry-After the service isn't asked again
+    artcache.resolve_art("Other", "Artist")
+    assert calls == {"service": 1, "itunes": 2}
+
+    monkeypatch.setattr(artcache, "_service_busy_until", 0.0)
+    artcache.resolve_art("Third", "Artist")
+    assert calls["service"] == 2
+
+
+def test_failing_service_opens_the_breaker(monkeypatch):
+    breaker, calls = _fake_service(monkeypatch, _http_error(503))
+
+    artcache.resolve_art("Song", "Artist")
+    assert breaker.state == STATE_OPEN
+    artcache.resolve_art("Other", "Artist")
+    assert calls == {"service": 1, "itunes": 2}
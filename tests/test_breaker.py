@@ -0,0 +1,88 @@
+import pytest
+
+from breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail():
+    raise OSError("down")
+
+
+def _open_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10, max_reset_timeout=40, clock=clock)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            breaker.call(_fail)
+    assert breaker.state == STATE_OPEN
+    return breaker
+
+
+def test_opens_after_consecutive_failures_and_short_circuits():
+    clock = Clock()
+    breaker = _open_breaker(clock)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    assert breaker.snapshot()["short_circuited"] == 1
+    assert breaker.snapshot()["retry_in_seconds"] == 10
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, clock=Clock())
+    with pytest.raises(OSError):
+        breaker.call(_fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(OSError):
+        breaker.call(_fail)
+    assert breaker.state == STATE_CLOSED
+
+
+def test_half_open_lets_exactly_one_probe_through():
+    clock = Clock()
+    breaker = _open_breaker(clock)
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    # A second caller doesn't get to probe while the first one is out
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_with_doubled_timeout_up_to_the_cap():
+    clock = Clock()
+    breaker = _open_breaker(clock)
+    for expected_timeout in (20, 40, 40):
+        clock.now += breaker.reset_timeout
+        with pytest.raises(OSError):
+            breaker.call(_fail)
+        assert breaker.state == STATE_OPEN
+        assert breaker.reset_timeout == expected_timeout
+    clock.now += breaker.reset_timeout
+    breaker.call(lambda: None)
+    assert breaker.reset_timeout == 10
+
+
+def test_release_returns_an_unused_probe_slot():
+    clock = Clock()
+    breaker = _open_breaker(clock)
+    clock.now = 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_errors_that_are_not_failures_count_as_success():
+    breaker = CircuitBreaker("test", failure_threshold=1, clock=Clock())
+    with pytest.raises(ValueError):
+        breaker.call(lambda: int("x"), is_failure=lambda e: not isinstance(e, ValueError))
+    assert breaker.state == STATE_CLOSED
+    assert breaker.failures == 0
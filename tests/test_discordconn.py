@@ -0,0 +1,123 @@
+import time
+
+from discordconn import PresenceConnection
+
+
+class FakeDiscord:
+    """The Discord client: `running` decides whether pipes connect and stay usable."""
+
+    def __init__(self, running=True):
+        self.running = running
+        self.updates = []
+        self.clears = 0
+
+    def presence(self, client_id):
+        return FakePresence(self)
+
+
+class FakePresence:
+    def __init__(self, discord):
+        self.discord = discord
+
+    def _check(self):
+        if not self.discord.running:
+            raise ConnectionRefusedError("Discord is not running")
+
+    def connect(self):
+        self._check()
+
+    def update(self, **kwargs):
+        self._check()
+        self.discord.updates.append(kwargs)
+
+    def clear(self):
+        self._check()
+        self.discord.clears += 1
+
+    def close(self):
+        pass
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _connection(discord, **kwargs):
+    return PresenceConnection(discord.presence, "client", initial_backoff=0.01, max_backoff=0.05, **kwargs)
+
+
+def test_presence_set_before_discord_starts_is_sent_once_it_does():
+    discord = FakeDiscord(running=False)
+    first = []
+    conn = _connection(discord, on_first_presence=first.append)
+    try:
+        assert not conn.connect()
+        assert not conn.update(details="Song")
+        assert first == []
+        discord.running = True
+        _wait_for(lambda: conn.connected)
+        assert discord.updates == [{"details": "Song"}]
+        assert len(first) == 1
+        assert conn.reconnects == 0
+    finally:
+        conn.close()
+
+
+def test_lost_pipe_reconnects_and_replays_the_last_presence():
+    discord = FakeDiscord()
+    states = []
+    first = []
+    conn = _connection(discord, on_state_change=states.append, on_first_presence=first.append)
+    try:
+        assert conn.connect()
+        assert conn.update(details="One")
+        discord.running = False
+        assert not conn.update(details="Two")
+        assert not conn.connected
+        discord.running = True
+        _wait_for(lambda: conn.connected)
+        assert discord.updates == [{"details": "One"}, {"details": "Two"}]
+        assert conn.reconnects == 1
+        assert states == [True, False, True]
+        # Only the very first presence is reported
+        assert len(first) == 1
+    finally:
+        conn.close()
+
+
+def test_clear_while_disconnected_is_not_undone_on_reconnect():
+    discord = FakeDiscord()
+    conn = _connection(discord)
+    try:
+        conn.connect()
+        conn.update(details="Song")
+        discord.running = False
+        conn.clear()
+        discord.running = True
+        _wait_for(lambda: conn.connected)
+        assert discord.updates == [{"details": "Song"}]
+        assert conn.stats()["reconnects"] == 1
+    finally:
+        conn.close()
+
+
+def test_first_presence_is_reported_once_across_reconnects():
+    discord = FakeDiscord()
+    first = []
+    conn = _connection(discord, on_first_presence=first.append)
+    try:
+        assert conn.connect()
+        assert first == []
+        assert conn.update(details="One")
+        assert conn.update(details="Two")
+        discord.running = False
+        assert not conn.update(details="Three")
+        discord.running = True
+        _wait_for(lambda: conn.connected and discord.updates[-1] == {"details": "Three"})
+        assert len(first) == 1
+        assert first[0] == conn.first_presence_at
+    finally:
+        conn.close()
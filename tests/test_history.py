@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import time
+
+import history
+from history import HistoryStore
+
+
+def _fail(rows):
+    raise sqlite3.OperationalError("disk I/O error")
+
+
+def test_failed_batch_drops_its_oldest_plays_not_the_newest(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "MAX_BUFFERED_PLAYS", 5)
+    store = HistoryStore(path=str(tmp_path / "history.sqlite3"), flush_interval=3600)
+    try:
+        for i in range(4):
+            store.record_play(f"Old {i}", "Artist", played_at=i)
+        batch = store._take_batch()
+        for i in range(3):
+            store.record_play(f"New {i}", "Artist", played_at=10 + i)
+        assert store._requeue(batch) == 2
+        assert [play[1] for play in store._buffer] == ["Old 2", "Old 3", "New 0", "New 1", "New 2"]
+        assert store.stats["dropped"] == 2
+
+        monkeypatch.setattr(store, "_write_batch", _fail)
+        store._flush_once()
+        assert [play[1] for play in store._buffer] == ["Old 2", "Old 3", "New 0", "New 1", "New 2"]
+        assert store.stats["errors"] == 1
+    finally:
+        store.close()
+
+
+def test_timestamp_zero_is_kept(tmp_path):
+    store = HistoryStore(path=str(tmp_path / "history.sqlite3"), flush_interval=3600)
+    try:
+        store.record_play("Song", "Artist", played_at=0)
+        store.record_play("Now", "Artist")
+        assert store._buffer[0][0] == 0
+        assert store._buffer[1][0] > 0
+    finally:
+        store.close()
+
+
+def test_batched_writes_keep_aggregates_in_step_with_plays(tmp_path):
+    store = HistoryStore(path=str(tmp_path / "history.sqlite3"), flush_interval=3600)
+    try:
+        now = time.time()
+        store.record_play("A", "Artist 1", duration_ms=60000, played_at=now - 2)
+        store.record_play("A", "Artist 1", duration_ms=60000, played_at=now - 1)
+        store.record_play("B", "Artist 2", duration_ms=30000, played_at=now)
+        assert store.total_plays() == 0
+        store.flush()
+        assert store.stats["batches"] == 1
+        assert store.stats["written"] == 3
+
+        assert store.total_plays() == 3
+        assert store.top_artists() == [("Artist 1", 2), ("Artist 2", 1)]
+        assert store.top_tracks(limit=1) == [("A", "Artist 1", 2)]
+        assert store.top_artists(since=now - 0.5) == [("Artist 2", 1)]
+        today = time.strftime("%Y-%m-%d", time.localtime(now))
+        assert store.plays_by_day(1) == [(today, 3, 150000)]
+    finally:
+        store.close()
+
+
+def test_close_writes_buffered_plays_and_export_reads_them(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = HistoryStore(path=path, flush_interval=3600)
+    store.record_play("Song", "Artist", album="Album", source="qobuz", played_at=100.0)
+    store.close()
+
+    store = HistoryStore(path=path, flush_interval=3600)
+    try:
+        out = tmp_path / "plays.json"
+        history.export_history(store, str(out))
+        assert json.loads(out.read_text(encoding="utf-8")) == [
+            {"id": 1, "played_at": 100.0, "title": "Song", "artist": "Artist", "album": "Album",
+             "duration_ms": None, "source": "qobuz"}]
+    finally:
+        store.close()
@@ -0,0 +1,70 @@
+import socket
+import threading
+
+import instance
+from instance import InstanceLock, send_instance_command
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_commands_before_serve_are_queued_and_run_in_order():
+    port = _free_port()
+    lock = InstanceLock(port)
+    assert lock.acquire()
+    try:
+        assert not InstanceLock(port).acquire()
+        # The first instance is still starting up, but the second launch is answered at once
+        assert send_instance_command("start", port)
+        assert send_instance_command("show", port)
+        received = []
+        lock.serve(received.append)
+        assert received == ["start", "show"]
+        assert send_instance_command("stop", port)
+        assert received == ["start", "show", "stop"]
+    finally:
+        lock.release()
+
+
+def test_unknown_command_is_refused():
+    port = _free_port()
+    lock = InstanceLock(port)
+    assert lock.acquire()
+    try:
+        lock.serve(lambda command: None)
+        assert not send_instance_command("bogus", port)
+    finally:
+        lock.release()
+
+
+def test_silent_peer_counts_as_running_instance(monkeypatch):
+    monkeypatch.setattr(instance, "REPLY_TIMEOUT_SECONDS", 0.2)
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+        accepted = []
+        threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+        assert send_instance_command("show", port)
+        for conn, _ in accepted:
+            conn.close()
+
+
+def test_foreign_program_is_not_an_instance():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+
+        def answer():
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(64)
+                conn.sendall(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+
+        threading.Thread(target=answer, daemon=True).start()
+        assert not send_instance_command("show", port)
+    assert not send_instance_command("show", port)
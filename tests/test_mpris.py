@@ -0,0 +1,138 @@
+import shutil
+import subprocess
+import threading
+import time
+import types
+
+import pytest
+
+import mpris
+
+if mpris.MPRIS_AVAILABLE:
+    from jeepney import DBusAddress, HeaderFields, MessageType, new_method_return, new_signal
+    from jeepney.bus_messages import message_bus
+    from jeepney.io.blocking import Proxy, open_dbus_connection
+
+pytestmark = pytest.mark.skipif(not mpris.MPRIS_AVAILABLE, reason="jeepney is not installed")
+
+PLAYER = "org.mpris.MediaPlayer2.qobuz"
+
+
+def _signal(member, sender, body):
+    fields = {mpris.HeaderFields.member: member, mpris.HeaderFields.sender: sender}
+    return types.SimpleNamespace(header=types.SimpleNamespace(fields=fields), body=body)
+
+
+def test_resume_rereads_position():
+    tracks = []
+    source = mpris.MprisTrackSource(tracks.append)
+    source._owners[":1.7"] = PLAYER
+    source._players[PLAYER] = {"metadata": {"xesam:title": "Song"}, "status": "Paused", "position": 10_000_000}
+    calls = []
+
+    def fake_call(bus_name, path, interface, method, signature=None, body=()):
+        calls.append((method, body))
+        return [("x", 95_000_000)]
+
+    source._call = fake_call
+    source._handle_signal(_signal("PropertiesChanged", ":1.7",
+                                  (mpris.PLAYER_INTERFACE, {"PlaybackStatus": ("s", "Playing")}, [])))
+
+    assert calls == [("Get", (mpris.PLAYER_INTERFACE, "Position"))]
+    assert tracks[-1]["playing"] is True
+    assert tracks[-1]["position_ms"] == 95_000
+
+
+# --- Against a private session bus with a fake player ---
+
+@pytest.fixture
+def session_bus():
+    if shutil.which("dbus-daemon") is None:
+        pytest.skip("dbus-daemon is not available")
+    daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        yield daemon.stdout.readline().strip()
+    finally:
+        daemon.terminate()
+        daemon.wait(timeout=5)
+
+
+class FakePlayer(threading.Thread):
+    """Serves the MPRIS Player properties under PLAYER and emits PropertiesChanged on request."""
+
+    def __init__(self, address):
+        super().__init__(daemon=True)
+        self.conn = open_dbus_connection(bus=address)
+        Proxy(message_bus, self.conn).RequestName(PLAYER)
+        self.status = "Paused"
+        self.position_us = 10_000_000
+        self.metadata = {"xesam:title": ("s", "Song"), "xesam:artist": ("as", ["Artist"]),
+                         "xesam:album": ("s", "Album"), "mpris:length": ("x", 200_000_000),
+                         "mpris:artUrl": ("s", "https://art")}
+        self._done = threading.Event()
+
+    def _properties(self):
+        return {"Metadata": ("a{sv}", self.metadata), "PlaybackStatus": ("s", self.status),
+                "Position": ("x", self.position_us)}
+
+    def run(self):
+        while not self._done.is_set():
+            try:
+                msg = self.conn.receive(timeout=0.1)
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            if msg.header.message_type != MessageType.method_call:
+                continue
+            member = msg.header.fields.get(HeaderFields.member)
+            if member == "GetAll":
+                self.conn.send(new_method_return(msg, "a{sv}", (self._properties(),)))
+            elif member == "Get":
+                self.conn.send(new_method_return(msg, "v", (self._properties()[msg.body[1]],)))
+
+    def play_from(self, position_us):
+        """Resumes at `position_us` and signals only the status, as real players do."""
+        self.position_us = position_us
+        self.status = "Playing"
+        address = DBusAddress(mpris.MPRIS_PATH, interface=mpris.PROPERTIES_INTERFACE)
+        self.conn.send(new_signal(address, "PropertiesChanged", "sa{sv}as",
+                                  (mpris.PLAYER_INTERFACE, {"PlaybackStatus": ("s", "Playing")}, [])))
+
+    def close(self):
+        self._done.set()
+        self.join(timeout=5)
+        self.conn.close()
+
+
+def _wait_for(tracks, predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if tracks and predicate(tracks[-1]):
+            return tracks[-1]
+        time.sleep(0.02)
+    raise AssertionError(f"no matching track, last seen: {tracks[-1] if tracks else None}")
+
+
+def test_track_source_on_private_bus(session_bus):
+    player = FakePlayer(session_bus)
+    player.start()
+    tracks = []
+    source = mpris.MprisTrackSource(tracks.append, bus=session_bus, wakeup_interval=0.1)
+    source.start()
+    try:
+        track = _wait_for(tracks, lambda t: t is not None)
+        assert (track["title"], track["artist"], track["album"]) == ("Song", "Artist", "Album")
+        assert (track["length_ms"], track["position_ms"], track["playing"]) == (200_000, 10_000, False)
+
+        player.play_from(95_000_000)
+        track = _wait_for(tracks, lambda t: t is not None and t["playing"])
+        assert track["position_ms"] == 95_000
+
+        player.close()
+        _wait_for(tracks, lambda t: t is None)
+    finally:
+        source.stop()
+        source.join(timeout=5)
+        player.close()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+from osahelper import QOBUZ_APPLICATION_NAME, OsaTrackHelper
+
+FAKE_HELPER = os.path.join(os.path.dirname(__file__), "fake_osa_helper.py")
+
+
+def _helper(*args, **kwargs):
+    kwargs.setdefault("timeout", 1.0)
+    kwargs.setdefault("startup_timeout", 5.0)
+    kwargs.setdefault("max_backoff", 0.1)
+    return OsaTrackHelper(command=[sys.executable, FAKE_HELPER, *args], **kwargs)
+
+
+def test_replies_map_to_titles():
+    helper = _helper("TRACK\tSong - Artist", "IDLE", "CLOSED", "ERROR\tNot authorized", "garbage", "TRACK\t ")
+    try:
+        assert helper.query() == "Song - Artist"
+        assert helper.query() == QOBUZ_APPLICATION_NAME
+        assert helper.query() is None
+        assert helper.query() == QOBUZ_APPLICATION_NAME
+        assert helper.query() is None
+        assert helper.query() is None
+        # One process answered every query
+        assert helper.starts == 1
+    finally:
+        helper.close()
+
+
+def test_helper_that_exits_is_restarted_after_backoff():
+    helper = _helper("--exit-after", "1", "TRACK\tSong - Artist")
+    try:
+        assert helper.query() == "Song - Artist"
+        assert helper.query() is None
+        # Died right after starting, so the restart waits for the backoff
+        assert helper.query() is None
+        assert helper.starts == 1
+        time.sleep(0.15)
+        assert helper.query() == "Song - Artist"
+        assert helper.restarts == 1
+    finally:
+        helper.close()
+
+
+def test_hung_helper_times_out_and_is_replaced():
+    helper = _helper("--hang-after", "1", "IDLE", timeout=0.3)
+    try:
+        assert helper.query() == QOBUZ_APPLICATION_NAME
+        hung = helper._process
+        started = time.monotonic()
+        assert helper.query() is None
+        assert time.monotonic() - started < 2
+        assert hung.poll() is not None
+        time.sleep(0.15)
+        assert helper.query() == QOBUZ_APPLICATION_NAME
+        assert helper.restarts == 1
+    finally:
+        helper.close()
+
+
+def test_helper_without_ready_is_not_used():
+    helper = _helper("--no-ready", startup_timeout=0.3)
+    try:
+        assert helper.query() is None
+        assert helper.starts == 0
+        assert helper._process is None
+    finally:
+        helper.close()
+
+
+def test_close_asks_the_helper_to_quit():
+    helper = _helper("IDLE")
+    helper.query()
+    process = helper._process
+    helper.close()
+    assert process.returncode == 0
+    assert helper._process is None
@@ -0,0 +1,58 @@
+from pipeline import STATE_PLAYING, EnrichStage, PublishStage, TrackRecord
+from titleparse import TitleParser
+
+
+class FakePresence:
+    def __init__(self):
+        self.updates = []
+        self.clears = 0
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+        return True
+
+    def clear(self):
+        self.clears += 1
+        return True
+
+
+class FakeApp:
+    def update_status(self, message, color=None):
+        self.status = message
+
+
+class FakeSync:
+    def __init__(self):
+        self.rpc = FakePresence()
+        self.app = FakeApp()
+
+
+def test_publish_sends_presence_and_returns_record():
+    sync = FakeSync()
+    stage = PublishStage(sync)
+    record = TrackRecord.from_title("Song - Artist")._replace(state=STATE_PLAYING, title="Song", artist="Artist")
+
+    assert stage(record) is record
+    assert sync.rpc.updates[0]["details"] == "Song"
+    assert sync.rpc.updates[0]["state"] == "by Artist"
+    assert stage.published == 1
+    # The same track again is not re-sent
+    assert stage(record) is None
+    assert stage.skipped == 1
+
+
+def test_enrich_does_not_repeat_a_recorded_miss():
+    sync = FakeSync()
+    lookups = []
+    sync.fetch_album_art_and_duration = lambda title, artist: lookups.append((title, artist)) or (None, None)
+    sync.art_cache = {"Missing - Artist": (None, None), "Found - Artist": ("https://art", 1000)}
+    stage = EnrichStage(sync, parser=TitleParser())
+
+    def playing(title):
+        return TrackRecord.from_title(f"{title} - Artist")._replace(state=STATE_PLAYING, title=title, artist="Artist")
+
+    assert stage(playing("Missing")).art_url is None
+    assert stage(playing("Found")).art_url == "https://art"
+    assert lookups == []
+    stage(playing("New"))
+    assert lookups == [("New", "Artist")]
@@ -0,0 +1,131 @@
+import base64
+import json
+import os
+import socket
+import struct
+
+import pytest
+
+import pushchannel
+from pushchannel import (MAX_MESSAGE_BYTES, OP_CLOSE, OP_CONTINUATION, OP_TEXT, PlaybackEventServer, _unmask,
+                         parse_playback_event)
+
+
+def test_unmask_matches_per_byte_xor():
+    mask = b"\x12\x34\x56\x78"
+    payload = os.urandom(1027)
+    expected = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    assert _unmask(payload, mask) == expected
+    assert _unmask(b"", mask) == b""
+
+
+@pytest.mark.parametrize("field", ["artist", "album", "art_url"])
+def test_non_string_text_fields_are_rejected(field):
+    with pytest.raises(ValueError):
+        parse_playback_event(json.dumps({"title": "Song", field: {"nested": True}}))
+    assert parse_playback_event(json.dumps({"title": "Song", field: None}))[field] is None
+
+
+@pytest.mark.parametrize("text", ['{"title": "Song", "duration": NaN}', '{"title": "Song", "position": Infinity}',
+                                  '{"title": "Song", "position": -1}', '{"title": "Song", "paused": "false"}',
+                                  '{"title": "Song", "paused": 0}'])
+def test_bad_numbers_and_flags_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_playback_event(text)
+
+
+def test_paused_and_times_are_parsed():
+    event = parse_playback_event('{"title": "Song", "duration": 215, "position": 0, "paused": true}')
+    assert (event["duration"], event["position"], event["paused"]) == (215.0, 0.0, True)
+    assert parse_playback_event('{"title": "Song"}')["paused"] is False
+
+
+def _send(sock, opcode, payload, fin=True):
+    mask = os.urandom(4)
+    length = len(payload)
+    header = bytes([(0x80 if fin else 0) | opcode])
+    if length < 126:
+        header += bytes([0x80 | length])
+    else:
+        header += bytes([0x80 | 126]) + struct.pack("!H", length)
+    sock.sendall(header + mask + _unmask(payload, mask))
+
+
+def _read_server_frame(sock):
+    # Server frames are unmasked and the replies here are all under 126 bytes
+    first, second = sock.recv(2, socket.MSG_WAITALL)
+    payload = sock.recv(second, socket.MSG_WAITALL) if second else b""
+    return first & 0x0F, payload
+
+
+@pytest.fixture
+def server():
+    events = []
+    server = PlaybackEventServer(events.append, port=0)
+    server.start()
+    server.events = events
+    yield server
+    server.stop()
+
+
+def _handshake(server, origin=None):
+    sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode()
+    origin_header = f"Origin: {origin}\r\n" if origin else ""
+    sock.sendall((f"GET / HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n{origin_header}"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    response = b""
+    while b"\r\n\r\n" not in response:
+        chunk = sock.recv(1024)
+        if not chunk:
+            break
+        response += chunk
+    return sock, response
+
+
+def _connect(server, origin=None):
+    sock, response = _handshake(server, origin)
+    assert response.startswith(b"HTTP/1.1 101")
+    return sock
+
+
+def test_only_allowed_origins_can_connect(server):
+    sock, response = _handshake(server, "https://evil.example")
+    sock.close()
+    assert response.startswith(b"HTTP/1.1 403")
+    _connect(server, "https://play.qobuz.com").close()
+    assert server.stats["forbidden"] == 1
+
+
+def test_idle_socket_is_dropped_during_handshake(server, monkeypatch):
+    monkeypatch.setattr(pushchannel, "HANDSHAKE_TIMEOUT_SECONDS", 0.2)
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as sock:
+        sock.sendall(b"GET / HTTP/1.1\r\n")
+        # The server gives up on the handshake and closes the connection
+        assert sock.recv(1024) == b""
+
+
+def test_invalid_event_gets_an_error_reply(server):
+    with _connect(server) as sock:
+        _send(sock, OP_TEXT, json.dumps({"title": "Song", "artist": 42}).encode())
+        opcode, payload = _read_server_frame(sock)
+        assert opcode == OP_TEXT
+        assert "artist" in json.loads(payload)["error"]
+        _send(sock, OP_TEXT, json.dumps({"title": "Song", "artist": "Artist"}).encode(), fin=False)
+        _send(sock, OP_CONTINUATION, b"")
+        _send(sock, OP_CLOSE, b"")
+        assert _read_server_frame(sock)[0] == OP_CLOSE
+    assert server.events[0]["artist"] == "Artist"
+    assert server.stats["invalid"] == 1
+
+
+def test_fragmented_message_over_the_limit_closes_the_connection(server):
+    chunk = b"x" * 60000
+    with _connect(server) as sock:
+        _send(sock, OP_TEXT, chunk, fin=False)
+        _send(sock, OP_CONTINUATION, chunk, fin=False)
+        opcode, payload = _read_server_frame(sock)
+        assert opcode == OP_CLOSE
+        assert struct.unpack("!H", payload)[0] == 1009
+    assert len(chunk) * 2 > MAX_MESSAGE_BYTES
+    assert server.events == []
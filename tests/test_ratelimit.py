@@ -0,0 +1,89 @@
+import threading
+import time
+
+import requests
+
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_CURRENT, PriorityRateLimiter, retry_after_seconds
+
+
+def test_burst_then_timeout():
+    limiter = PriorityRateLimiter(rate_per_minute=60, burst=2, reserve=0)
+    assert limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.05)
+    assert limiter.snapshot()["timed_out"]["current"] == 1
+
+
+def test_background_leaves_the_reserve_for_the_current_track():
+    limiter = PriorityRateLimiter(rate_per_minute=60, burst=3, reserve=2)
+    assert limiter.acquire(PRIORITY_BACKGROUND, timeout=0)
+    # Two tokens left, but both are held back for PRIORITY_CURRENT
+    assert not limiter.acquire(PRIORITY_BACKGROUND, timeout=0.05)
+    assert limiter.acquire(PRIORITY_CURRENT, timeout=0)
+    assert limiter.acquire(PRIORITY_CURRENT, timeout=0)
+
+
+def test_reserve_is_capped_below_the_burst():
+    limiter = PriorityRateLimiter(rate_per_minute=60, burst=2, reserve=5)
+    assert limiter.reserve == 1
+    assert limiter.acquire(PRIORITY_BACKGROUND, timeout=0)
+
+
+def test_current_track_is_served_before_queued_background_work():
+    limiter = PriorityRateLimiter(rate_per_minute=600, burst=1, reserve=0)
+    assert limiter.acquire(timeout=0)
+    order = []
+
+    def take(priority, label):
+        if limiter.acquire(priority, timeout=5):
+            order.append(label)
+
+    background = threading.Thread(target=take, args=(PRIORITY_BACKGROUND, "background"))
+    background.start()
+    time.sleep(0.02)
+    current = threading.Thread(target=take, args=(PRIORITY_CURRENT, "current"))
+    current.start()
+    background.join()
+    current.join()
+    assert order == ["current", "background"]
+
+
+def test_throttle_pause_longer_than_the_deadline_fails_at_once():
+    limiter = PriorityRateLimiter(rate_per_minute=600, burst=5, reserve=0)
+    limiter.throttled(retry_after=30)
+    started = time.monotonic()
+    assert not limiter.acquire(timeout=1)
+    assert time.monotonic() - started < 0.1
+    assert limiter.snapshot()["throttled"] == 1
+    assert limiter.snapshot()["tokens"] == 0
+
+
+def test_throttle_pause_shorter_than_the_deadline_is_waited_out():
+    limiter = PriorityRateLimiter(rate_per_minute=6000, burst=1, reserve=0)
+    limiter.throttled(retry_after=0.1)
+    started = time.monotonic()
+    assert limiter.acquire(timeout=2)
+    assert time.monotonic() - started >= 0.09
+
+
+def test_stop_event_ends_the_wait():
+    limiter = PriorityRateLimiter(rate_per_minute=1, burst=1, reserve=0)
+    assert limiter.acquire(timeout=0)
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    assert not limiter.acquire(PRIORITY_BACKGROUND, stop_event=stop)
+
+
+def test_rate_zero_disables_limiting():
+    limiter = PriorityRateLimiter(rate_per_minute=0, burst=1, reserve=0)
+    assert all(limiter.acquire(timeout=0) for _ in range(100))
+
+
+def test_retry_after_seconds():
+    response = requests.Response()
+    assert retry_after_seconds(response) is None
+    response.headers["Retry-After"] = "12"
+    assert retry_after_seconds(response) == 12.0
+    response.headers["Retry-After"] = "Wed, 21 Oct 2026 07:28:00 GMT"
+    assert retry_after_seconds(response) is None
+    assert retry_after_seconds(None) is None
@@ -0,0 +1,67 @@
+import pytest
+
+from reconcile import Reconciler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_older_observation_is_stale(clock):
+    reconciler = Reconciler(clock=clock)
+    delayed_poll = reconciler.observe("poll", "Old - Artist", key="Old - Artist")
+    push = reconciler.observe("push", "New - Artist", key="New - Artist")
+
+    assert reconciler.accept(push)
+    # The poll was made first, so it can't overwrite the push that was accepted after it
+    assert not reconciler.accept(delayed_poll)
+    assert reconciler.stats["stale"] == 1
+    assert reconciler.snapshot()["last_seq"] == push.seq
+
+
+def test_lower_priority_source_is_held_off(clock):
+    reconciler = Reconciler(hold_seconds=10, clock=clock)
+    assert reconciler.accept(reconciler.observe("stream", {"title": "Song"}))
+
+    clock.now += 9.9
+    assert not reconciler.accept(reconciler.observe("poll", "Other - Artist", key="Other - Artist"))
+    assert not reconciler.accept(reconciler.observe("push", "Other - Artist", key="Other - Artist"))
+    assert reconciler.stats["overridden"] == 2
+
+    clock.now += 0.1
+    assert reconciler.accept(reconciler.observe("poll", "Other - Artist", key="Other - Artist"))
+    assert reconciler.snapshot()["authority"] == "poll"
+
+
+def test_higher_priority_source_always_takes_over(clock):
+    reconciler = Reconciler(clock=clock)
+    assert reconciler.accept(reconciler.observe("poll", "A - B", key="A - B"))
+    assert reconciler.accept(reconciler.observe("stream", {"title": "C"}))
+    assert reconciler.accept(reconciler.observe("stream", {"title": "D"}))
+
+
+def test_duplicates_are_dropped_but_still_advance_the_sequence(clock):
+    reconciler = Reconciler(clock=clock)
+    first = reconciler.observe("poll", "A - B", key="A - B")
+    repeat = reconciler.observe("poll", "A - B", key="A - B")
+    assert reconciler.accept(first)
+    assert not reconciler.accept(repeat)
+    assert reconciler.stats["duplicate"] == 1
+    assert reconciler.snapshot()["last_seq"] == repeat.seq
+    # Without a key nothing is a duplicate
+    assert reconciler.accept(reconciler.observe("poll", "A - B"))
+    assert reconciler.accept(reconciler.observe("poll", "A - B"))
+
+
+def test_unknown_source_is_rejected():
+    with pytest.raises(ValueError):
+        Reconciler().observe("carrier-pigeon", "A - B")
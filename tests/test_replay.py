@@ -0,0 +1,84 @@
+from artcache import LookupResult
+from pipeline import EnrichStage, PublishStage, TrackRecord
+import replay
+from replay import FakeArtBackend
+from titleparse import TitleParser
+
+RAW = "Summertime - Ella Fitzgerald - Louis Armstrong"
+
+
+class FakeRecorder:
+    def __init__(self):
+        self.entries = []
+
+    def record(self, entry):
+        self.entries.append(entry)
+
+
+class FakeApp:
+    def update_status(self, message, color=None):
+        pass
+
+
+class FakeSync:
+    def __init__(self, lookup):
+        self.app = FakeApp()
+        self.art_cache = {}
+        self.fetch_album_art_and_duration = lookup
+
+
+def _enrich(lookup):
+    parser = TitleParser()
+    title, artist = parser.parse(RAW)
+    record = TrackRecord.from_title(RAW)._replace(state="playing", title=title, artist=artist, obs=1)
+    return EnrichStage(FakeSync(lookup), parser=parser)(record)
+
+
+def test_replayed_lookup_picks_the_recorded_split():
+    queries = []
+
+    def lookup(title, artist):
+        queries.append((title, artist))
+        return LookupResult("https://art", 1000, "Ella Fitzgerald")
+
+    record = _enrich(lookup)
+    assert (record.title, record.artist) == ("Summertime", "Ella Fitzgerald - Louis Armstrong")
+
+    recorder = FakeRecorder()
+    PublishStage(None, recorder)._record(record, "skipped")
+    entry = recorder.entries[0]
+    assert tuple(entry["query"]) == queries[0]
+    assert entry["matched"] == "Ella Fitzgerald"
+
+    backend = FakeArtBackend([entry])
+    replayed = _enrich(backend.lookup)
+    assert backend.lookups == 1
+    assert (replayed.title, replayed.artist) == (record.title, record.artist)
+
+
+def test_mpris_recording_replays_its_structured_fields(monkeypatch):
+    presences = []
+
+    class CapturingPresence(replay.FakePresence):
+        def __init__(self):
+            super().__init__()
+            presences.append(self)
+
+    monkeypatch.setattr(replay, "FakePresence", CapturingPresence)
+    track = {"player": "org.mpris.MediaPlayer2.qobuz", "title": "Song", "artist": "Artist", "album": "Album",
+             "art_url": "https://art", "length_ms": 200000, "position_ms": 5000, "playing": True,
+             "observed_at": 1.0}
+    report = replay.replay([{"t": 1.0, "src": "mpris", "seq": 0, "raw": track, "obs": 1}])
+
+    assert report["updates_sent"] == 1
+    # Art came with the observation, so nothing was looked up
+    assert report["lookups_made"] == 0
+    update = presences[0].updates[0]
+    assert update["details"] == "Song"
+    assert update["large_image"] == "https://art"
+    assert update["end"] - update["start"] == 200
+
+
+def test_mpris_close_replays_as_a_clear():
+    report = replay.replay([{"t": 1.0, "src": "mpris", "seq": 0, "raw": None, "obs": 1}])
+    assert report["clears_sent"] == 1
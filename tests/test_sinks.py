@@ -0,0 +1,143 @@
+import base64
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from sinks import OBS_IMAGE_FILE, OBS_TEXT_FILE, JsonFileSink, ObsOverlaySink, Sink, SinkPublisher, \
+    WidgetSocketSink
+
+
+def _state(title="Song", state="playing", art_url=None):
+    return {"state": state, "title": title, "artist": "Artist", "album": "Album", "art_url": art_url}
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class BlockingSink(Sink):
+    """Holds its worker in write() until `release` is set."""
+
+    name = "blocking"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.writing = threading.Event()
+        self.written = []
+
+    def write(self, state):
+        self.writing.set()
+        self.release.wait(5)
+        self.written.append(state["title"])
+
+
+class RecordingSink(Sink):
+    name = "recording"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+
+    def write(self, state):
+        self.written.append(state["title"])
+
+
+def test_stalled_sink_drops_its_oldest_states_without_holding_up_the_others():
+    slow = BlockingSink(max_queue=2)
+    fast = RecordingSink(max_queue=16)
+    publisher = SinkPublisher([slow, fast])
+    publisher.start()
+    try:
+        publisher.publish(_state("First"))
+        assert slow.writing.wait(5)
+        started = time.monotonic()
+        for i in range(10):
+            publisher.publish(_state(f"Song {i}"))
+        assert time.monotonic() - started < 0.5
+        _wait_for(lambda: len(fast.written) == 11)
+        assert slow.dropped == 8
+
+        slow.release.set()
+        _wait_for(lambda: slow.delivered == 3)
+        assert slow.written == ["First", "Song 8", "Song 9"]
+        assert fast.dropped == 0
+    finally:
+        slow.release.set()
+        publisher.close()
+
+
+def test_failing_write_is_counted_and_the_worker_keeps_going(tmp_path):
+    sink = JsonFileSink(str(tmp_path / "missing" / "now_playing.json"))
+    sink.start()
+    try:
+        sink.submit(_state())
+        _wait_for(lambda: sink.errors == 1)
+        sink.path = str(tmp_path / "now_playing.json")
+        sink.submit(_state("Next"))
+        _wait_for(lambda: sink.delivered == 1)
+        assert json.loads((tmp_path / "now_playing.json").read_text(encoding="utf-8"))["title"] == "Next"
+        assert not (tmp_path / "now_playing.json.tmp").exists()
+    finally:
+        sink.stop()
+
+
+def test_obs_overlay_is_emptied_when_playback_stops(tmp_path):
+    sink = ObsOverlaySink(str(tmp_path))
+    try:
+        sink.write(_state("Song"))
+        assert (tmp_path / OBS_TEXT_FILE).read_text(encoding="utf-8") == "Song - Artist"
+        (tmp_path / OBS_IMAGE_FILE).write_bytes(b"cover")
+        sink._art_url = "https://example.invalid/cover.jpg"
+
+        sink.write(_state("Song", state="stopped", art_url="https://example.invalid/cover.jpg"))
+        assert (tmp_path / OBS_TEXT_FILE).read_text(encoding="utf-8") == ""
+        assert not (tmp_path / OBS_IMAGE_FILE).exists()
+    finally:
+        sink.close()
+
+
+@pytest.fixture
+def widget():
+    sink = WidgetSocketSink(port=0)
+    sink.start()
+    yield sink
+    sink.stop()
+
+
+def _connect(sink):
+    sock = socket.create_connection(("127.0.0.1", sink.port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((f"GET / HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(1)
+    assert response.startswith(b"HTTP/1.1 101")
+    return sock
+
+
+def _read_state(sock):
+    # Server frames are unmasked; the states here are all under 126 bytes
+    first, second = sock.recv(2, socket.MSG_WAITALL)
+    return json.loads(sock.recv(second, socket.MSG_WAITALL))
+
+
+def test_widget_gets_the_current_state_on_connect_and_changes_after(widget):
+    widget.submit(_state("Before"))
+    _wait_for(lambda: widget.delivered == 1)
+    sock = _connect(widget)
+    try:
+        assert _read_state(sock)["title"] == "Before"
+        _wait_for(lambda: widget.stats()["clients"] == 1)
+        widget.submit(_state("After"))
+        assert _read_state(sock)["title"] == "After"
+    finally:
+        sock.close()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from supervisor import Supervisor
+
+
+class Worker(threading.Thread):
+    instances = []
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.exit = threading.Event()
+        self.stop_calls = 0
+        Worker.instances.append(self)
+
+    def run(self):
+        self.exit.wait()
+
+    def stop(self):
+        self.stop_calls += 1
+        self.exit.set()
+
+
+def test_crashed_worker_is_stopped_before_restart():
+    supervisor = Supervisor(check_interval=0.02)
+    supervisor.add("worker", Worker)
+    first = supervisor.start("worker")
+    first.exit.set()  # dies without stop() being called
+    deadline = time.monotonic() + 5
+    while supervisor.current("worker") in (None, first) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    try:
+        assert first.stop_calls == 1
+        assert supervisor.current("worker") is not first
+    finally:
+        supervisor.shutdown()
+
+
+class ReleasableWorker(Worker):
+    def __init__(self):
+        super().__init__()
+        self.release_calls = 0
+
+    def release(self):
+        self.release_calls += 1
+
+
+def test_crashed_worker_is_released_without_stop():
+    states = []
+    supervisor = Supervisor(on_change=lambda name, state: states.append(state), check_interval=0.02)
+    supervisor.add("worker", ReleasableWorker)
+    first = supervisor.start("worker")
+    first.exit.set()
+    deadline = time.monotonic() + 5
+    while supervisor.current("worker") in (None, first) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    try:
+        assert (first.release_calls, first.stop_calls) == (1, 0)
+        assert states[:3] == ["running", "restarting", "running"]
+    finally:
+        supervisor.shutdown()
@@ -0,0 +1,105 @@
+import functools
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+import updater
+from updater import (MANIFEST_FILE_NAME, OLD_SUFFIX, PART_SUFFIX, RangeRequestHandler, UpdateError, Updater,
+                     apply_pending_update, build_manifest, remove_old_files)
+
+
+class QuietRangeHandler(RangeRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _write(root, relpath, data):
+    path = os.path.join(root, *relpath.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _read(root, relpath):
+    with open(os.path.join(root, *relpath.split('/')), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def release(tmp_path):
+    """An installed 1.0.0 and a served 1.0.1 that changes one file, adds one and drops one."""
+    install = str(tmp_path / "install")
+    served = str(tmp_path / "release")
+    _write(install, "app.bin", b"same" * 1000)
+    _write(install, "lib/core.bin", b"old core")
+    _write(install, "gone.txt", b"dropped in 1.0.1")
+    with open(os.path.join(install, MANIFEST_FILE_NAME), 'w') as f:
+        json.dump(build_manifest(install, "1.0.0"), f)
+
+    _write(served, "app.bin", b"same" * 1000)
+    _write(served, "lib/core.bin", os.urandom(300_000))
+    _write(served, "new.txt", b"added in 1.0.1")
+    manifest = build_manifest(served, "1.0.1")
+    with open(os.path.join(served, "manifest.json"), 'w') as f:
+        json.dump(manifest, f)
+
+    handler = functools.partial(QuietRangeHandler, directory=served)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield {"install": install, "served": served, "manifest": manifest, "staging": str(tmp_path / "staging"),
+               "url": f"http://127.0.0.1:{server.server_address[1]}/manifest.json"}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stages_only_changed_files_and_swaps_them_in(release):
+    stager = Updater(release["install"], release["url"], release["staging"])
+    stager.stage()
+    assert stager.stats["skipped"] == 1
+    assert stager.stats["downloaded"] == 2
+
+    assert apply_pending_update(release["install"], release["staging"]) == "1.0.1"
+    for relpath in ("app.bin", "lib/core.bin", "new.txt"):
+        assert _read(release["install"], relpath) == _read(release["served"], relpath)
+    # Replaced and dropped files are set aside, then removed on the next launch
+    assert os.path.exists(os.path.join(release["install"], "lib", "core.bin" + OLD_SUFFIX))
+    assert not os.path.exists(os.path.join(release["install"], "gone.txt"))
+    remove_old_files(release["install"])
+    assert not any(name.endswith(OLD_SUFFIX) for _, _, names in os.walk(release["install"]) for name in names)
+    assert apply_pending_update(release["install"], release["staging"]) is None
+
+
+def test_interrupted_download_resumes_with_a_range_request(release):
+    stager = Updater(release["install"], release["url"], release["staging"])
+    stage_dir = os.path.join(release["staging"], "1.0.1")
+    full = _read(release["served"], "lib/core.bin")
+    _write(stage_dir, "lib/core.bin" + PART_SUFFIX, full[:100_000])
+
+    stager.fetch_file(release["manifest"], "lib/core.bin", stage_dir)
+    assert stager.stats["resumed"] == 1
+    assert stager.stats["bytes"] == len(full) - 100_000
+    assert _read(stage_dir, "lib/core.bin") == full
+
+
+def test_hash_mismatch_is_retried_then_refused(release):
+    manifest = json.loads(json.dumps(release["manifest"]))
+    manifest["files"]["new.txt"]["sha256"] = "0" * 64
+    stager = Updater(release["install"], release["url"], release["staging"])
+    stage_dir = os.path.join(release["staging"], "1.0.1")
+
+    with pytest.raises(UpdateError):
+        stager.fetch_file(manifest, "new.txt", stage_dir)
+    assert stager.stats["hash_failures"] == updater.MAX_ATTEMPTS
+    assert not os.path.exists(os.path.join(stage_dir, "new.txt"))
+
+
+def test_manifest_paths_cannot_escape_the_install_dir(release):
+    manifest = {"version": "6.6.6", "files": {"../evil.bin": {"sha256": "0" * 64, "size": 1}}}
+    with pytest.raises(UpdateError):
+        Updater(release["install"], release["url"], release["staging"]).plan(manifest)
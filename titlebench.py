@@ -0,0 +1,176 @@
+"""
+Correctness and throughput benchmark for the window title parser (titleparse.py).
+
+The corpus is a built-in sample of Qobuz window titles with known splits, or
+any mix of:
+    *.jsonl  recorded sessions (see recorder.py); MPRIS and push-channel entries carry
+             the real title/artist and are scored, polled titles only count for throughput
+    *.tsv    lines of "<window title>\t<title>\t<artist>"
+    other    one window title per line (throughput only)
+
+Accuracy is reported for the old rsplit, the top-ranked candidate, any candidate
+(the most a lookup can confirm), the parser once the artists are known (from
+MPRIS or earlier lookups), and after a lookup returned the expected artist.
+
+Usage:
+    python titlebench.py
+    python titlebench.py session.jsonl titles.tsv --repeat 20
+"""
+import argparse
+import sys
+import time
+
+from recorder import read_recording
+from titleparse import SEPARATOR, TitleParser, candidate_splits
+
+SAMPLE_CORPUS = [
+    ("Bohemian Rhapsody - Remastered 2011 - Queen", "Bohemian Rhapsody - Remastered 2011", "Queen"),
+    ("Won't Get Fooled Again - The Who", "Won't Get Fooled Again", "The Who"),
+    ("Wish You Were Here - Pink Floyd", "Wish You Were Here", "Pink Floyd"),
+    ("Paranoid Android - Radiohead", "Paranoid Android", "Radiohead"),
+    ("Heroes - 2017 Remaster - David Bowie", "Heroes - 2017 Remaster", "David Bowie"),
+    ("Hallelujah - Live - Jeff Buckley", "Hallelujah - Live", "Jeff Buckley"),
+    ("So What - Miles Davis", "So What", "Miles Davis"),
+    ("Take Five - Dave Brubeck Quartet", "Take Five", "Dave Brubeck Quartet"),
+    ("Goldberg Variations, BWV 988: Aria - Glenn Gould", "Goldberg Variations, BWV 988: Aria", "Glenn Gould"),
+    ("Symphony No. 5 in C Minor, Op. 67: I. Allegro con brio - Wiener Philharmoniker - Carlos Kleiber",
+     "Symphony No. 5 in C Minor, Op. 67: I. Allegro con brio", "Wiener Philharmoniker - Carlos Kleiber"),
+    ("Le nozze di Figaro, K. 492: Overture - Orchestra of the Age of Enlightenment - Simon Rattle",
+     "Le nozze di Figaro, K. 492: Overture", "Orchestra of the Age of Enlightenment - Simon Rattle"),
+    ("Clair de lune - Claude Debussy", "Clair de lune", "Claude Debussy"),
+    ("Smells Like Teen Spirit - Nirvana", "Smells Like Teen Spirit", "Nirvana"),
+    ("Come Together - Remastered 2009 - The Beatles", "Come Together - Remastered 2009", "The Beatles"),
+    ("Hurt - Johnny Cash", "Hurt", "Johnny Cash"),
+    ("Jolene - Single Version - Dolly Parton", "Jolene - Single Version", "Dolly Parton"),
+    ("One More Time - Daft Punk", "One More Time", "Daft Punk"),
+    ("Teardrop - Massive Attack", "Teardrop", "Massive Attack"),
+    ("Windowlicker - Aphex Twin", "Windowlicker", "Aphex Twin"),
+    ("Blue in Green - Take 3 - Miles Davis", "Blue in Green - Take 3", "Miles Davis"),
+    ("Kashmir - Remaster - Led Zeppelin", "Kashmir - Remaster", "Led Zeppelin"),
+    ("Shine On You Crazy Diamond (Pts. 1-5) - Pink Floyd", "Shine On You Crazy Diamond (Pts. 1-5)", "Pink Floyd"),
+    ("Dreams - 2004 Remaster - Fleetwood Mac", "Dreams - 2004 Remaster", "Fleetwood Mac"),
+    ("Águas de Março - Elis Regina - Antonio Carlos Jobim", "Águas de Março", "Elis Regina - Antonio Carlos Jobim"),
+    ("Summertime - Ella Fitzgerald - Louis Armstrong", "Summertime", "Ella Fitzgerald - Louis Armstrong"),
+]
+
+
+# --- 1. CORPUS ---
+
+def _read_recording(path):
+    entries = list(read_recording(path))
+    # Outcome lines carry the parsed track of the observation they refer to
+    tracks = {e["obs"]: e["track"] for e in entries if "src" not in e and e.get("track")}
+    for entry in entries:
+        if "src" not in entry:
+            continue
+        raw = entry.get("raw")
+        if isinstance(raw, dict) and raw.get("title"):
+            raw = f"{raw['title']} - {raw['artist']}" if raw.get("artist") else None
+        if not isinstance(raw, str) or not raw.strip() or raw.strip() == "Qobuz":
+            continue
+        track = entry.get("track") or tracks.get(entry.get("obs"))
+        # Structured sources know the real split; polled titles are only parsed
+        if entry["src"] in ("mpris", "stream") and track:
+            yield raw, track[0], track[1]
+        else:
+            yield raw, None, None
+
+
+def _read_lines(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if not fields[0].strip():
+                continue
+            if path.lower().endswith('.tsv') and len(fields) >= 3:
+                yield fields[0], fields[1].strip(), fields[2].strip()
+            else:
+                yield fields[0], None, None
+
+
+def load_corpus(paths):
+    """Returns a list of (window title, expected title or None, expected artist or None)."""
+    if not paths:
+        return list(SAMPLE_CORPUS)
+    corpus = []
+    for path in paths:
+        corpus.extend(_read_recording(path) if path.lower().endswith('.jsonl') else _read_lines(path))
+    return corpus
+
+
+# --- 2. BENCHMARK ---
+
+def _rsplit(raw):
+    parts = raw.rsplit(SEPARATOR, 1)
+    return parts[0].strip(), parts[1].strip() if len(parts) > 1 else None
+
+
+def _rate(fn, titles, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for raw in titles:
+            fn(raw)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return round(len(titles) * repeat / elapsed)
+
+
+def run_benchmark(corpus, repeat=10):
+    labeled = [(raw, (title, artist)) for raw, title, artist in corpus if title is not None and artist is not None]
+    expected_by_raw = dict(labeled)
+    learned = TitleParser(max_entries=len(labeled) + 1)
+    for _, (_, artist) in labeled:
+        learned.learn(artist)
+
+    def after_lookup(raw):
+        parser = TitleParser()
+        parser.parse(raw)
+        parser.confirm(raw, expected_by_raw[raw][1])
+        return parser.parse(raw)
+
+    def accuracy(choose):
+        if not labeled:
+            return None
+        return round(100.0 * sum(1 for raw, expected in labeled if choose(raw) == expected) / len(labeled), 1)
+
+    titles = [raw for raw, _, _ in corpus]
+    unique = list(dict.fromkeys(titles))
+    memoized = TitleParser(max_entries=len(unique) + 1)
+    for raw in unique:
+        memoized.parse(raw)
+
+    def cold(raw):
+        TitleParser().parse(raw)
+
+    return {
+        "titles": len(titles),
+        "unique_titles": len(unique),
+        "labeled": len(labeled),
+        "ambiguous": sum(1 for raw in unique if raw.count(SEPARATOR) > 1),
+        "accuracy_rsplit_pct": accuracy(_rsplit),
+        "accuracy_top_candidate_pct": accuracy(lambda raw: candidate_splits(raw)[0]),
+        "accuracy_any_candidate_pct": accuracy(
+            lambda raw: expected_by_raw[raw] if expected_by_raw[raw] in candidate_splits(raw) else None),
+        "accuracy_known_artists_pct": accuracy(learned.parse),
+        "accuracy_after_lookup_pct": accuracy(after_lookup),
+        "rsplit_per_second": _rate(_rsplit, titles, repeat),
+        "cold_parse_per_second": _rate(cold, titles, repeat),
+        "memoized_parse_per_second": _rate(memoized.parse, titles, repeat),
+        "memo": memoized.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Qobuz-RPC window title parsing.")
+    parser.add_argument('corpus', nargs='*', help="Recordings (.jsonl), labeled .tsv files or plain title lists")
+    parser.add_argument('--repeat', type=int, default=10, help="Passes over the corpus for the throughput figures")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(load_corpus(args.corpus), repeat=max(1, args.repeat))
+    width = max(len(k) for k in report)
+    for key, value in report.items():
+        print(f"{key.ljust(width)}  {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Window title parsing shared by every backend.
+
+Qobuz shows the current track as "Song Title - Artist Name", but both halves may
+contain " - " themselves ("Song - Remastered 2011 - Artist", "Song - Artist -
+Ensemble"), so a title with several separators has several possible splits.
+candidate_splits() ranks them: the last separator first, except that a split
+whose "artist" reads like a version suffix ("Live", "2011 Remaster", ...)
+goes to the back.
+
+TitleParser memoizes the candidates per raw title. The art cache can't tell the
+splits apart (its key is the joined title again), so they are checked against
+artist names instead: the artist of each lookup match (see
+artcache.LookupResult) and of structured observations (MPRIS, push events).
+Once a split is confirmed, later plays of that title parse to it with one dict
+lookup. Titles for which the lookup found nothing are remembered as well, so
+they aren't looked up again on every play.
+"""
+import collections
+import re
+import threading
+import time
+
+SEPARATOR = " - "
+UNKNOWN_ARTIST = "Unknown Artist"
+MAX_MEMO_ENTRIES = 4096
+MAX_KNOWN_ARTISTS = 20000
+# Titles with more separators than this are only split at the last few
+MAX_CANDIDATES = 4
+# A title whose lookup found nothing is not looked up again for this long
+MISS_RETRY_SECONDS = 300
+
+_VERSION_SUFFIX = re.compile(
+    r"(\d{4}\b|\(|\[|(remaster|live|version|mix|remix|edit|mono|stereo|acoustic|demo|instrumental|bonus|single"
+    r"|radio|deluxe|extended|reprise|unplugged|alternate|feat|op\.|no\.|bwv)\b)",
+    re.IGNORECASE)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def candidate_splits(raw):
+    """
+    Every (title, artist) reading of `raw`, most likely first.
+    A title without a separator gives a single candidate with UNKNOWN_ARTIST.
+    """
+    parts = raw.strip().split(SEPARATOR)
+    if len(parts) < 2:
+        return ((raw.strip(), UNKNOWN_ARTIST),)
+    ranked = []
+    for i in range(len(parts) - 1, max(0, len(parts) - 1 - MAX_CANDIDATES), -1):
+        title = SEPARATOR.join(parts[:i]).strip()
+        artist = SEPARATOR.join(parts[i:]).strip()
+        if title and artist:
+            ranked.append((bool(_VERSION_SUFFIX.match(artist)), len(ranked), (title, artist)))
+    if not ranked:
+        return ((raw.strip(), UNKNOWN_ARTIST),)
+    ranked.sort()
+    return tuple(candidate for _, _, candidate in ranked)
+
+
+def normalize_artist(name):
+    """Case- and punctuation-insensitive form used to compare artist names."""
+    return _NON_WORD.sub(" ", name.casefold()).strip()
+
+
+def artist_matches(candidate_artist, found_artist):
+    """
+    True if `found_artist` (from a lookup) names the candidate's artist. A multi-artist
+    candidate ("A - B") matches on its lead artist, since providers list credits differently.
+    """
+    found = normalize_artist(found_artist or "")
+    if not found:
+        return False
+    lead = normalize_artist(candidate_artist.split(SEPARATOR)[0])
+    return normalize_artist(candidate_artist) == found or lead == found or found.startswith(lead + " ")
+
+
+class _Entry:
+    __slots__ = ("candidates", "confirmed", "missed_at")
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.confirmed = None
+        self.missed_at = None
+
+
+class TitleParser:
+    """Thread-safe LRU memo of candidate splits and confirmed choices, keyed by raw window title."""
+
+    def __init__(self, max_entries=MAX_MEMO_ENTRIES, miss_retry=MISS_RETRY_SECONDS):
+        self.max_entries = max_entries
+        self.miss_retry = miss_retry
+        self.hits = 0
+        self.misses = 0
+        self.confirmed = 0
+        self._memo = collections.OrderedDict()
+        self._artists = set()
+        self._lock = threading.Lock()
+
+    def _entry(self, raw, count=True):
+        """Call with _lock held."""
+        entry = self._memo.get(raw)
+        if entry is not None:
+            self._memo.move_to_end(raw)
+            self.hits += count
+            return entry
+        self.misses += count
+        entry = self._memo[raw] = _Entry(candidate_splits(raw))
+        if len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+        return entry
+
+    def candidates(self, raw):
+        with self._lock:
+            return self._entry(raw).candidates
+
+    def peek(self, raw):
+        """The memoized candidates of `raw`, or None if it was never parsed; doesn't add an entry."""
+        with self._lock:
+            entry = self._memo.get(raw)
+            return entry.candidates if entry is not None else None
+
+    def learn(self, artist):
+        """Remembers an artist name known to be right, e.g. from MPRIS or a lookup match."""
+        if artist and artist != UNKNOWN_ARTIST and len(self._artists) < MAX_KNOWN_ARTISTS:
+            self._artists.add(normalize_artist(artist))
+
+    def parse(self, raw):
+        """
+        The (title, artist) to use for `raw`: the confirmed split, else the first candidate
+        whose artist has been seen before, else the top-ranked one.
+        """
+        with self._lock:
+            entry = self._entry(raw)
+            if entry.confirmed is not None:
+                return entry.confirmed
+            candidates = entry.candidates
+            if len(candidates) > 1 and self._artists:
+                for candidate in candidates:
+                    if normalize_artist(candidate[1]) in self._artists:
+                        entry.confirmed = candidate
+                        return candidate
+        return candidates[0]
+
+    def confirm(self, raw, found_artist):
+        """
+        Pins the split of `raw` whose artist matches `found_artist` (from a lookup); a title
+        without a separator takes `found_artist` as its artist. Returns that (title, artist),
+        or None if no candidate matches.
+        """
+        self.learn(found_artist)
+        with self._lock:
+            entry = self._entry(raw, count=False)
+            entry.missed_at = None
+            candidates = entry.candidates
+            if found_artist and candidates[0][1] == UNKNOWN_ARTIST:
+                # No separator to choose from, but the match fills in the missing artist
+                candidates = ((candidates[0][0], found_artist),)
+            for candidate in candidates:
+                if artist_matches(candidate[1], found_artist):
+                    if entry.confirmed != candidate:
+                        entry.confirmed = candidate
+                        self.confirmed += 1
+                    return candidate
+        return None
+
+    def missed(self, raw):
+        """Records that the lookup for `raw` found nothing."""
+        with self._lock:
+            self._entry(raw, count=False).missed_at = time.monotonic()
+
+    def should_look_up(self, raw):
+        """False while a recent lookup of `raw` found nothing."""
+        with self._lock:
+            entry = self._memo.get(raw)
+            return entry is None or entry.missed_at is None or time.monotonic() - entry.missed_at >= self.miss_retry
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._memo), "hits": self.hits, "misses": self.misses,
+                    "confirmed": self.confirmed, "known_artists": len(self._artists),
+                    "ambiguous": sum(1 for e in self._memo.values() if len(e.candidates) > 1)}
+
+
+# One memo per process, shared by the synchronizers
+TITLES = TitleParser()
@@ -0,0 +1,335 @@
+"""
+Background auto-updater for the standalone (Nuitka) build.
+
+A release publishes a manifest next to its files:
+
+    {"version": "1.0.2", "base_url": "https://.../v1.0.2/",
+     "files": {"qobuz.exe": {"sha256": "...", "size": 123456}, "tk/tk.tcl": {...}}}
+
+`base_url` is optional (defaults to the manifest's own directory). The updater
+hashes the installed files, downloads only the ones whose hash changed into a
+staging directory with HTTP Range requests (so an interrupted download resumes
+where it stopped), verifies every file against the manifest, and marks the
+update as pending. `apply_pending_update` swaps the staged files in at the
+next launch, before the GUI starts; running binaries are renamed aside (Windows allows renaming, not deleting, files in
+use) and removed on the launch after that.
+
+Publishing and local testing:
+    python updater.py manifest dist/qobuz.dist 1.0.2 -o release/manifest.json
+    python updater.py serve release --port 8765          # Range-capable test server
+    python updater.py download http://127.0.0.1:8765/manifest.json --install-dir old/qobuz.dist
+    python updater.py apply --install-dir old/qobuz.dist
+"""
+import argparse
+import functools
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import sys
+import urllib.parse
+
+import requests
+
+import eventlog
+from artcache import get_app_data_dir
+
+MANIFEST_FILE_NAME = "release-manifest.json"
+PENDING_FILE_NAME = "pending.json"
+OLD_SUFFIX = ".old"
+PART_SUFFIX = ".part"
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 3
+
+
+class UpdateError(Exception):
+    pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _safe_join(root, relpath):
+    """Joins a manifest path onto `root`, refusing absolute paths and '..' escapes."""
+    path = os.path.normpath(os.path.join(root, *relpath.split('/')))
+    if os.path.isabs(relpath) or os.path.commonpath([os.path.abspath(root), os.path.abspath(path)]) != os.path.abspath(root):
+        raise UpdateError(f"Unsafe path in manifest: {relpath}")
+    return path
+
+
+def build_manifest(dist_dir, version, base_url=None):
+    files = {}
+    for folder, _, names in os.walk(dist_dir):
+        for name in names:
+            if name == MANIFEST_FILE_NAME or name.endswith((OLD_SUFFIX, PART_SUFFIX)):
+                continue
+            path = os.path.join(folder, name)
+            relpath = os.path.relpath(path, dist_dir).replace(os.sep, '/')
+            files[relpath] = {"sha256": sha256_file(path), "size": os.path.getsize(path)}
+    manifest = {"version": version, "files": files}
+    if base_url:
+        manifest["base_url"] = base_url
+    return manifest
+
+
+# --- 1. DOWNLOAD AND STAGE ---
+
+class Updater:
+
+    def __init__(self, install_dir, manifest_url, staging_root=None, session=None, timeout=15, on_progress=None):
+        self.install_dir = install_dir
+        self.manifest_url = manifest_url
+        self.staging_root = staging_root or os.path.join(get_app_data_dir(), "updates")
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.stats = {"skipped": 0, "downloaded": 0, "resumed": 0, "bytes": 0, "hash_failures": 0}
+
+    def fetch_manifest(self):
+        response = self.session.get(self.manifest_url, timeout=self.timeout)
+        response.raise_for_status()
+        manifest = response.json()
+        if not isinstance(manifest.get("files"), dict) or "version" not in manifest:
+            raise UpdateError("Malformed release manifest")
+        return manifest
+
+    def plan(self, manifest):
+        """Returns the manifest paths whose installed copy is missing or has a different hash."""
+        changed = []
+        for relpath, entry in manifest["files"].items():
+            local = _safe_join(self.install_dir, relpath)
+            if os.path.isfile(local) and os.path.getsize(local) == entry["size"] and sha256_file(local) == entry["sha256"]:
+                self.stats["skipped"] += 1
+            else:
+                changed.append(relpath)
+        return changed
+
+    def _file_url(self, manifest, relpath):
+        base = manifest.get("base_url") or self.manifest_url.rsplit('/', 1)[0] + '/'
+        return urllib.parse.urljoin(base, urllib.parse.quote(relpath))
+
+    def _download(self, url, part_path):
+        """Downloads `url` into `part_path`, continuing from whatever is already there."""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # Range starts at or past the end: the part file is already complete (or too long)
+                return
+            response.raise_for_status()
+            if offset and response.status_code == 206:
+                self.stats["resumed"] += 1
+                eventlog.info("updater", "Resuming download", url=url, offset=offset)
+                mode = 'ab'
+            else:
+                mode = 'wb'  # server ignored the Range header; start over
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    self.stats["bytes"] += len(chunk)
+
+    def fetch_file(self, manifest, relpath, stage_dir):
+        entry = manifest["files"][relpath]
+        target = _safe_join(stage_dir, relpath)
+        if os.path.isfile(target) and sha256_file(target) == entry["sha256"]:
+            return target  # staged by an earlier, interrupted run
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        part_path = target + PART_SUFFIX
+        url = self._file_url(manifest, relpath)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                self._download(url, part_path)
+            except requests.exceptions.RequestException as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise UpdateError(f"Download failed for {relpath}: {e}")
+                eventlog.warning("updater", "Download failed, retrying", file=relpath, attempt=attempt + 1,
+                                 error=str(e))
+                continue
+            if sha256_file(part_path) == entry["sha256"]:
+                os.replace(part_path, target)
+                self.stats["downloaded"] += 1
+                return target
+            # Corrupt or from a different build; resuming on top of it would never verify
+            self.stats["hash_failures"] += 1
+            eventlog.warning("updater", "Hash mismatch, downloading again", file=relpath, attempt=attempt + 1)
+            os.remove(part_path)
+        raise UpdateError(f"Hash mismatch for {relpath} after {MAX_ATTEMPTS} attempts")
+
+    def stage(self, manifest=None):
+        """Downloads and verifies everything that changed, then marks the update pending. Returns the manifest."""
+        manifest = manifest or self.fetch_manifest()
+        stage_dir = _safe_join(self.staging_root, str(manifest["version"]))
+        changed = self.plan(manifest)
+        eventlog.info("updater", "Staging update", version=manifest["version"], changed=len(changed),
+                      unchanged=self.stats["skipped"])
+        for index, relpath in enumerate(changed, 1):
+            self.fetch_file(manifest, relpath, stage_dir)
+            if self.on_progress:
+                self.on_progress(index, len(changed))
+        os.makedirs(stage_dir, exist_ok=True)
+        with open(os.path.join(stage_dir, MANIFEST_FILE_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        pending = {"version": manifest["version"], "stage_dir": stage_dir, "install_dir": os.path.abspath(self.install_dir),
+                   "files": changed}
+        tmp_path = os.path.join(self.staging_root, PENDING_FILE_NAME + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pending, f)
+        os.replace(tmp_path, os.path.join(self.staging_root, PENDING_FILE_NAME))
+        eventlog.info("updater", "Update staged", version=manifest["version"], **self.stats)
+        return manifest
+
+
+# --- 2. SWAP ON RESTART ---
+
+def pending_update(staging_root=None):
+    path = os.path.join(staging_root or os.path.join(get_app_data_dir(), "updates"), PENDING_FILE_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def apply_pending_update(install_dir, staging_root=None):
+    """
+    Swaps a staged update into `install_dir`. Returns the new version, or None if nothing
+    was applied. On any failure the files already swapped are put back.
+    """
+    staging_root = staging_root or os.path.join(get_app_data_dir(), "updates")
+    pending = pending_update(staging_root)
+    if not pending or os.path.abspath(install_dir) != pending["install_dir"]:
+        return None
+    stage_dir = pending["stage_dir"]
+    with open(os.path.join(stage_dir, MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    previous = None
+    try:
+        with open(os.path.join(install_dir, MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    swapped = []
+    try:
+        for relpath in pending["files"]:
+            target = _safe_join(install_dir, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            aside = None
+            if os.path.exists(target):
+                aside = target + OLD_SUFFIX
+                os.replace(target, aside)
+            staged = _safe_join(stage_dir, relpath)
+            swapped.append((staged, target, aside))
+            os.replace(staged, target)
+    except OSError as e:
+        eventlog.error("updater", "Swap failed, rolling back", version=manifest["version"], swapped=len(swapped),
+                       error=str(e))
+        for staged, target, aside in reversed(swapped):
+            if os.path.exists(target) and not os.path.exists(staged):
+                os.replace(target, staged)
+            if aside:
+                os.replace(aside, target)
+        raise
+
+    # Files the old release shipped but the new one doesn't
+    if previous:
+        for relpath in set(previous.get("files", {})) - set(manifest["files"]):
+            path = _safe_join(install_dir, relpath)
+            if os.path.exists(path):
+                os.replace(path, path + OLD_SUFFIX)
+    shutil.copyfile(os.path.join(stage_dir, MANIFEST_FILE_NAME), os.path.join(install_dir, MANIFEST_FILE_NAME))
+    os.remove(os.path.join(staging_root, PENDING_FILE_NAME))
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    eventlog.info("updater", "Update installed", version=manifest["version"], files=len(pending["files"]))
+    return manifest["version"]
+
+
+def remove_old_files(install_dir):
+    """Deletes files set aside by the last swap; ones still locked are left for next time."""
+    for folder, _, names in os.walk(install_dir):
+        for name in names:
+            if name.endswith(OLD_SUFFIX):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+
+# --- 3. CLI AND TEST SERVER ---
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """http.server ignores Range; this serves single byte ranges so resumes can be tested locally."""
+
+    def send_head(self):
+        range_header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if not range_header or not range_header.startswith('bytes=') or not os.path.isfile(path):
+            return super().send_head()
+        start_text, _, end_text = range_header[6:].partition('-')
+        size = os.path.getsize(path)
+        start = int(start_text or 0)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+        if start >= size:
+            self.send_error(416)
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        return f
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Qobuz-RPC release manifests and updates")
+    sub = parser.add_subparsers(dest='command', required=True)
+    manifest_cmd = sub.add_parser('manifest', help="Write a release manifest for a built dist folder")
+    manifest_cmd.add_argument('dist_dir')
+    manifest_cmd.add_argument('version')
+    manifest_cmd.add_argument('-o', '--output', default=None)
+    manifest_cmd.add_argument('--base-url', default=None)
+    serve_cmd = sub.add_parser('serve', help="Serve a release folder with Range support (testing)")
+    serve_cmd.add_argument('directory')
+    serve_cmd.add_argument('--port', type=int, default=8765)
+    download_cmd = sub.add_parser('download', help="Stage the release at a manifest URL")
+    download_cmd.add_argument('manifest_url')
+    download_cmd.add_argument('--install-dir', required=True)
+    download_cmd.add_argument('--staging-dir', default=None)
+    apply_cmd = sub.add_parser('apply', help="Swap a staged release into the install folder")
+    apply_cmd.add_argument('--install-dir', required=True)
+    apply_cmd.add_argument('--staging-dir', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'manifest':
+        manifest = build_manifest(args.dist_dir, args.version, args.base_url)
+        output = args.output or os.path.join(args.dist_dir, MANIFEST_FILE_NAME)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        print(f"{len(manifest['files'])} files -> {output}")
+    elif args.command == 'serve':
+        handler = functools.partial(RangeRequestHandler, directory=args.directory)
+        with http.server.ThreadingHTTPServer(('127.0.0.1', args.port), handler) as server:
+            print(f"Serving {args.directory} on http://127.0.0.1:{args.port}/")
+            server.serve_forever()
+    elif args.command == 'download':
+        updater = Updater(args.install_dir, args.manifest_url, args.staging_dir,
+                          on_progress=lambda done, total: print(f"\r{done}/{total} files", end=''))
+        manifest = updater.stage()
+        print(f"\nStaged v{manifest['version']}: {updater.stats}")
+    else:
+        version = apply_pending_update(args.install_dir, args.staging_dir)
+        print(f"Installed v{version}" if version else "No pending update for this folder.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())